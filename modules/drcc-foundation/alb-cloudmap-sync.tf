@@ -1,8 +1,23 @@
 # Archive lambda source code
 data "archive_file" "alb_cloudmap_sync_zip" {
   type        = "zip"
-  source_file = "${path.module}/lambda/alb-cloudmap-sync.py"
   output_path = "${path.module}/lambda/alb-cloudmap-sync.zip"
+
+  source {
+    content  = file("${path.module}/lambda/alb-cloudmap-sync.py")
+    filename = "alb-cloudmap-sync.py"
+  }
+
+  # Lazy boto3 client registry and backoff waiter, copied from the Solr operations Lambda layer
+  source {
+    content  = file("${path.module}/lambda/clients.py")
+    filename = "clients.py"
+  }
+
+  source {
+    content  = file("${path.module}/lambda/waiters.py")
+    filename = "waiters.py"
+  }
 }
 
 # IAM role for Lambda function
@@ -40,6 +55,7 @@ resource "aws_iam_role_policy" "lambda_cloudmap" {
           "servicediscovery:DeregisterInstance",
           "servicediscovery:DiscoverInstances",
           "servicediscovery:GetInstance",
+          "servicediscovery:GetOperation",
           "servicediscovery:ListInstances"
         ]
         Resource = "*"
@@ -1,72 +1,126 @@
-import boto3
 import os
 import logging
 
+from clients import lazy_client
+from waiters import wait_until
+
 logger = logging.getLogger()
 logger.setLevel(logging.INFO)
 
-elbv2 = boto3.client('elbv2')
-ec2 = boto3.client('ec2')
-servicediscovery = boto3.client('servicediscovery')
+# Clients are built on first use and reused by warm invocations
+elbv2 = lazy_client('elbv2')
+ec2 = lazy_client('ec2')
+servicediscovery = lazy_client('servicediscovery')
 
 ALB_NAME = os.environ['ALB_NAME']
 SERVICE_ID = os.environ['SERVICE_ID']
-INSTANCE_ID = os.environ['INSTANCE_ID']
+INSTANCE_ID = os.environ['INSTANCE_ID']  # one instance per ALB ENI: <INSTANCE_ID>-<eni id>
+REGISTER_TIMEOUT = 30  # seconds to wait for registrations before deregistering stale instances
 
-def lambda_handler(event, context):
-    try:
-        # Get ALB network interfaces
+# ALB ARN and ENI description, kept while the container is warm
+_alb = {}
+
+
+def get_alb():
+    """ARN of the ALB and the exact description AWS gives its ENIs (ELB app/<name>/<id>)"""
+    if not _alb:
         response = elbv2.describe_load_balancers(Names=[ALB_NAME])
         alb_arn = response['LoadBalancers'][0]['LoadBalancerArn']
-        alb_id = alb_arn.split('/')[-1]
-        
+        _alb['arn'] = alb_arn
+        _alb['eni_description'] = f"ELB {alb_arn.split(':loadbalancer/')[-1]}"
+    return _alb
+
+
+def get_alb_ips():
+    """{eni id: private IP} of the ALB's in-use network interfaces, one per AZ"""
+    for attempt in range(2):
+        alb = get_alb()
         enis = ec2.describe_network_interfaces(
             Filters=[
-                {'Name': 'description', 'Values': [f'*{alb_id}*']},
+                {'Name': 'description', 'Values': [alb['eni_description']]},
                 {'Name': 'status', 'Values': ['in-use']}
             ]
         )
-        
-        alb_ips = [eni['PrivateIpAddress'] for eni in enis['NetworkInterfaces']]
+        ips = {eni['NetworkInterfaceId']: eni['PrivateIpAddress'] for eni in enis['NetworkInterfaces']}
+        if ips or attempt:
+            return ips
+        # The ALB may have been replaced since the ARN was cached
+        _alb.clear()
+
+
+def get_registered():
+    """{instance id: IP} of this sync's instances in the Cloud Map service, including the legacy single instance"""
+    registered = {}
+    for page in servicediscovery.get_paginator('list_instances').paginate(ServiceId=SERVICE_ID):
+        for inst in page['Instances']:
+            if inst['Id'] == INSTANCE_ID or inst['Id'].startswith(f"{INSTANCE_ID}-"):
+                registered[inst['Id']] = inst['Attributes'].get('AWS_INSTANCE_IPV4')
+    return registered
+
+
+def wait_for_operations(operation_ids, context=None):
+    """Wait until the Cloud Map operations finish; returns the IDs that did not succeed"""
+    pending = set(operation_ids)
+    failed = set()
+
+    def check():
+        for operation_id in list(pending):
+            operation = servicediscovery.get_operation(OperationId=operation_id)['Operation']
+            if operation['Status'] in ('SUCCESS', 'FAIL'):
+                pending.discard(operation_id)
+                if operation['Status'] == 'FAIL':
+                    logger.error(f"Cloud Map operation {operation_id} failed: {operation.get('ErrorMessage')}")
+                    failed.add(operation_id)
+        return not pending
+
+    wait_until(check, timeout=REGISTER_TIMEOUT, context=context, description='Cloud Map registrations',
+               initial_delay=1, max_delay=5)
+    return failed | pending
+
+
+def lambda_handler(event, context):
+    try:
+        alb_ips = get_alb_ips()
         logger.info(f"Found ALB IPs: {alb_ips}")
-        
+
         if not alb_ips:
             logger.error("No IPs found for ALB")
             return {'statusCode': 500, 'body': 'No IPs found'}
-        
-        # Get current Cloud Map instance
-        instances = servicediscovery.list_instances(ServiceId=SERVICE_ID)
-        current_ip = None
-        for inst in instances['Instances']:
-            if inst['Id'] == INSTANCE_ID:
-                current_ip = inst['Attributes'].get('AWS_INSTANCE_IPV4')
-                break
-        
-        new_ip = alb_ips[0]
-        
-        if current_ip == new_ip:
-            logger.info(f"IP unchanged: {current_ip}")
+
+        desired = {f"{INSTANCE_ID}-{eni_id}": ip for eni_id, ip in alb_ips.items()}
+        current = get_registered()
+        to_register = {instance_id: ip for instance_id, ip in desired.items() if current.get(instance_id) != ip}
+        to_deregister = [instance_id for instance_id in current if instance_id not in desired]
+
+        if not to_register and not to_deregister:
+            logger.info(f"IPs unchanged: {sorted(desired.values())}")
             return {'statusCode': 200, 'body': 'No update needed'}
-        
-        logger.info(f"Updating IP from {current_ip} to {new_ip}")
-        
-        # Deregister old instance
-        if current_ip:
+
+        # Register first so the service never resolves to no address
+        operations = []
+        for instance_id, ip in to_register.items():
+            logger.info(f"Registering {instance_id} at {ip} (was {current.get(instance_id)})")
+            response = servicediscovery.register_instance(
+                ServiceId=SERVICE_ID,
+                InstanceId=instance_id,
+                Attributes={'AWS_INSTANCE_IPV4': ip}
+            )
+            operations.append(response['OperationId'])
+
+        if operations and wait_for_operations(operations, context):
+            logger.error(f"Not all registrations succeeded, keeping {to_deregister}")
+            return {'statusCode': 500, 'body': 'Registration failed'}
+
+        for instance_id in to_deregister:
+            logger.info(f"Deregistering {instance_id} ({current[instance_id]})")
             servicediscovery.deregister_instance(
                 ServiceId=SERVICE_ID,
-                InstanceId=INSTANCE_ID
+                InstanceId=instance_id
             )
-        
-        # Register with new IP
-        servicediscovery.register_instance(
-            ServiceId=SERVICE_ID,
-            InstanceId=INSTANCE_ID,
-            Attributes={'AWS_INSTANCE_IPV4': new_ip}
-        )
-        
-        logger.info(f"Successfully updated Cloud Map to {new_ip}")
-        return {'statusCode': 200, 'body': f'Updated to {new_ip}'}
-        
+
+        logger.info(f"Successfully updated Cloud Map to {sorted(desired.values())}")
+        return {'statusCode': 200, 'body': f"Updated to {sorted(desired.values())}"}
+
     except Exception as e:
         logger.error(f"Error: {str(e)}")
         raise
@@ -0,0 +1,81 @@
+# Copy of modules/solr-search-cluster/lambda/solr-ops-layer/python/clients.py, so this module can be used on
+# its own; keep it identical to that file and to modules/dspace-app-services/clients.py.
+import logging
+import threading
+
+logger = logging.getLogger()
+
+# Module-level caches outlive a single invocation, so warm starts reuse them
+_sessions = {}
+_clients = {}
+_pools = {}
+_lock = threading.RLock()
+
+
+def session(region_name=None):
+    """boto3 Session for a region, created on first use"""
+    with _lock:
+        if region_name not in _sessions:
+            import boto3
+            _sessions[region_name] = boto3.Session(region_name=region_name)
+        return _sessions[region_name]
+
+
+def client(service_name, region_name=None, wrap=None):
+    """boto3 client for a service, created on first use and cached for the container.
+
+    ``wrap`` (e.g. instrumentation.instrument_client) is applied once, when the
+    client is created, and is part of the cache key.
+    """
+    key = (service_name, region_name, wrap)
+    cached = _clients.get(key)
+    if cached is not None:
+        return cached
+    # boto3 sessions are not safe to create clients from concurrently
+    with _lock:
+        if key not in _clients:
+            created = session(region_name).client(service_name)
+            _clients[key] = wrap(created) if wrap else created
+            logger.debug(f"Created {service_name} client")
+        return _clients[key]
+
+
+def http_pool(name='default', **kwargs):
+    """urllib3 PoolManager cached under ``name``; kwargs only apply when it is first created"""
+    cached = _pools.get(name)
+    if cached is not None:
+        return cached
+    with _lock:
+        if name not in _pools:
+            import urllib3
+            _pools[name] = urllib3.PoolManager(**kwargs)
+        return _pools[name]
+
+
+def reset():
+    """Forget every cached session, client and pool (the next use creates new ones)"""
+    with _lock:
+        _sessions.clear()
+        _clients.clear()
+        _pools.clear()
+
+
+class LazyClient:
+    """Stands in for a boto3 client at module level; the client is looked up on first attribute access.
+
+    Lets modules keep ``ssm = lazy_client('ssm')`` style globals without
+    importing boto3 or building the client at import time.
+    """
+
+    def __init__(self, service_name, region_name=None, wrap=None):
+        self._service_name = service_name
+        self._region_name = region_name
+        self._wrap = wrap
+
+    def __getattr__(self, name):
+        return getattr(client(self._service_name, self._region_name, self._wrap), name)
+
+
+def lazy_client(service_name, region_name=None, wrap=None):
+    """A LazyClient for the registry's ``service_name`` client"""
+    return LazyClient(service_name, region_name, wrap)
@@ -3,7 +3,7 @@
 
 locals {
   # Define DSpace job configurations
-  dspace_jobs = {
+  dspace_jobs = merge(local.stats_ecs_jobs, {
     checker = {
       description         = "DSpace checker job - runs weekly on Mondays at 8 AM UTC"
       schedule_expression = "cron(0 8 ? * 1 *)"
@@ -49,11 +49,15 @@ locals {
       schedule_expression = "cron(0 6 ? * 1 *)"
       command             = "/dspace/bin/dspace subscription-send -f W"
     }
-    stats-export = {
-      description         = "DSpace statistics export job - runs monthly on the 1st at 2 AM UTC"
-      schedule_expression = "cron(0 2 1 * ? *)"
-      command             = "/dspace/bin/dspace solr-export-statistics -i statistics -l m -d /tmp && echo 'Export complete, uploading to S3...' && MONTH=$(date -d 'last month' +%Y-%m) && aws s3 sync /tmp/ s3://${aws_s3_bucket.statistics_exports.bucket}/$MONTH/ && echo 'Upload complete to s3://${aws_s3_bucket.statistics_exports.bucket}/$MONTH/'"
-    }
+  })
+
+  # Statistics exports and imports move to the streaming Lambdas when they are enabled
+  stats_ecs_jobs = merge(
+    { for name, job in local.stats_export_jobs : name => job if !var.enable_stats_export_lambda },
+    { for name, job in local.stats_import_jobs : name => job if !var.enable_stats_import_lambda }
+  )
+
+  stats_import_jobs = {
     statistics-import = {
       description = "DSpace statistics import job - manual trigger only"
       event_pattern = jsonencode({
@@ -62,6 +66,14 @@ locals {
       })
       command = "aws s3 sync s3://${aws_s3_bucket.statistics_exports.bucket}/full/ /tmp/stats/ && /dspace/bin/dspace solr-import-statistics -d /tmp/stats/"
     }
+  }
+
+  stats_export_jobs = {
+    stats-export = {
+      description         = "DSpace statistics export job - runs monthly on the 1st at 2 AM UTC"
+      schedule_expression = "cron(0 2 1 * ? *)"
+      command             = "/dspace/bin/dspace solr-export-statistics -i statistics -l m -d /tmp && echo 'Export complete, uploading to S3...' && MONTH=$(date -d 'last month' +%Y-%m) && aws s3 sync /tmp/ s3://${aws_s3_bucket.statistics_exports.bucket}/$MONTH/ && echo 'Upload complete to s3://${aws_s3_bucket.statistics_exports.bucket}/$MONTH/'"
+    }
     stats-export-daily = {
       description         = "DSpace statistics export job - runs nightly at 2 AM UTC"
       schedule_expression = "cron(0 2 * * ? *)"
@@ -1,85 +1,193 @@
 import json
-import boto3
-import time
 import os
+import time
+
+from clients import lazy_client
+from waiters import describe_tasks_batched, wait_until
+
+# boto3 is imported and the client built on first use, then reused by warm invocations
+ecs = lazy_client('ecs')
+
+MAX_WAIT = 900  # seconds a step may run, across invocations
+HANDOFF_MARGIN = 30  # seconds of Lambda time kept back to return a continuation
+
+FAILURES = ('FAILED', 'TIMEOUT', 'ERROR')
+FINISHED = ('SUCCESS', 'SKIPPED', 'STOPPED') + FAILURES
+# Result keys of the default steps before INIT_STEPS, kept for callers reading them
+RESULT_ALIASES = {'db-init': 'database_init', 'solr-init': 'solr_init'}
 
-ecs = boto3.client('ecs')
 
 def handler(event, context):
     """
-    Lambda function to run DSpace initialization tasks sequentially.
-    1. Database migration and admin user creation
-    2. Solr collection import
+    Lambda function to run DSpace initialization tasks as a dependency graph.
+
+    Steps whose dependencies have succeeded are started together and all
+    running tasks are polled with one DescribeTasks call. The run stops at the
+    first failure, stopping the tasks of steps still running. If Lambda time
+    runs short (or ``wait_seconds`` in the event has passed) it returns status
+    202 with a ``continuation``; invoke again with ``{"continuation": ...}`` to
+    carry on waiting. Results are keyed by step name, and db-init and solr-init
+    also under their old keys ``database_init`` and ``solr_init``.
     """
-    
-    cluster_arn = os.environ['CLUSTER_ARN']
-    db_init_task_def = os.environ['DB_INIT_TASK_DEF']
-    solr_init_task_def = os.environ['SOLR_INIT_TASK_DEF']
-    subnet_ids = json.loads(os.environ['SUBNET_IDS'])
-    security_group_id = os.environ['SECURITY_GROUP_ID']
-    enable_public_ip = os.environ.get('ENABLE_PUBLIC_IP', 'false').lower() == 'true'
-    
-    network_config = {
-        'awsvpcConfiguration': {
-            'subnets': subnet_ids,
-            'securityGroups': [security_group_id],
-            'assignPublicIp': 'ENABLED' if enable_public_ip else 'DISABLED'
+    event = event or {}
+    continuation = event.get('continuation')
+
+    if continuation:
+        steps = continuation['steps']
+        state = continuation['state']
+        network_config = continuation['network_config']
+        cluster_arn = continuation['cluster_arn']
+        print(f"Resuming initialization: {json.dumps({name: s['status'] for name, s in state.items()})}")
+    else:
+        cluster_arn = os.environ['CLUSTER_ARN']
+        steps = init_steps()
+        state = {}
+        subnet_ids = json.loads(os.environ['SUBNET_IDS'])
+        security_group_id = os.environ['SECURITY_GROUP_ID']
+        enable_public_ip = os.environ.get('ENABLE_PUBLIC_IP', 'false').lower() == 'true'
+
+        network_config = {
+            'awsvpcConfiguration': {
+                'subnets': subnet_ids,
+                'securityGroups': [security_group_id],
+                'assignPublicIp': 'ENABLED' if enable_public_ip else 'DISABLED'
+            }
         }
-    }
-    
-    results = {}
-    
-    # Step 1: Run database initialization
-    print("Starting database initialization...")
-    db_task = run_task_and_wait(
-        cluster_arn,
-        db_init_task_def,
-        network_config,
-        'db-init'
-    )
-    results['database_init'] = db_task
-    
-    if db_task['status'] != 'SUCCESS':
+
+    done = run_steps(cluster_arn, steps, network_config, state, context=context,
+                     wait_seconds=event.get('wait_seconds'))
+    results = {name: step_result(name, s) for name, s in state.items()}
+    timings = {name: r['seconds'] for name, r in results.items() if r.get('seconds') is not None}
+    failed = [name for name, s in state.items() if s['status'] in FAILURES]
+    results.update({alias: results[name] for name, alias in RESULT_ALIASES.items() if name in results})
+
+    if not done:
+        print("Handing off: initialization tasks still running")
         return {
-            'statusCode': 500,
+            'statusCode': 202,
             'body': json.dumps({
-                'message': 'Database initialization failed',
-                'results': results
-            })
+                'message': 'Initialization tasks still running; invoke again with the continuation',
+                'results': results,
+                'timings': timings
+            }),
+            'continuation': {'cluster_arn': cluster_arn, 'steps': steps, 'state': state,
+                             'network_config': network_config}
         }
-    
-    # Step 2: Run Solr initialization
-    print("Starting Solr initialization...")
-    solr_task = run_task_and_wait(
-        cluster_arn,
-        solr_init_task_def,
-        network_config,
-        'solr-init'
-    )
-    results['solr_init'] = solr_task
-    
-    if solr_task['status'] != 'SUCCESS':
+
+    if failed:
         return {
             'statusCode': 500,
             'body': json.dumps({
-                'message': 'Solr initialization failed',
-                'results': results
+                'message': f"Initialization failed: {', '.join(failed)}",
+                'results': results,
+                'timings': timings
             })
         }
-    
+
     return {
         'statusCode': 200,
         'body': json.dumps({
             'message': 'All initialization tasks completed successfully',
-            'results': results
+            'results': results,
+            'timings': timings
         })
     }
 
-def run_task_and_wait(cluster_arn, task_definition, network_config, task_name):
-    """Run an ECS task and wait for it to complete."""
-    
+
+def init_steps():
+    """Steps to run as [{'name', 'task_definition', 'depends_on'}].
+
+    Read from INIT_STEPS (JSON); without it db-init runs before solr-init.
+    """
+    if os.environ.get('INIT_STEPS'):
+        steps = json.loads(os.environ['INIT_STEPS'])
+    else:
+        steps = [
+            {'name': 'db-init', 'task_definition': os.environ['DB_INIT_TASK_DEF'], 'depends_on': []},
+            {'name': 'solr-init', 'task_definition': os.environ['SOLR_INIT_TASK_DEF'], 'depends_on': ['db-init']}
+        ]
+    names = {step['name'] for step in steps}
+    for step in steps:
+        step.setdefault('depends_on', [])
+        unknown = set(step['depends_on']) - names
+        if unknown:
+            raise ValueError(f"Step {step['name']} depends on unknown steps {sorted(unknown)}")
+
+    # Every step must become startable once the steps before it have run
+    ordered = set()
+    while len(ordered) < len(steps):
+        ready = {step['name'] for step in steps
+                 if step['name'] not in ordered and set(step['depends_on']) <= ordered}
+        if not ready:
+            raise ValueError(f"Steps {sorted(names - ordered)} have circular dependencies")
+        ordered |= ready
+    return steps
+
+
+def run_steps(cluster_arn, steps, network_config, state, context=None, wait_seconds=None):
+    """Start ready steps and poll running ones until all finish, one fails, or it is time to hand off.
+
+    ``state`` maps step names to their progress and is updated in place so it
+    can be returned as a continuation. Returns False if steps are still running.
+    """
+    def failed():
+        return any(s['status'] in FAILURES for s in state.values())
+
+    def start_ready():
+        for step in steps:
+            name = step['name']
+            if name in state:
+                continue
+            if not all(state.get(dep, {}).get('status') == 'SUCCESS' for dep in step['depends_on']):
+                continue
+            print(f"Starting {name}...")
+            state[name] = start_task(cluster_arn, step['task_definition'], network_config, name)
+
+    def poll():
+        running = {s['task_arn']: name for name, s in state.items() if s['status'] == 'RUNNING'}
+        if running:
+            tasks = describe_tasks_batched(ecs, cluster_arn, list(running))
+            now = time.time()
+            for task_arn, name in running.items():
+                update_step(cluster_arn, state[name], tasks.get(task_arn), now)
+                print(f"Task {name} status: {state[name]['status']} ({state[name].get('last_status')})")
+        if failed():
+            return True
+        start_ready()
+        if failed():
+            return True
+        return len(state) == len(steps) and all(s['status'] in FINISHED for s in state.values())
+
+    start_ready()
+    if poll():
+        return finish(steps, state, cluster_arn)
+
+    timeout = wait_seconds
+    if context is not None:
+        remaining = context.get_remaining_time_in_millis() / 1000.0 - HANDOFF_MARGIN
+        timeout = remaining if timeout is None else min(timeout, remaining)
+    if wait_until(poll, timeout=max(0, timeout) if timeout is not None else MAX_WAIT,
+                  description='initialization tasks', initial_delay=5, max_delay=30):
+        return finish(steps, state, cluster_arn)
+    return False
+
+
+def finish(steps, state, cluster_arn):
+    """Stop tasks still running after a failure and mark steps that never started as SKIPPED"""
+    failed = [name for name, s in state.items() if s['status'] in FAILURES]
+    for name, step in state.items():
+        if failed and step['status'] == 'RUNNING':
+            stop_task(cluster_arn, step, f"Stopped after {', '.join(failed)} failed")
+    for step in steps:
+        if step['name'] not in state:
+            state[step['name']] = {'status': 'SKIPPED', 'message': 'A dependency did not succeed'}
+    return True
+
+
+def start_task(cluster_arn, task_definition, network_config, task_name):
+    """Start an ECS task and return its initial step state"""
+    started_at = time.time()
     try:
-        # Start the task
         response = ecs.run_task(
             cluster=cluster_arn,
             taskDefinition=task_definition,
@@ -87,85 +195,58 @@ def run_task_and_wait(cluster_arn, task_definition, network_config, task_name):
             networkConfiguration=network_config,
             startedBy='initialization-lambda'
         )
-        
-        if not response['tasks']:
-            return {
-                'status': 'FAILED',
-                'message': 'Failed to start task',
-                'task_name': task_name
-            }
-        
-        task_arn = response['tasks'][0]['taskArn']
-        print(f"Started task {task_name}: {task_arn}")
-        
-        # Wait for task to complete (max 15 minutes)
-        max_wait = 900  # 15 minutes
-        wait_interval = 10  # 10 seconds
-        elapsed = 0
-        
-        while elapsed < max_wait:
-            time.sleep(wait_interval)
-            elapsed += wait_interval
-            
-            # Check task status
-            describe_response = ecs.describe_tasks(
-                cluster=cluster_arn,
-                tasks=[task_arn]
-            )
-            
-            if not describe_response['tasks']:
-                return {
-                    'status': 'FAILED',
-                    'message': 'Task disappeared',
-                    'task_name': task_name,
-                    'task_arn': task_arn
-                }
-            
-            task = describe_response['tasks'][0]
-            last_status = task['lastStatus']
-            
-            print(f"Task {task_name} status: {last_status}")
-            
-            if last_status == 'STOPPED':
-                # Check exit code
-                containers = task.get('containers', [])
-                if containers:
-                    exit_code = containers[0].get('exitCode', 1)
-                    if exit_code == 0:
-                        return {
-                            'status': 'SUCCESS',
-                            'message': 'Task completed successfully',
-                            'task_name': task_name,
-                            'task_arn': task_arn,
-                            'exit_code': exit_code
-                        }
-                    else:
-                        return {
-                            'status': 'FAILED',
-                            'message': f'Task exited with code {exit_code}',
-                            'task_name': task_name,
-                            'task_arn': task_arn,
-                            'exit_code': exit_code
-                        }
-                else:
-                    return {
-                        'status': 'FAILED',
-                        'message': 'No container information available',
-                        'task_name': task_name,
-                        'task_arn': task_arn
-                    }
-        
-        # Timeout
-        return {
-            'status': 'TIMEOUT',
-            'message': f'Task did not complete within {max_wait} seconds',
-            'task_name': task_name,
-            'task_arn': task_arn
-        }
-        
     except Exception as e:
-        return {
-            'status': 'ERROR',
-            'message': str(e),
-            'task_name': task_name
-        }
+        return {'status': 'ERROR', 'message': str(e), 'started_at': started_at, 'finished_at': time.time()}
+
+    if not response['tasks']:
+        return {'status': 'FAILED', 'message': 'Failed to start task', 'started_at': started_at,
+                'finished_at': time.time()}
+
+    task_arn = response['tasks'][0]['taskArn']
+    print(f"Started task {task_name}: {task_arn}")
+    return {'status': 'RUNNING', 'task_arn': task_arn, 'started_at': started_at}
+
+
+def stop_task(cluster_arn, step, reason, status='STOPPED'):
+    """Stop a RUNNING step's task; the step is marked ``status`` even if StopTask fails"""
+    print(f"Stopping task {step['task_arn']}: {reason}")
+    try:
+        ecs.stop_task(cluster=cluster_arn, task=step['task_arn'], reason=reason[:255])
+    except Exception as e:
+        print(f"Failed to stop task {step['task_arn']}: {e}")
+    step.update(status=status, message=reason, finished_at=time.time())
+
+
+def update_step(cluster_arn, step, task, now):
+    """Move a RUNNING step to its final status once its task has stopped, stopping it once it has timed out"""
+    if task is None:
+        step.update(status='FAILED', message='Task disappeared', finished_at=now)
+        return
+    step['last_status'] = task['lastStatus']
+    if task['lastStatus'] != 'STOPPED':
+        if now - step['started_at'] > MAX_WAIT:
+            stop_task(cluster_arn, step, f"Task did not complete within {MAX_WAIT} seconds", status='TIMEOUT')
+        return
+
+    # Check exit code
+    containers = task.get('containers', [])
+    if not containers:
+        step.update(status='FAILED', message='No container information available', finished_at=now)
+        return
+    exit_code = containers[0].get('exitCode', 1)
+    step['exit_code'] = exit_code
+    if exit_code == 0:
+        step.update(status='SUCCESS', message='Task completed successfully', finished_at=now)
+    else:
+        step.update(status='FAILED', message=f"Task exited with code {exit_code}", finished_at=now)
+
+
+def step_result(name, step):
+    """Result entry of a step, with its duration in seconds once it has finished"""
+    result = {'status': step['status'], 'message': step.get('message', 'Task running'), 'task_name': name}
+    for key in ('task_arn', 'exit_code'):
+        if key in step:
+            result[key] = step[key]
+    if 'started_at' in step:
+        result['seconds'] = round(step.get('finished_at', time.time()) - step['started_at'], 1)
+    return result
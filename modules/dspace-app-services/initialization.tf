@@ -176,9 +176,22 @@ resource "aws_lambda_function" "run_init_tasks" {
       CLUSTER_ARN        = var.ecs_cluster_arn
       DB_INIT_TASK_DEF   = aws_ecs_task_definition.db_init.arn
       SOLR_INIT_TASK_DEF = aws_ecs_task_definition.solr_init.arn
-      SUBNET_IDS         = jsonencode(var.private_subnet_ids)
-      SECURITY_GROUP_ID  = var.ecs_security_group_id
-      ENABLE_PUBLIC_IP   = "false"
+      # Steps start as soon as the steps they depend on have succeeded
+      INIT_STEPS = jsonencode([
+        {
+          name            = "db-init"
+          task_definition = aws_ecs_task_definition.db_init.arn
+          depends_on      = []
+        },
+        {
+          name            = "solr-init"
+          task_definition = aws_ecs_task_definition.solr_init.arn
+          depends_on      = var.init_solr_after_db ? ["db-init"] : []
+        }
+      ])
+      SUBNET_IDS        = jsonencode(var.private_subnet_ids)
+      SECURITY_GROUP_ID = var.ecs_security_group_id
+      ENABLE_PUBLIC_IP  = "false"
     }
   }
 
@@ -196,6 +209,17 @@ data "archive_file" "init_lambda" {
     content  = file("${path.module}/init_lambda.py")
     filename = "index.py"
   }
+
+  # Backoff/deadline waiter and lazy client registry, copied from the Solr operations Lambda layer
+  source {
+    content  = file("${path.module}/waiters.py")
+    filename = "waiters.py"
+  }
+
+  source {
+    content  = file("${path.module}/clients.py")
+    filename = "clients.py"
+  }
 }
 
 # IAM role for Lambda
@@ -234,7 +258,8 @@ resource "aws_iam_role_policy" "init_lambda" {
         Effect = "Allow"
         Action = [
           "ecs:RunTask",
-          "ecs:DescribeTasks"
+          "ecs:DescribeTasks",
+          "ecs:StopTask"
         ]
         Resource = "*"
       },
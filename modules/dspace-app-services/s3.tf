@@ -78,6 +78,11 @@ resource "aws_s3_bucket_lifecycle_configuration" "statistics_exports" {
       noncurrent_days = 90
     }
 
+    # Parts of streaming exports that were never completed
+    abort_incomplete_multipart_upload {
+      days_after_initiation = 7
+    }
+
     transition {
       days          = 30
       storage_class = "STANDARD_IA"
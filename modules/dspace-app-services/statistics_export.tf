@@ -0,0 +1,183 @@
+# Streaming statistics export
+# Pages the Solr statistics collection straight into S3 multipart uploads, replacing the
+# stats-export, stats-export-daily and stats-full-export ECS jobs when enabled
+
+locals {
+  stats_export_function_name = "${var.organization}-${var.environment}-${var.project_name}-stats-export"
+
+  stats_export_schedules = {
+    stats-export = {
+      description         = "DSpace statistics export - runs monthly on the 1st at 2 AM UTC"
+      schedule_expression = "cron(0 2 1 * ? *)"
+      job                 = "monthly"
+    }
+    stats-export-daily = {
+      description         = "DSpace statistics export - runs nightly at 2 AM UTC"
+      schedule_expression = "cron(0 2 * * ? *)"
+      job                 = "daily"
+    }
+    stats-full-export = {
+      description = "DSpace full statistics export - manual execution"
+      event_pattern = jsonencode({
+        source = ["manual"]
+      })
+      job = "full"
+    }
+  }
+}
+
+# Lambda function to export statistics
+resource "aws_lambda_function" "stats_export" {
+  count = var.enable_stats_export_lambda ? 1 : 0
+
+  filename      = data.archive_file.stats_export[0].output_path
+  function_name = local.stats_export_function_name
+  role          = aws_iam_role.stats_export[0].arn
+  handler       = "index.handler"
+  runtime       = "python3.11"
+  timeout       = 900
+  memory_size   = 1024
+
+  source_code_hash = data.archive_file.stats_export[0].output_base64sha256
+
+  # Solr is only reachable from inside the VPC
+  vpc_config {
+    subnet_ids         = var.private_subnet_ids
+    security_group_ids = [var.ecs_security_group_id]
+  }
+
+  environment {
+    variables = {
+      SOLR_URL = var.solr_url
+      BUCKET   = aws_s3_bucket.statistics_exports.bucket
+    }
+  }
+
+  tags = local.tags
+}
+
+# Lambda function code
+data "archive_file" "stats_export" {
+  count = var.enable_stats_export_lambda ? 1 : 0
+
+  type        = "zip"
+  output_path = "${path.module}/stats_export.zip"
+
+  source {
+    content  = file("${path.module}/stats_export.py")
+    filename = "index.py"
+  }
+
+  # Lazy client registry, copied from the Solr operations Lambda layer
+  source {
+    content  = file("${path.module}/clients.py")
+    filename = "clients.py"
+  }
+}
+
+# IAM role for Lambda
+resource "aws_iam_role" "stats_export" {
+  count = var.enable_stats_export_lambda ? 1 : 0
+
+  name = "${local.stats_export_function_name}-lambda"
+
+  assume_role_policy = jsonencode({
+    Version = "2012-10-17"
+    Statement = [
+      {
+        Action = "sts:AssumeRole"
+        Effect = "Allow"
+        Principal = {
+          Service = "lambda.amazonaws.com"
+        }
+      }
+    ]
+  })
+
+  tags = local.tags
+}
+
+# IAM policy for Lambda
+resource "aws_iam_role_policy" "stats_export" {
+  count = var.enable_stats_export_lambda ? 1 : 0
+
+  name = "${local.stats_export_function_name}-lambda-policy"
+  role = aws_iam_role.stats_export[0].id
+
+  policy = jsonencode({
+    Version = "2012-10-17"
+    Statement = [
+      {
+        Effect = "Allow"
+        Action = [
+          "s3:GetObject",
+          "s3:PutObject",
+          "s3:AbortMultipartUpload",
+          "s3:ListMultipartUploadParts"
+        ]
+        Resource = "${aws_s3_bucket.statistics_exports.arn}/*"
+      },
+      {
+        Effect   = "Allow"
+        Action   = ["s3:ListBucket"]
+        Resource = aws_s3_bucket.statistics_exports.arn
+      },
+      {
+        # Long exports hand off to a new invocation of the same function
+        Effect   = "Allow"
+        Action   = ["lambda:InvokeFunction"]
+        Resource = "arn:aws:lambda:${data.aws_region.current.name}:${data.aws_caller_identity.current.account_id}:function:${local.stats_export_function_name}"
+      }
+    ]
+  })
+}
+
+# Attach VPC access (includes basic execution) policy
+resource "aws_iam_role_policy_attachment" "stats_export_vpc" {
+  count = var.enable_stats_export_lambda ? 1 : 0
+
+  role       = aws_iam_role.stats_export[0].name
+  policy_arn = "arn:aws:iam::aws:policy/service-role/AWSLambdaVPCAccessExecutionRole"
+}
+
+# EventBridge rules for the exports
+resource "aws_cloudwatch_event_rule" "stats_export" {
+  for_each = { for name, export in local.stats_export_schedules : name => export if var.enable_stats_export_lambda }
+
+  name                = "${var.project_name}-${var.environment}-lambda-${each.key}"
+  description         = each.value.description
+  schedule_expression = lookup(each.value, "schedule_expression", null)
+  event_pattern       = lookup(each.value, "event_pattern", null)
+  state               = "ENABLED"
+
+  tags = merge(local.tags, {
+    Name    = "${var.project_name}-${var.environment}-lambda-${each.key}"
+    JobType = each.key
+  })
+}
+
+resource "aws_cloudwatch_event_target" "stats_export" {
+  for_each = { for name, export in local.stats_export_schedules : name => export if var.enable_stats_export_lambda }
+
+  rule      = aws_cloudwatch_event_rule.stats_export[each.key].name
+  target_id = "${var.project_name}-${var.environment}-lambda-${each.key}"
+  arn       = aws_lambda_function.stats_export[0].arn
+
+  # Keep the event detail so a custom event can pass {"force": true}
+  input_transformer {
+    input_paths = {
+      detail = "$.detail"
+    }
+    input_template = "{\"job\": ${jsonencode(each.value.job)}, \"detail\": <detail>}"
+  }
+}
+
+resource "aws_lambda_permission" "stats_export" {
+  for_each = { for name, export in local.stats_export_schedules : name => export if var.enable_stats_export_lambda }
+
+  statement_id  = "AllowExecutionFromEventBridge-${each.key}"
+  action        = "lambda:InvokeFunction"
+  function_name = aws_lambda_function.stats_export[0].function_name
+  principal     = "events.amazonaws.com"
+  source_arn    = aws_cloudwatch_event_rule.stats_export[each.key].arn
+}
@@ -0,0 +1,156 @@
+# Streaming statistics import
+# Streams exported NDJSON statistics from S3 into Solr with batched, back-pressured updates,
+# replacing the statistics-import ECS job when enabled
+
+locals {
+  stats_import_function_name = "${var.organization}-${var.environment}-${var.project_name}-stats-import"
+}
+
+# Lambda function to import statistics
+resource "aws_lambda_function" "stats_import" {
+  count = var.enable_stats_import_lambda ? 1 : 0
+
+  filename      = data.archive_file.stats_import[0].output_path
+  function_name = local.stats_import_function_name
+  role          = aws_iam_role.stats_import[0].arn
+  handler       = "index.handler"
+  runtime       = "python3.11"
+  timeout       = 900
+  memory_size   = 1024
+
+  source_code_hash = data.archive_file.stats_import[0].output_base64sha256
+
+  # Solr is only reachable from inside the VPC
+  vpc_config {
+    subnet_ids         = var.private_subnet_ids
+    security_group_ids = [var.ecs_security_group_id]
+  }
+
+  environment {
+    variables = {
+      SOLR_URL = var.solr_url
+      BUCKET   = aws_s3_bucket.statistics_exports.bucket
+    }
+  }
+
+  tags = local.tags
+}
+
+# Lambda function code
+data "archive_file" "stats_import" {
+  count = var.enable_stats_import_lambda ? 1 : 0
+
+  type        = "zip"
+  output_path = "${path.module}/stats_import.zip"
+
+  source {
+    content  = file("${path.module}/stats_import.py")
+    filename = "index.py"
+  }
+
+  # Lazy client registry, copied from the Solr operations Lambda layer
+  source {
+    content  = file("${path.module}/clients.py")
+    filename = "clients.py"
+  }
+}
+
+# IAM role for Lambda
+resource "aws_iam_role" "stats_import" {
+  count = var.enable_stats_import_lambda ? 1 : 0
+
+  name = "${local.stats_import_function_name}-lambda"
+
+  assume_role_policy = jsonencode({
+    Version = "2012-10-17"
+    Statement = [
+      {
+        Action = "sts:AssumeRole"
+        Effect = "Allow"
+        Principal = {
+          Service = "lambda.amazonaws.com"
+        }
+      }
+    ]
+  })
+
+  tags = local.tags
+}
+
+# IAM policy for Lambda
+resource "aws_iam_role_policy" "stats_import" {
+  count = var.enable_stats_import_lambda ? 1 : 0
+
+  name = "${local.stats_import_function_name}-lambda-policy"
+  role = aws_iam_role.stats_import[0].id
+
+  policy = jsonencode({
+    Version = "2012-10-17"
+    Statement = [
+      {
+        # PutObject only writes the import progress (_import_state.json)
+        Effect = "Allow"
+        Action = [
+          "s3:GetObject",
+          "s3:PutObject"
+        ]
+        Resource = "${aws_s3_bucket.statistics_exports.arn}/*"
+      },
+      {
+        Effect   = "Allow"
+        Action   = ["s3:ListBucket"]
+        Resource = aws_s3_bucket.statistics_exports.arn
+      },
+      {
+        # Long imports hand off to a new invocation of the same function
+        Effect   = "Allow"
+        Action   = ["lambda:InvokeFunction"]
+        Resource = "arn:aws:lambda:${data.aws_region.current.name}:${data.aws_caller_identity.current.account_id}:function:${local.stats_import_function_name}"
+      }
+    ]
+  })
+}
+
+# Attach VPC access (includes basic execution) policy
+resource "aws_iam_role_policy_attachment" "stats_import_vpc" {
+  count = var.enable_stats_import_lambda ? 1 : 0
+
+  role       = aws_iam_role.stats_import[0].name
+  policy_arn = "arn:aws:iam::aws:policy/service-role/AWSLambdaVPCAccessExecutionRole"
+}
+
+# EventBridge rule for the import - manual trigger only; the event's detail may set prefix (default full/)
+resource "aws_cloudwatch_event_rule" "stats_import" {
+  count = var.enable_stats_import_lambda ? 1 : 0
+
+  name        = "${var.project_name}-${var.environment}-lambda-statistics-import"
+  description = "DSpace statistics import - manual trigger only"
+  event_pattern = jsonencode({
+    source      = ["dspace.statistics"]
+    detail-type = ["Statistics Import"]
+  })
+  state = "ENABLED"
+
+  tags = merge(local.tags, {
+    Name    = "${var.project_name}-${var.environment}-lambda-statistics-import"
+    JobType = "statistics-import"
+  })
+}
+
+resource "aws_cloudwatch_event_target" "stats_import" {
+  count = var.enable_stats_import_lambda ? 1 : 0
+
+  rule      = aws_cloudwatch_event_rule.stats_import[0].name
+  target_id = "${var.project_name}-${var.environment}-lambda-statistics-import"
+  arn       = aws_lambda_function.stats_import[0].arn
+}
+
+resource "aws_lambda_permission" "stats_import" {
+  count = var.enable_stats_import_lambda ? 1 : 0
+
+  statement_id  = "AllowExecutionFromEventBridge"
+  action        = "lambda:InvokeFunction"
+  function_name = aws_lambda_function.stats_import[0].function_name
+  principal     = "events.amazonaws.com"
+  source_arn    = aws_cloudwatch_event_rule.stats_import[0].arn
+}
@@ -0,0 +1,329 @@
+import argparse
+import gzip
+import io
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+from urllib.parse import urlencode
+
+from clients import http_pool, lazy_client
+
+# Clients are built on first use and reused by warm invocations
+s3 = lazy_client('s3')
+lambda_client = lazy_client('lambda')
+
+COLLECTION = 'statistics'
+UNIQUE_KEY = 'uid'  # cursorMark needs a sort on the uniqueKey of the statistics schema
+PAGE_ROWS = int(os.environ.get('STATS_EXPORT_ROWS', '5000'))
+WORKERS = int(os.environ.get('STATS_EXPORT_WORKERS', '4'))  # shards read (and parts uploaded) at once
+MIN_PART_SIZE = 5 * 1024 * 1024  # S3 minimum for every part but the last
+PART_SIZE = max(MIN_PART_SIZE, int(os.environ.get('STATS_EXPORT_PART_MB', '16')) * 1024 * 1024)
+HANDOFF_MARGIN = 60  # seconds of Lambda time kept back to save the manifest and re-invoke
+REQUEST_TIMEOUT = 60
+RETRIES = 3
+MANIFEST = '_manifest.json'
+
+# ``last`` values of the export (as in dspace solr-export-statistics -l) and the time filter of each
+LAST_FILTERS = {
+    'd': 'time:[NOW/DAY-1DAY TO NOW/DAY}',
+    'm': 'time:[NOW/MONTH-1MONTH TO NOW/MONTH}',
+    'y': 'time:[NOW/YEAR-1YEAR TO NOW/YEAR}',
+    'a': None
+}
+
+
+def job_target(job, now=None):
+    """(last, prefix) of a scheduled export: 'monthly' (last month), 'daily' (yesterday) or 'full'"""
+    now = now or datetime.now(timezone.utc)
+    if job == 'monthly':
+        last_month = now.replace(day=1) - timedelta(days=1)
+        return 'm', f"{last_month:%Y-%m}/"
+    if job == 'daily':
+        return 'd', f"daily/{now:%Y-%m-%d}/"
+    if job == 'full':
+        return 'a', 'full/'
+    raise ValueError(f"Unknown export job {job}")
+
+
+def handler(event, context):
+    """
+    Lambda function to export the statistics collection to S3.
+
+    The event names a ``job`` (monthly, daily or full) or gives ``prefix`` and
+    ``last`` directly. An unfinished export at the prefix is resumed and a
+    complete one is replaced; ``force`` (top level or in ``detail``) starts
+    over even if it is unfinished. If Lambda time runs short the manifest is
+    saved and the function invokes itself with a ``continuation`` to carry on
+    from the last uploaded part.
+    """
+    event = event or {}
+    force = bool(event.get('force') or (event.get('detail') or {}).get('force'))
+    params = event.get('continuation') or {}
+    if not params:
+        if event.get('job'):
+            last, prefix = job_target(event['job'])
+        else:
+            last, prefix = event.get('last', 'a'), event['prefix']
+        params = {'prefix': prefix, 'last': last, 'collection': event.get('collection', COLLECTION)}
+
+    export = StatisticsExport(os.environ['SOLR_URL'], os.environ['BUCKET'], params['prefix'],
+                              collection=params['collection'], last=params['last'])
+    deadline = None
+    if context is not None:
+        deadline = time.time() + context.get_remaining_time_in_millis() / 1000.0 - HANDOFF_MARGIN
+    try:
+        complete = export.run(deadline=deadline, force=force and not event.get('continuation'),
+                              continuing=bool(event.get('continuation')))
+    except Exception as e:
+        print(f"Export to s3://{export.bucket}/{export.prefix} failed: {e}")
+        return {'statusCode': 500, 'body': json.dumps({'message': str(e), 'summary': export.summary()})}
+
+    if not complete:
+        print(f"Handing off: export to s3://{export.bucket}/{export.prefix} continues in a new invocation")
+        lambda_client.invoke(FunctionName=context.function_name, InvocationType='Event',
+                             Payload=json.dumps({'continuation': params}).encode())
+        return {'statusCode': 202, 'body': json.dumps({'message': 'Export continues', 'summary': export.summary()}),
+                'continuation': params}
+
+    return {'statusCode': 200, 'body': json.dumps({'message': 'Export complete', 'summary': export.summary()})}
+
+
+class StatisticsExport:
+    """Streams a Solr collection to S3 as gzip-compressed NDJSON, one object per shard.
+
+    Each shard is paged with cursorMark and its pages are compressed into parts
+    of ``part_size`` bytes. Every part is a complete gzip member, so the object
+    is a single valid gzip file, and the manifest records the cursorMark after
+    each uploaded part. A re-run with the same prefix resumes from there; memory
+    is bounded by one part per worker.
+    """
+
+    def __init__(self, solr_url, bucket, prefix, collection=COLLECTION, last='a', rows=PAGE_ROWS,
+                 part_size=PART_SIZE, workers=WORKERS, s3_client=None, http=None):
+        if last not in LAST_FILTERS:
+            raise ValueError(f"last must be one of {sorted(LAST_FILTERS)}, not {last}")
+        self.solr_url = solr_url.rstrip('/')
+        self.bucket = bucket
+        self.prefix = prefix if not prefix or prefix.endswith('/') else f"{prefix}/"
+        self.collection = collection
+        self.last = last
+        self.rows = rows
+        self.part_size = max(MIN_PART_SIZE, part_size)
+        self.workers = max(1, workers)
+        self.s3 = s3_client or s3
+        self.http = http or http_pool('solr', maxsize=self.workers, retries=False)
+        self.manifest = None
+        self._lock = threading.Lock()
+        self._save_lock = threading.Lock()  # held across put_object, so manifest writes land in order
+        self._revision = 0
+        self._saved_revision = 0
+
+    @property
+    def manifest_key(self):
+        return f"{self.prefix}{MANIFEST}"
+
+    def run(self, deadline=None, force=False, continuing=False):
+        """Export every shard not yet complete; returns False if stopped by ``deadline`` (epoch seconds).
+
+        An unfinished export at the prefix is resumed. A complete one is replaced
+        by a new export, except when ``continuing`` a hand-off, which only ever
+        carries on the export it was handed.
+        """
+        started = time.time()
+        self.manifest = None if force else self.load()
+        if self.manifest and self.manifest.get('complete'):
+            if continuing:
+                print(f"s3://{self.bucket}/{self.prefix} is already complete, nothing to do")
+                return True
+            print(f"Replacing the complete export at s3://{self.bucket}/{self.prefix} from "
+                  f"{datetime.fromtimestamp(self.manifest['started_at'], timezone.utc):%Y-%m-%d %H:%M} UTC")
+            self.manifest = None
+        if force:
+            self.abort()
+        if self.manifest is None:
+            self.manifest = self.new_manifest()
+            self.save()
+        else:
+            print(f"Resuming export to s3://{self.bucket}/{self.prefix}: "
+                  f"{sum(s['docs'] for s in self.manifest['shards'].values())} docs already uploaded")
+
+        pending = [name for name, entry in self.manifest['shards'].items() if not entry['done']]
+        docs_before = sum(s['docs'] for s in self.manifest['shards'].values())
+        with ThreadPoolExecutor(max_workers=min(self.workers, len(pending) or 1)) as pool:
+            done = all(list(pool.map(lambda name: self.export_shard(name, deadline), pending)))
+
+        exported = sum(s['docs'] for s in self.manifest['shards'].values()) - docs_before
+        elapsed = max(time.time() - started, 0.001)
+        print(f"Exported {exported} docs in {elapsed:.0f}s ({exported / elapsed:.0f} docs/s)")
+        if done:
+            self.manifest['complete'] = True
+            self.save()
+            print(f"Export to s3://{self.bucket}/{self.prefix} complete")
+        return done
+
+    def new_manifest(self):
+        shards = self.list_shards()
+        entries = {}
+        for shard in shards:
+            name = shard or self.collection
+            key = f"{self.prefix}{self.collection}-{shard}.ndjson.gz" if shard else f"{self.prefix}{self.collection}.ndjson.gz"
+            upload = self.s3.create_multipart_upload(Bucket=self.bucket, Key=key,
+                                                     ContentType='application/gzip')
+            entries[name] = {'shard': shard, 'key': key, 'upload_id': upload['UploadId'], 'cursor': '*',
+                             'parts': [], 'docs': 0, 'bytes': 0, 'done': False}
+        print(f"Exporting {self.collection} ({self.last}) to s3://{self.bucket}/{self.prefix} from {len(entries)} shards")
+        return {'collection': self.collection, 'last': self.last, 'filter': LAST_FILTERS[self.last],
+                'started_at': time.time(), 'complete': False, 'shards': entries}
+
+    def list_shards(self):
+        """Active shard names of the collection, or [None] to read it as a whole (e.g. standalone Solr)"""
+        try:
+            status = self._get('admin/collections', {'action': 'CLUSTERSTATUS', 'collection': self.collection})
+            shards = status['cluster']['collections'][self.collection]['shards']
+        except Exception as e:
+            print(f"Could not list shards of {self.collection}, reading it unsharded: {e}")
+            return [None]
+        return sorted(name for name, shard in shards.items() if shard.get('state', 'active') == 'active') or [None]
+
+    def export_shard(self, name, deadline=None):
+        """Page one shard into its multipart upload; returns False if stopped by ``deadline``"""
+        entry = self.manifest['shards'][name]
+        fq = LAST_FILTERS[self.last]
+        cursor = entry['cursor']
+        buffer = io.BytesIO()
+        stream = gzip.GzipFile(fileobj=buffer, mode='wb', compresslevel=6)
+        docs = 0
+        try:
+            while True:
+                if deadline is not None and time.time() > deadline:
+                    # The buffered pages are read again from the saved cursor next time
+                    print(f"Stopping {name} at {entry['docs']} docs to hand off")
+                    return False
+                params = {'q': '*:*', 'sort': f"{UNIQUE_KEY} asc", 'rows': self.rows, 'cursorMark': cursor,
+                          'wt': 'json'}
+                if fq:
+                    params['fq'] = fq
+                if entry['shard']:
+                    params['shards'] = entry['shard']
+                page = self._get(f"{self.collection}/select", params)
+                for doc in page['response']['docs']:
+                    doc.pop('_version_', None)
+                    stream.write(json.dumps(doc, separators=(',', ':')).encode() + b'\n')
+                docs += len(page['response']['docs'])
+                next_cursor = page['nextCursorMark']
+                finished = next_cursor == cursor
+                cursor = next_cursor
+                if finished or buffer.tell() >= self.part_size:
+                    stream.close()
+                    self._upload_part(entry, buffer.getvalue(), cursor, docs)
+                    buffer = io.BytesIO()
+                    stream = gzip.GzipFile(fileobj=buffer, mode='wb', compresslevel=6)
+                    docs = 0
+                if finished:
+                    break
+        finally:
+            stream.close()
+
+        self.s3.complete_multipart_upload(Bucket=self.bucket, Key=entry['key'], UploadId=entry['upload_id'],
+                                          MultipartUpload={'Parts': entry['parts']})
+        with self._lock:
+            entry['done'] = True
+        self.save()
+        print(f"Shard {name}: {entry['docs']} docs, {entry['bytes']} bytes in {len(entry['parts'])} parts "
+              f"to s3://{self.bucket}/{entry['key']}")
+        return True
+
+    def _upload_part(self, entry, body, cursor, docs):
+        part_number = len(entry['parts']) + 1
+        response = self.s3.upload_part(Bucket=self.bucket, Key=entry['key'], UploadId=entry['upload_id'],
+                                       PartNumber=part_number, Body=body)
+        with self._lock:
+            entry['parts'].append({'PartNumber': part_number, 'ETag': response['ETag']})
+            entry['cursor'] = cursor
+            entry['docs'] += docs
+            entry['bytes'] += len(body)
+        self.save()
+
+    def load(self):
+        try:
+            response = self.s3.get_object(Bucket=self.bucket, Key=self.manifest_key)
+        except Exception as e:
+            if 'NoSuchKey' in str(e) or 'Not Found' in str(e) or '404' in str(e):
+                return None
+            raise
+        manifest = json.loads(response['Body'].read())
+        if (manifest['collection'], manifest['last']) != (self.collection, self.last):
+            raise ValueError(f"s3://{self.bucket}/{self.manifest_key} is an export of "
+                             f"{manifest['collection']} ({manifest['last']}); use force to replace it")
+        return manifest
+
+    def save(self):
+        """Write the manifest; a snapshot older than one already written is skipped, not written over it"""
+        with self._lock:
+            self.manifest['updated_at'] = time.time()
+            body = json.dumps(self.manifest, indent=2).encode()
+            self._revision += 1
+            revision = self._revision
+        with self._save_lock:
+            if revision <= self._saved_revision:
+                return
+            self.s3.put_object(Bucket=self.bucket, Key=self.manifest_key, Body=body, ContentType='application/json')
+            self._saved_revision = revision
+
+    def abort(self):
+        """Abort the unfinished uploads of an existing manifest before starting over"""
+        try:
+            previous = self.load()
+        except ValueError:
+            previous = None
+        for entry in (previous or {}).get('shards', {}).values():
+            if not entry['done']:
+                try:
+                    self.s3.abort_multipart_upload(Bucket=self.bucket, Key=entry['key'], UploadId=entry['upload_id'])
+                except Exception as e:
+                    print(f"Could not abort upload of {entry['key']}: {e}")
+
+    def summary(self):
+        if not self.manifest:
+            return {}
+        return {name: {'docs': s['docs'], 'bytes': s['bytes'], 'parts': len(s['parts']), 'done': s['done']}
+                for name, s in self.manifest['shards'].items()}
+
+    def _get(self, path, params):
+        url = f"{self.solr_url}/{path}?{urlencode(dict(params, wt='json'))}"
+        for attempt in range(RETRIES):
+            try:
+                response = self.http.request('GET', url, timeout=REQUEST_TIMEOUT)
+                if response.status == 200:
+                    return json.loads(response.data)
+                error = f"HTTP {response.status}: {response.data[:200]}"
+            except Exception as e:
+                error = str(e)
+            print(f"Solr request {path} failed (attempt {attempt + 1}/{RETRIES}): {error}")
+            time.sleep(2 ** attempt)
+        raise RuntimeError(f"Solr request {path} failed: {error}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Export the Solr statistics collection to S3 as gzip NDJSON')
+    parser.add_argument('--solr-url', default=os.environ.get('SOLR_URL'), help='Solr base URL, ending in /solr')
+    parser.add_argument('--bucket', default=os.environ.get('BUCKET'))
+    parser.add_argument('--prefix', help='key prefix of the export (default: from --job)')
+    parser.add_argument('--job', choices=['monthly', 'daily', 'full'], default='full')
+    parser.add_argument('--last', choices=sorted(LAST_FILTERS), help='time range (default: from --job)')
+    parser.add_argument('--collection', default=COLLECTION)
+    parser.add_argument('--workers', type=int, default=WORKERS)
+    parser.add_argument('--force', action='store_true', help='start over instead of resuming an unfinished export')
+    args = parser.parse_args()
+
+    last, prefix = job_target(args.job)
+    export = StatisticsExport(args.solr_url, args.bucket, args.prefix or prefix, collection=args.collection,
+                              last=args.last or last, workers=args.workers)
+    return 0 if export.run(force=args.force) else 1
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
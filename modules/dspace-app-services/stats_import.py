@@ -0,0 +1,403 @@
+import argparse
+import gzip
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from clients import http_pool, lazy_client
+
+# Clients are built on first use and reused by warm invocations
+s3 = lazy_client('s3')
+lambda_client = lazy_client('lambda')
+
+COLLECTION = 'statistics'
+BATCH_DOCS = int(os.environ.get('STATS_IMPORT_BATCH_DOCS', '2000'))  # docs per /update request
+MAX_WORKERS = int(os.environ.get('STATS_IMPORT_MAX_WORKERS', '8'))  # most update requests in flight
+TARGET_LATENCY = float(os.environ.get('STATS_IMPORT_TARGET_LATENCY', '2.0'))  # seconds; slower batches shrink the pool
+COMMIT_INTERVAL = int(os.environ.get('STATS_IMPORT_COMMIT_INTERVAL', '120'))  # seconds between hard commits
+HANDOFF_MARGIN = 90  # seconds of Lambda time kept back to commit, save progress and re-invoke
+REQUEST_TIMEOUT = 120
+RETRIES = 4
+READ_CHUNK = 1024 * 1024
+STATE = '_import_state.json'
+MANIFEST = '_manifest.json'  # written by stats_export; its started_at identifies the export
+SUFFIXES = ('.ndjson', '.ndjson.gz', '.json', '.json.gz')
+
+
+def handler(event, context):
+    """
+    Lambda function to import exported statistics into Solr.
+
+    Reads the NDJSON objects under ``prefix`` (default full/, or ``detail.prefix``
+    of an EventBridge event); ``restart`` (top level or in ``detail``) ignores
+    earlier progress. Progress is saved at every commit and belongs to the
+    export it was made from, so a new export at the prefix is imported from the
+    start. If Lambda time runs short the function invokes itself with a
+    ``continuation`` to carry on from the last commit.
+    """
+    event = event or {}
+    detail = event.get('detail') or {}
+    restart = bool(event.get('restart') or detail.get('restart'))
+    params = event.get('continuation') or {}
+    if not params:
+        params = {'prefix': event.get('prefix', detail.get('prefix', 'full/')),
+                  'collection': event.get('collection', detail.get('collection', COLLECTION))}
+
+    source = S3Source(os.environ['BUCKET'], params['prefix'])
+    importer = StatisticsImport(os.environ['SOLR_URL'], source, collection=params['collection'])
+    deadline = None
+    if context is not None:
+        deadline = time.time() + context.get_remaining_time_in_millis() / 1000.0 - HANDOFF_MARGIN
+    try:
+        complete = importer.run(deadline=deadline, restart=restart and not event.get('continuation'))
+    except Exception as e:
+        print(f"Import from {source} failed: {e}")
+        return {'statusCode': 500, 'body': json.dumps({'message': str(e), 'summary': importer.summary()})}
+
+    if not complete:
+        print(f"Handing off: import from {source} continues in a new invocation")
+        lambda_client.invoke(FunctionName=context.function_name, InvocationType='Event',
+                             Payload=json.dumps({'continuation': params}).encode())
+        return {'statusCode': 202, 'body': json.dumps({'message': 'Import continues', 'summary': importer.summary()}),
+                'continuation': params}
+
+    return {'statusCode': 200, 'body': json.dumps({'message': 'Import complete', 'summary': importer.summary()})}
+
+
+class S3Source:
+    """Export objects under an S3 prefix, read as streams; progress is kept next to them"""
+
+    def __init__(self, bucket, prefix, s3_client=None):
+        self.bucket = bucket
+        self.prefix = prefix if not prefix or prefix.endswith('/') else f"{prefix}/"
+        self.s3 = s3_client or s3
+
+    def __str__(self):
+        return f"s3://{self.bucket}/{self.prefix}"
+
+    def names(self):
+        names = []
+        for page in self.s3.get_paginator('list_objects_v2').paginate(Bucket=self.bucket, Prefix=self.prefix):
+            names.extend(obj['Key'] for obj in page.get('Contents', []))
+        return sorted(names)
+
+    def open(self, name):
+        return self.s3.get_object(Bucket=self.bucket, Key=name)['Body']
+
+    def read_state(self):
+        return self._read_json(STATE)
+
+    def export_id(self):
+        """started_at of the export manifest at the prefix, or None if there is none"""
+        manifest = self._read_json(MANIFEST)
+        return manifest.get('started_at') if manifest else None
+
+    def _read_json(self, name):
+        try:
+            return json.loads(self.open(f"{self.prefix}{name}").read())
+        except Exception as e:
+            if 'NoSuchKey' in str(e) or 'Not Found' in str(e) or '404' in str(e):
+                return None
+            raise
+
+    def write_state(self, state):
+        self.s3.put_object(Bucket=self.bucket, Key=f"{self.prefix}{STATE}", Body=json.dumps(state, indent=2).encode(),
+                           ContentType='application/json')
+
+
+class LocalSource:
+    """Export files in a local directory (e.g. a downloaded export, or for testing)"""
+
+    def __init__(self, path):
+        self.path = path
+
+    def __str__(self):
+        return self.path
+
+    def names(self):
+        return sorted(os.path.join(root, name) for root, _, files in os.walk(self.path) for name in files)
+
+    def open(self, name):
+        return open(name, 'rb')
+
+    def read_state(self):
+        return self._read_json(STATE)
+
+    def export_id(self):
+        manifest = self._read_json(MANIFEST)
+        return manifest.get('started_at') if manifest else None
+
+    def _read_json(self, name):
+        path = os.path.join(self.path, name)
+        if not os.path.exists(path):
+            return None
+        with open(path) as f:
+            return json.load(f)
+
+    def write_state(self, state):
+        with open(os.path.join(self.path, STATE), 'w') as f:
+            json.dump(state, f, indent=2)
+
+
+def iter_docs(stream, name):
+    """Decode an NDJSON stream (gzip if ``name`` ends in .gz) one document at a time"""
+    raw = gzip.GzipFile(fileobj=stream) if name.endswith('.gz') else stream
+    pending = b''
+    try:
+        while True:
+            chunk = raw.read(READ_CHUNK)
+            if not chunk:
+                break
+            lines = (pending + chunk).split(b'\n')
+            pending = lines.pop()
+            for line in lines:
+                if line.strip():
+                    yield json.loads(line)
+        if pending.strip():
+            yield json.loads(pending)
+    finally:
+        raw.close()
+        if raw is not stream:
+            stream.close()
+
+
+class AdaptiveConcurrency:
+    """Limit on update requests in flight, adjusted to how Solr is coping.
+
+    The limit grows by one after ``limit`` consecutive batches answer within
+    ``target_latency`` and halves after an error or a slow batch (additive
+    increase, multiplicative decrease). ``acquire`` blocks while the limit is
+    reached, which holds back reading as well.
+    """
+
+    def __init__(self, maximum=MAX_WORKERS, target_latency=TARGET_LATENCY, initial=2):
+        self.maximum = max(1, maximum)
+        self.limit = min(self.maximum, max(1, initial))
+        self.target_latency = target_latency
+        self.in_flight = 0
+        self._fast = 0
+        self._cond = threading.Condition()
+
+    def acquire(self):
+        with self._cond:
+            while self.in_flight >= self.limit:
+                self._cond.wait()
+            self.in_flight += 1
+
+    def release(self, latency, ok=True):
+        with self._cond:
+            self.in_flight -= 1
+            self._adjust(latency, ok)
+            self._cond.notify_all()
+
+    def failed(self):
+        """Record an error for a request that keeps its slot to retry"""
+        with self._cond:
+            self._adjust(None, False)
+
+    def _adjust(self, latency, ok):
+        if not ok or latency > self.target_latency:
+            if self.limit > 1:
+                self.limit = max(1, self.limit // 2)
+                print(f"Update {'failed' if not ok else f'took {latency:.1f}s'}, concurrency down to {self.limit}")
+            self._fast = 0
+        else:
+            self._fast += 1
+            if self._fast >= self.limit and self.limit < self.maximum:
+                self.limit += 1
+                self._fast = 0
+
+    def drain(self):
+        """Wait until no request is in flight"""
+        with self._cond:
+            while self.in_flight:
+                self._cond.wait()
+
+
+class StatisticsImport:
+    """Streams exported NDJSON statistics into a Solr collection.
+
+    Objects are read in name order and decoded incrementally into batches of
+    ``batch_docs``, which are posted to /update by a worker pool sized by
+    AdaptiveConcurrency. Every ``commit_interval`` seconds the in-flight batches
+    are drained, a hard commit (without opening a searcher) is sent and the
+    position is saved to the source, so a re-run resumes from the last commit.
+    Documents keep their uid, so anything sent twice is overwritten, not duplicated.
+    """
+
+    def __init__(self, solr_url, source, collection=COLLECTION, batch_docs=BATCH_DOCS, max_workers=MAX_WORKERS,
+                 target_latency=TARGET_LATENCY, commit_interval=COMMIT_INTERVAL, http=None):
+        self.solr_url = solr_url.rstrip('/')
+        self.source = source
+        self.collection = collection
+        self.batch_docs = max(1, batch_docs)
+        self.max_workers = max(1, max_workers)
+        self.commit_interval = commit_interval
+        self.concurrency = AdaptiveConcurrency(self.max_workers, target_latency)
+        self.http = http or http_pool('solr', maxsize=self.max_workers, retries=False)
+        self.state = None
+        self.errors = []
+        self._lock = threading.Lock()
+        self._sent = 0
+        self._started = None
+        self._docs_at_start = 0
+
+    def run(self, deadline=None, restart=False):
+        """Import every object not yet committed; returns False if stopped by ``deadline`` (epoch seconds)"""
+        self._started = time.time()
+        self._sent = 0
+        export = self.source.export_id()
+        self.state = None if restart else self.source.read_state()
+        if self.state and self.state.get('export') != export:
+            print(f"Saved progress at {self.source} is from an earlier export, starting over")
+            self.state = None
+        if self.state and self.state.get('complete'):
+            print(f"Import from {self.source} is already complete, nothing to do")
+            return True
+        if self.state is None:
+            objects = [name for name in self.source.names()
+                       if name.endswith(SUFFIXES) and not os.path.basename(name).startswith('_')]
+            if not objects:
+                # e.g. CSV from the ECS export job; completing here would hide that nothing was imported
+                raise ValueError(f"No objects ending in {', '.join(SUFFIXES)} at {self.source}")
+            self.state = {'collection': self.collection, 'export': export, 'objects': objects, 'object': 0,
+                          'offset': 0, 'docs': 0, 'complete': False}
+            print(f"Importing {len(objects)} objects from {self.source} into {self.collection}")
+        else:
+            print(f"Resuming import from {self.source} at object {self.state['object']} "
+                  f"({self.state['docs']} docs already committed)")
+
+        self._docs_at_start = self.state['docs']
+        position = (self.state['object'], self.state['offset'])
+        last_commit = time.time()
+        done = True
+        with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+            for index, offset, batch in self._batches():
+                if self.errors:
+                    break
+                if deadline is not None and time.time() > deadline:
+                    done = False
+                    break
+                self.concurrency.acquire()
+                pool.submit(self._send, batch)
+                position = (index, offset)
+                if time.time() - last_commit >= self.commit_interval:
+                    self._checkpoint(*position)
+                    last_commit = time.time()
+            else:
+                position = (len(self.state['objects']), 0)
+            self.concurrency.drain()
+
+        if self.errors:
+            raise RuntimeError(f"{len(self.errors)} update batches failed, last: {self.errors[-1]}; "
+                               f"the next run resumes from the last commit")
+        self._checkpoint(*position, complete=done)
+        return done
+
+    def _batches(self):
+        """Yield (object index, offset after the batch, docs), skipping what the saved state already covers"""
+        objects = self.state['objects']
+        for index in range(self.state['object'], len(objects)):
+            skip = self.state['offset'] if index == self.state['object'] else 0
+            name = objects[index]
+            batch = []
+            offset = 0
+            for doc in iter_docs(self.source.open(name), name):
+                offset += 1
+                if offset <= skip:
+                    continue
+                doc.pop('_version_', None)
+                batch.append(doc)
+                if len(batch) >= self.batch_docs:
+                    yield index, offset, batch
+                    batch = []
+            if batch:
+                yield index, offset, batch
+            print(f"Read {name} ({offset} docs)")
+
+    def _send(self, batch):
+        url = f"{self.solr_url}/{self.collection}/update?wt=json"
+        body = json.dumps(batch).encode()
+        error = None
+        for attempt in range(RETRIES):
+            started = time.time()
+            try:
+                response = self.http.request('POST', url, body=body, headers={'Content-Type': 'application/json'},
+                                             timeout=REQUEST_TIMEOUT)
+                ok = response.status == 200
+                if not ok:
+                    error = f"HTTP {response.status}: {response.data[:200]}"
+            except Exception as e:
+                ok, error = False, str(e)
+            if ok:
+                self.concurrency.release(time.time() - started)
+                with self._lock:
+                    self._sent += len(batch)
+                return True
+            if attempt < RETRIES - 1:
+                # The slot is kept while backing off; the lower limit holds back new batches
+                self.concurrency.failed()
+                time.sleep(2 ** attempt)
+        self.concurrency.release(time.time() - started, ok=False)
+        with self._lock:
+            self.errors.append(error)
+        return False
+
+    def _checkpoint(self, index, offset, complete=False):
+        """Drain in-flight batches, commit, and save the position reached"""
+        self.concurrency.drain()
+        if self.errors:
+            return
+        self.commit(open_searcher=complete)
+        with self._lock:
+            sent, self._sent = self._sent, 0
+        self.state.update(object=index, offset=offset, complete=complete, docs=self.state['docs'] + sent)
+        self.source.write_state(self.state)
+        elapsed = max(time.time() - self._started, 0.001)
+        print(f"Committed {self.state['docs']} docs ({self.state['object']}/{len(self.state['objects'])} objects, "
+              f"{self.rate:.0f} docs/s, concurrency {self.concurrency.limit}, {elapsed:.0f}s)")
+
+    @property
+    def rate(self):
+        """Docs per second committed by this run"""
+        if not self._started or not self.state:
+            return 0.0
+        return (self.state['docs'] - self._docs_at_start) / max(time.time() - self._started, 0.001)
+
+    def commit(self, open_searcher=False):
+        url = (f"{self.solr_url}/{self.collection}/update?wt=json&commit=true"
+               f"&openSearcher={'true' if open_searcher else 'false'}")
+        response = self.http.request('POST', url, body=b'[]', headers={'Content-Type': 'application/json'},
+                                     timeout=REQUEST_TIMEOUT * 5)
+        if response.status != 200:
+            raise RuntimeError(f"Commit failed: HTTP {response.status}: {response.data[:200]}")
+
+    def summary(self):
+        if not self.state:
+            return {}
+        return {'docs': self.state['docs'], 'objects': len(self.state['objects']), 'object': self.state['object'],
+                'complete': self.state['complete'], 'docs_per_second': round(self.rate, 1)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Import exported NDJSON statistics into Solr')
+    parser.add_argument('--solr-url', default=os.environ.get('SOLR_URL'), help='Solr base URL, ending in /solr')
+    parser.add_argument('--bucket', default=os.environ.get('BUCKET'))
+    parser.add_argument('--prefix', default='full/')
+    parser.add_argument('--dir', help='read a local directory instead of S3')
+    parser.add_argument('--collection', default=COLLECTION)
+    parser.add_argument('--batch-docs', type=int, default=BATCH_DOCS)
+    parser.add_argument('--max-workers', type=int, default=MAX_WORKERS)
+    parser.add_argument('--restart', action='store_true', help='ignore saved progress')
+    args = parser.parse_args()
+
+    source = LocalSource(args.dir) if args.dir else S3Source(args.bucket, args.prefix)
+    importer = StatisticsImport(args.solr_url, source, collection=args.collection, batch_docs=args.batch_docs,
+                                max_workers=args.max_workers)
+    return 0 if importer.run(restart=args.restart) else 1
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
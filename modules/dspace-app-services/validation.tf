@@ -21,5 +21,26 @@ resource "terraform_data" "validate_task_definition_config" {
       )
       error_message = "When use_external_task_definitions = true, all external task definition ARN variables are required: dspace_api_task_def_arn, dspace_angular_task_def_arn, and dspace_jobs_task_def_arn must be provided."
     }
+
+    precondition {
+      condition     = !var.enable_stats_export_lambda || var.solr_url != null
+      error_message = "When enable_stats_export_lambda = true, solr_url must be provided."
+    }
+
+    precondition {
+      condition     = !var.enable_stats_import_lambda || var.solr_url != null
+      error_message = "When enable_stats_import_lambda = true, solr_url must be provided."
+    }
+
+    # The ECS jobs export and import CSV, the Lambdas NDJSON; neither reads the other's output
+    precondition {
+      condition     = !var.enable_stats_import_lambda || var.enable_stats_export_lambda
+      error_message = "enable_stats_import_lambda = true requires enable_stats_export_lambda = true: the import Lambda reads the export Lambda's NDJSON, not the CSV of the stats-export ECS jobs."
+    }
+
+    precondition {
+      condition     = !var.enable_stats_export_lambda || var.enable_stats_import_lambda
+      error_message = "enable_stats_export_lambda = true requires enable_stats_import_lambda = true: the statistics-import ECS job reads CSV, not the export Lambda's NDJSON."
+    }
   }
 }
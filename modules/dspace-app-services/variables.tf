@@ -197,6 +197,24 @@ variable "enable_init_tasks" {
   default     = false
 }
 
+variable "init_solr_after_db" {
+  description = "Start the Solr initialization task only after database initialization succeeds; set to false to start both together"
+  type        = bool
+  default     = true
+}
+
+variable "enable_stats_export_lambda" {
+  description = "Export Solr statistics to S3 with the streaming export Lambda instead of the stats-export, stats-export-daily and stats-full-export ECS jobs (requires solr_url and enable_stats_import_lambda)"
+  type        = bool
+  default     = false
+}
+
+variable "enable_stats_import_lambda" {
+  description = "Import statistics exported by the streaming export Lambda (NDJSON) with the streaming import Lambda instead of the statistics-import ECS job (requires solr_url and enable_stats_export_lambda)"
+  type        = bool
+  default     = false
+}
+
 variable "dspace_admin_email" {
   description = "Email address for the initial DSpace administrator account"
   type        = string
@@ -0,0 +1,308 @@
+"""Benchmark the Solr ops layer against an in-process fake SolrCloud and stubbed AWS clients.
+
+Runs rollover, tombstone, rebalance and recovery passes end to end on a
+synthetic cluster and reports simulated duration (what the Lambda would
+spend), real CPU wall time, Solr requests per action, response bytes parsed
+and AWS API calls.
+
+    python bench.py --shards 50 --replicas 3 --nodes 3
+    python bench.py --scenario rollover --shards 200 --json
+"""
+import argparse
+import json
+import logging
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+from collections import Counter
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, HERE)
+sys.path.insert(0, os.path.join(HERE, '..', 'solr-ops-layer', 'python'))
+
+from fake_aws import FakeCloudWatch, FakeECS, FakeSSM, install_boto3  # noqa: E402
+from fake_solr import FakeSolrCloud, node_name_for  # noqa: E402
+from simclock import SimulatedClock  # noqa: E402
+
+SOLR_URL = 'http://solr.internal:8983'
+CLUSTER = 'bench-cluster'
+SERVICE = 'bench-solr'  # service holding the node being rolled over
+PEER_SERVICE = 'bench-solr-peers'
+
+SCENARIOS = ('rollover', 'resume', 'tombstone', 'rebalance', 'recovery', 'coldstart')
+
+
+class FakeLambdaContext:
+    """Lambda context whose remaining time runs down on the simulated clock"""
+
+    def __init__(self, clock, timeout):
+        self.clock = clock
+        self.deadline = clock.monotonic() + timeout
+
+    def get_remaining_time_in_millis(self):
+        return max(0, int((self.deadline - self.clock.monotonic()) * 1000))
+
+
+class Environment:
+    """One synthetic cluster wired to fake ECS/SSM/CloudWatch on a shared clock"""
+
+    def __init__(self, args, clock, dead_nodes=0, recovery_failed=0, replicas=None):
+        self.args = args
+        self.clock = clock
+        self.solr = FakeSolrCloud(clock, latency=args.latency, bandwidth=args.bandwidth * 1_000_000,
+                                  async_duration=args.async_duration, copy_rate=args.copy_rate * 1_000_000,
+                                  add_recovery=args.add_recovery, seed=args.seed)
+        self.solr.generate(collections=args.collections, shards=args.shards,
+                           replicas=replicas or args.replicas, nodes=args.nodes,
+                           dead_nodes=dead_nodes, recovery_failed=recovery_failed,
+                           mean_size_bytes=args.mean_size_mb * 1_000_000)
+        self.ecs = FakeECS(clock, latency=args.aws_latency,
+                           on_task_running=self._task_running, on_task_stopped=self._task_stopped)
+        self.ssm = FakeSSM(clock, latency=args.aws_latency)
+        self.cloudwatch = FakeCloudWatch(clock, latency=args.aws_latency)
+        self.boto3 = install_boto3([self.ecs, self.ssm, self.cloudwatch])
+
+        self.ecs.add_service(SERVICE)
+        self.ecs.add_service(PEER_SERVICE)
+        for i, node in enumerate(list(self.solr.live_nodes)):
+            service = SERVICE if i == 0 else PEER_SERVICE
+            self.ecs.start_task(service=service, ip=node.split(':')[0], running=True)
+            self.ecs.services[service]['desiredCount'] += 1
+
+    def _node(self, task):
+        ip = next(d['value'] for a in task['attachments'] for d in a['details']
+                  if d['name'] == 'privateIPv4Address')
+        return node_name_for(ip)
+
+    def _task_running(self, task):
+        if task['group'].startswith('service:'):
+            self.solr.add_node(self._node(task).split(':')[0])
+
+    def _task_stopped(self, task):
+        self.solr.kill_node(self._node(task))
+
+    def aws_calls(self):
+        calls = Counter()
+        for client in (self.ecs, self.ssm, self.cloudwatch):
+            for op, n in client.call_counts.items():
+                calls[f"{client.service_name}:{op}"] += n
+        return calls
+
+
+def load_layer(env):
+    """Import (or re-bind) the layer modules against this environment's fakes"""
+    import alerting
+    import clients
+    import concurrency
+    import ecs_operations
+    import solr_operations
+    from cluster_state import ClusterState
+    # Clients cached by an earlier scenario belong to that scenario's fake boto3
+    clients.reset()
+    # Publish buffered metrics to the fake CloudWatch (counted) instead of printing EMF over the report
+    alerting.metric_buffer.mode = 'api'
+    return concurrency, ecs_operations, solr_operations, ClusterState
+
+
+def run_rollover(env, lambda_timeout=None, max_invocations=1):
+    """Checkpointed rollover of the first node's task, re-invoked until done or max_invocations"""
+    _, _, _, ClusterState = load_layer(env)
+    import rollover
+    old_task_arn = env.ecs.list_tasks(cluster=CLUSTER, serviceName=SERVICE)['taskArns'][0]
+    old_task_id = old_task_arn.split('/')[-1]
+
+    with tempfile.TemporaryDirectory() as tmp:
+        store = rollover.FileCheckpointStore(os.path.join(tmp, 'checkpoint.json'))
+        for invocation in range(1, max_invocations + 1):
+            context = FakeLambdaContext(env.clock, lambda_timeout) if lambda_timeout else None
+            result = rollover.run_rollover(env.ecs, env.solr, SOLR_URL, CLUSTER, SERVICE, old_task_id,
+                                           context=context, store=store,
+                                           cluster_state=ClusterState(env.solr, SOLR_URL))
+            if result['status'] != 'paused':
+                break
+
+    data = result['data']
+    return {'status': result['status'], 'invocations': invocation, 'moved': data.get('moved'),
+            'tombstoned': data.get('tombstoned'), 'rebalanced': data.get('rebalanced'),
+            'unhealthy': data.get('unhealthy'), 'step_seconds': result['timings']}
+
+
+def run_resume(env):
+    return run_rollover(env, lambda_timeout=env.args.lambda_timeout, max_invocations=20)
+
+
+def run_tombstone(env):
+    _, _, solr_ops, ClusterState = load_layer(env)
+    deleted = solr_ops.tombstone_dead_nodes(env.solr, SOLR_URL, cluster_state=ClusterState(env.solr, SOLR_URL))
+    return {'tombstoned': len(deleted)}
+
+
+def run_rebalance(env):
+    _, _, solr_ops, ClusterState = load_layer(env)
+    state = ClusterState(env.solr, SOLR_URL)
+    target = state.live_nodes and sorted(state.live_nodes)[0]
+    changed = solr_ops.rebalance_replicas(env.solr, SOLR_URL, target, cluster_state=state)
+    return {'rebalanced': len(changed)}
+
+
+def run_recovery(env):
+    _, _, solr_ops, ClusterState = load_layer(env)
+    result = solr_ops.handle_recovery_failed_replicas(env.solr, SOLR_URL,
+                                                      cluster_state=ClusterState(env.solr, SOLR_URL),
+                                                      concurrent=env.args.concurrent_recovery)
+    return {key: len(value) for key, value in result.items()}
+
+
+# Imports a Lambda cold start pays for, and the registry lookups that follow, in a fresh interpreter
+COLD_START_SCRIPT = '''
+import json, sys, time, types
+sys.path.insert(0, sys.argv[1])
+created = []
+
+class Session:
+    def __init__(self, region_name=None):
+        pass
+
+    def client(self, service_name):
+        created.append(service_name)
+        return types.SimpleNamespace(service_name=service_name)
+
+sys.modules['boto3'] = types.SimpleNamespace(Session=Session)
+start = time.perf_counter()
+import solr_operations, rollover, concurrency, alerting, ecs_operations, clients
+import_ms = (time.perf_counter() - start) * 1000
+at_import = len(created)
+start = time.perf_counter()
+concurrency.ssm.service_name
+first_ms = (time.perf_counter() - start) * 1000
+start = time.perf_counter()
+concurrency.ssm.service_name
+warm_ms = (time.perf_counter() - start) * 1000
+print(json.dumps({'import_ms': round(import_ms, 1), 'clients_at_import': at_import,
+                  'first_client_ms': round(first_ms, 3), 'warm_client_ms': round(warm_ms, 3),
+                  'clients_created': len(created)}))
+'''
+
+
+def run_coldstart(env):
+    """Time a cold import of the layer (real time) and check no AWS client is built before first use"""
+    layer = os.path.join(HERE, '..', 'solr-ops-layer', 'python')
+    output = subprocess.run([sys.executable, '-c', COLD_START_SCRIPT, layer], check=True,
+                            capture_output=True, text=True).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def build_environment(name, args, clock):
+    if name == 'tombstone':
+        return Environment(args, clock, dead_nodes=1)
+    if name == 'rebalance':
+        return Environment(args, clock, dead_nodes=1, replicas=args.replicas + 1)
+    if name == 'recovery':
+        return Environment(args, clock, dead_nodes=1, recovery_failed=args.recovery_failed)
+    return Environment(args, clock)
+
+
+RUNNERS = {
+    'rollover': run_rollover,
+    'resume': run_resume,
+    'tombstone': run_tombstone,
+    'rebalance': run_rebalance,
+    'recovery': run_recovery,
+    'coldstart': run_coldstart
+}
+
+
+def run_scenario(name, args):
+    from instrumentation import metrics
+    random.seed(args.seed)
+    metrics.reset()
+    with SimulatedClock() as clock:
+        env = build_environment(name, args, clock)
+        sim_start = clock.monotonic()
+        real_start = time.perf_counter()
+        outcome = RUNNERS[name](env)
+        real_elapsed = time.perf_counter() - real_start
+        sim_elapsed = clock.monotonic() - sim_start
+
+    return {
+        'scenario': name,
+        'simulated_seconds': round(sim_elapsed, 1),
+        'real_seconds': round(real_elapsed, 3),
+        'solr_requests': sum(env.solr.request_counts.values()),
+        'solr_requests_by_action': dict(env.solr.request_counts.most_common()),
+        'bytes_parsed': sum(env.solr.response_bytes.values()),
+        'bytes_parsed_by_action': dict(env.solr.response_bytes.most_common()),
+        'aws_calls': dict(env.aws_calls().most_common()),
+        'call_metrics': metrics.summary(),
+        'outcome': outcome
+    }
+
+
+def print_report(results, args):
+    print(f"Cluster: {len(args.collections)} collections x {args.shards} shards x {args.replicas} replicas "
+          f"on {args.nodes} nodes (latency {args.latency * 1000:.0f}ms, copy {args.copy_rate}MB/s)")
+    print()
+    print(f"{'scenario':<12}{'simulated':>12}{'real':>10}{'requests':>10}{'parsed MB':>12}{'aws calls':>11}")
+    for r in results:
+        print(f"{r['scenario']:<12}{r['simulated_seconds']:>11.1f}s{r['real_seconds']:>9.3f}s"
+              f"{r['solr_requests']:>10}{r['bytes_parsed'] / 1_000_000:>12.2f}{sum(r['aws_calls'].values()):>11}")
+    for r in results:
+        print()
+        print(f"[{r['scenario']}] outcome: {r['outcome']}")
+        for action, count in r['solr_requests_by_action'].items():
+            print(f"  {action:<24}{count:>8} requests {r['bytes_parsed_by_action'][action] / 1_000_000:>10.2f} MB")
+        for op, count in r['aws_calls'].items():
+            print(f"  {op:<24}{count:>8} calls")
+        if args.verbose:
+            print(f"  {'latency (simulated)':<24}{'calls':>8}{'p50 ms':>10}{'p99 ms':>10}{'errors':>8}")
+            for op, m in r['call_metrics'].items():
+                print(f"  {op:<24}{m['calls']:>8}{m['p50_ms']:>10.1f}{m['p99_ms']:>10.1f}{m['errors']:>8}")
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--scenario', action='append', choices=SCENARIOS,
+                        help='Scenario to run (repeatable, default: all)')
+    parser.add_argument('--collections', default='search,oai,statistics',
+                        help='Comma-separated collection names')
+    parser.add_argument('--shards', type=int, default=10, help='Shards per collection')
+    parser.add_argument('--replicas', type=int, default=3, help='Replicas per shard (1 NRT + PULL)')
+    parser.add_argument('--nodes', type=int, default=3, help='Live Solr nodes')
+    parser.add_argument('--recovery-failed', type=int, default=5,
+                        help='Replicas put in recovery_failed for the recovery scenario')
+    parser.add_argument('--mean-size-mb', type=float, default=200, help='Mean replica index size')
+    parser.add_argument('--latency', type=float, default=0.01, help='Solr round-trip latency (s)')
+    parser.add_argument('--bandwidth', type=float, default=50, help='Solr response bandwidth (MB/s)')
+    parser.add_argument('--async-duration', type=float, default=2.0, help='Base async op duration (s)')
+    parser.add_argument('--add-recovery', type=float, default=0,
+                        help='Seconds a replica made by ADDREPLICA stays recovering (s)')
+    parser.add_argument('--copy-rate', type=float, default=100, help='Replica copy rate (MB/s)')
+    parser.add_argument('--aws-latency', type=float, default=0.02, help='AWS API latency (s)')
+    parser.add_argument('--lambda-timeout', type=float, default=120,
+                        help='Simulated Lambda timeout per invocation for the resume scenario (s)')
+    parser.add_argument('--concurrent-recovery', action='store_true',
+                        help='Run the recovery scenario with concurrent=True')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--json', action='store_true', help='Emit JSON instead of a table')
+    parser.add_argument('--verbose', action='store_true', help='Show layer INFO logging')
+    args = parser.parse_args(argv)
+    args.collections = [c for c in args.collections.split(',') if c]
+    args.scenario = args.scenario or list(SCENARIOS)
+    return args
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    logging.basicConfig(level=logging.INFO if args.verbose else logging.ERROR, format='%(levelname)s %(message)s')
+    results = [run_scenario(name, args) for name in args.scenario]
+    if args.json:
+        print(json.dumps(results, indent=2))
+    else:
+        print_report(results, args)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,345 @@
+import io
+import sys
+import types
+from collections import Counter
+
+
+class FakeClientError(Exception):
+    def __init__(self, code, message=''):
+        super().__init__(f"{code}: {message}")
+        self.response = {'Error': {'Code': code, 'Message': message}}
+
+
+class FakeClient:
+    """Base for stubbed boto3 clients: counts calls and charges simulated latency"""
+
+    service_name = 'fake'
+
+    def __init__(self, clock, latency=0.02):
+        self.clock = clock
+        self.latency = latency
+        self.call_counts = Counter()
+        self.exceptions = types.SimpleNamespace(ClientError=FakeClientError)
+
+    def _call(self, operation):
+        self.call_counts[operation] += 1
+        self.clock.advance(self.latency)
+
+
+class FakeECS(FakeClient):
+    """ECS service/task stand-in that models task start-up and scale-down delays"""
+
+    service_name = 'ecs'
+
+    def __init__(self, clock, latency=0.02, start_delay=45.0, stop_delay=20.0,
+                 on_task_running=None, on_task_stopped=None):
+        super().__init__(clock, latency)
+        self.start_delay = start_delay
+        self.stop_delay = stop_delay
+        self.on_task_running = on_task_running
+        self.on_task_stopped = on_task_stopped
+        self.services = {}
+        self.tasks = {}
+        self.task_behaviour = {}  # task definition -> start_task kwargs (exit_code, run_time) for run_task
+        self.ip_seq = 0
+
+    def add_service(self, name, desired_count=0):
+        self.services[name] = {'serviceName': name, 'desiredCount': 0}
+        self._scale(name, desired_count)
+
+    def start_task(self, service=None, task_definition=None, ip=None, running=False, exit_code=0, run_time=60.0):
+        self.ip_seq += 1
+        ip = ip or f"10.0.9.{self.ip_seq}"
+        arn = f"arn:aws:ecs:us-east-1:000000000000:task/cluster/{self.ip_seq:032x}"
+        self.tasks[arn] = {
+            'taskArn': arn,
+            'group': f"service:{service}" if service else 'family:standalone',
+            'taskDefinitionArn': task_definition or f"{service}-td",
+            'lastStatus': 'RUNNING' if running else 'PROVISIONING',
+            'desiredStatus': 'RUNNING',
+            'healthStatus': 'HEALTHY' if running else 'UNKNOWN',
+            'connectivity': 'CONNECTED' if running else 'CONNECTING',
+            'started_at': self.clock.monotonic() - (self.start_delay if running else 0),
+            'exit_code': exit_code,
+            'run_time': run_time,
+            'availabilityZone': f"us-east-1{'abc'[self.ip_seq % 3]}",
+            'attachments': [{'type': 'ElasticNetworkInterface',
+                             'details': [{'name': 'privateIPv4Address', 'value': ip}]}],
+            'containers': []
+        }
+        if running and self.on_task_running:
+            self.on_task_running(self.tasks[arn])
+        return arn
+
+    def _scale(self, name, desired_count):
+        service = self.services[name]
+        service['desiredCount'] = desired_count
+        running = [t for t in self.tasks.values()
+                   if t['group'] == f"service:{name}" and t['desiredStatus'] == 'RUNNING']
+        for _ in range(desired_count - len(running)):
+            self.start_task(service=name)
+        for task in sorted(running, key=lambda t: t['started_at'])[:max(0, len(running) - desired_count)]:
+            task['desiredStatus'] = 'STOPPED'
+            task['stop_requested'] = self.clock.monotonic()
+
+    def _tick(self):
+        now = self.clock.monotonic()
+        for task in self.tasks.values():
+            if task['lastStatus'] == 'PROVISIONING' and now - task['started_at'] >= self.start_delay:
+                task.update(lastStatus='RUNNING', healthStatus='HEALTHY', connectivity='CONNECTED')
+                if self.on_task_running:
+                    self.on_task_running(task)
+            elif task['lastStatus'] == 'RUNNING' and task['group'].startswith('family:') and \
+                    now - task['started_at'] >= self.start_delay + task['run_time']:
+                task.update(lastStatus='STOPPED', desiredStatus='STOPPED',
+                            containers=[{'name': 'main', 'exitCode': task['exit_code']}])
+            elif task['desiredStatus'] == 'STOPPED' and task['lastStatus'] != 'STOPPED' and \
+                    now - task.get('stop_requested', now) >= self.stop_delay:
+                task['lastStatus'] = 'STOPPED'
+                if self.on_task_stopped:
+                    self.on_task_stopped(task)
+
+    def _public(self, task):
+        return {k: v for k, v in task.items()
+                if k not in ('started_at', 'exit_code', 'run_time', 'stop_requested')}
+
+    def list_tasks(self, cluster=None, serviceName=None, desiredStatus='RUNNING', **kwargs):
+        self._call('ListTasks')
+        self._tick()
+        arns = [arn for arn, t in self.tasks.items()
+                if (serviceName is None or t['group'] == f"service:{serviceName}")
+                and t['desiredStatus'] == desiredStatus]
+        return {'taskArns': arns}
+
+    def describe_tasks(self, cluster=None, tasks=(), **kwargs):
+        self._call('DescribeTasks')
+        if len(tasks) > 100:
+            raise FakeClientError('InvalidParameterException', 'Tasks cannot be longer than 100')
+        self._tick()
+        found, failures = [], []
+        for ref in tasks:
+            arn = next((a for a in self.tasks if a == ref or a.endswith('/' + ref)), None)
+            if arn:
+                found.append(self._public(self.tasks[arn]))
+            else:
+                failures.append({'arn': ref, 'reason': 'MISSING'})
+        return {'tasks': found, 'failures': failures}
+
+    def describe_services(self, cluster=None, services=(), **kwargs):
+        self._call('DescribeServices')
+        self._tick()
+        result = []
+        for name in services:
+            running = sum(1 for t in self.tasks.values()
+                          if t['group'] == f"service:{name}" and t['lastStatus'] == 'RUNNING')
+            result.append({**self.services[name], 'runningCount': running})
+        return {'services': result}
+
+    def update_service(self, cluster=None, service=None, desiredCount=None, **kwargs):
+        self._call('UpdateService')
+        if desiredCount is not None:
+            self._scale(service, desiredCount)
+        return {'service': dict(self.services[service])}
+
+    def run_task(self, cluster=None, taskDefinition=None, **kwargs):
+        self._call('RunTask')
+        arn = self.start_task(task_definition=taskDefinition, **self.task_behaviour.get(taskDefinition, {}))
+        return {'tasks': [self._public(self.tasks[arn])], 'failures': []}
+
+    def stop_task(self, cluster=None, task=None, reason=None, **kwargs):
+        self._call('StopTask')
+        arn = next((a for a in self.tasks if a == task or a.endswith('/' + task)), None)
+        if arn is None:
+            raise FakeClientError('InvalidParameterException', f"Task {task} not found")
+        self.tasks[arn].update(desiredStatus='STOPPED', stop_requested=self.clock.monotonic(), stoppedReason=reason)
+        return {'task': self._public(self.tasks[arn])}
+
+
+class FakeSSM(FakeClient):
+    """Parameter Store stand-in with versions, labels and name:version / name:label selectors"""
+
+    service_name = 'ssm'
+
+    def __init__(self, clock, latency=0.02):
+        super().__init__(clock, latency)
+        self.parameters = {}
+        self.exceptions.ParameterAlreadyExists = type('ParameterAlreadyExists', (FakeClientError,), {})
+        self.exceptions.ParameterNotFound = type('ParameterNotFound', (FakeClientError,), {})
+        self.exceptions.ParameterVersionNotFound = type('ParameterVersionNotFound', (FakeClientError,), {})
+
+    def put_parameter(self, Name, Value, Type='String', Overwrite=False, **kwargs):
+        self._call('PutParameter')
+        existing = self.parameters.get(Name)
+        if existing and not Overwrite:
+            raise self.exceptions.ParameterAlreadyExists('ParameterAlreadyExists', Name)
+        version = existing['Version'] + 1 if existing else 1
+        self.parameters[Name] = {'Name': Name, 'Value': Value, 'Type': Type, 'Version': version,
+                                 'labels': (existing or {}).get('labels', {}),
+                                 'history': (existing or {}).get('history', {})}
+        self.parameters[Name]['history'][version] = Value
+        return {'Version': version, 'Tier': 'Standard'}
+
+    def get_parameter(self, Name, **kwargs):
+        self._call('GetParameter')
+        name, _, selector = Name.partition(':')
+        if name not in self.parameters:
+            raise self.exceptions.ParameterNotFound('ParameterNotFound', Name)
+        p = self.parameters[name]
+        version = p['Version']
+        if selector:
+            version = int(selector) if selector.isdigit() else p['labels'].get(selector)
+            if version not in p['history']:
+                raise self.exceptions.ParameterVersionNotFound('ParameterVersionNotFound', Name)
+        return {'Parameter': {'Name': name, 'Value': p['history'][version], 'Type': p['Type'],
+                              'Version': version, 'Selector': f":{selector}" if selector else None}}
+
+    def delete_parameter(self, Name, **kwargs):
+        self._call('DeleteParameter')
+        if Name not in self.parameters:
+            raise self.exceptions.ParameterNotFound('ParameterNotFound', Name)
+        del self.parameters[Name]
+        return {}
+
+    def label_parameter_version(self, Name, ParameterVersion, Labels, **kwargs):
+        self._call('LabelParameterVersion')
+        if Name not in self.parameters:
+            raise self.exceptions.ParameterNotFound('ParameterNotFound', Name)
+        p = self.parameters[Name]
+        if ParameterVersion not in p['history']:
+            raise self.exceptions.ParameterVersionNotFound('ParameterVersionNotFound', Name)
+        # As in SSM, a label attached to another version moves to this one
+        for label in Labels:
+            p['labels'][label] = ParameterVersion
+        return {'InvalidLabels': [], 'ParameterVersion': ParameterVersion}
+
+
+class FakeCloudWatch(FakeClient):
+    """CloudWatch stand-in that records alarms and metric data"""
+
+    service_name = 'cloudwatch'
+
+    def __init__(self, clock, latency=0.02):
+        super().__init__(clock, latency)
+        self.alarms = {}
+        self.metric_data = []
+
+    def put_metric_alarm(self, AlarmName, **kwargs):
+        self._call('PutMetricAlarm')
+        self.alarms[AlarmName] = {'AlarmName': AlarmName, **kwargs}
+        return {}
+
+    def describe_alarms(self, AlarmNames=(), **kwargs):
+        self._call('DescribeAlarms')
+        return {'MetricAlarms': [dict(self.alarms[n]) for n in AlarmNames if n in self.alarms]}
+
+    def put_metric_data(self, Namespace, MetricData, **kwargs):
+        self._call('PutMetricData')
+        if len(MetricData) > 1000:
+            raise FakeClientError('InvalidParameterValue', 'MetricData must not exceed 1000 items')
+        self.metric_data.extend((Namespace, d) for d in MetricData)
+        return {}
+
+
+class FakeSNS(FakeClient):
+    """SNS stand-in that records published messages"""
+
+    service_name = 'sns'
+
+    def __init__(self, clock, latency=0.02):
+        super().__init__(clock, latency)
+        self.messages = []
+
+    def publish(self, TopicArn, Message, Subject=None, **kwargs):
+        self._call('Publish')
+        self.messages.append({'TopicArn': TopicArn, 'Subject': Subject, 'Message': Message})
+        return {'MessageId': str(len(self.messages))}
+
+
+class FakeS3(FakeClient):
+    """S3 stand-in with objects, multipart uploads and a list_objects_v2 paginator"""
+
+    service_name = 's3'
+
+    def __init__(self, clock, latency=0.02):
+        super().__init__(clock, latency)
+        self.objects = {}  # (bucket, key) -> bytes
+        self.uploads = {}  # upload id -> {'bucket', 'key', 'parts': {number: bytes}}
+        self.upload_seq = 0
+
+    def put_object(self, Bucket, Key, Body, **kwargs):
+        self._call('PutObject')
+        self.objects[(Bucket, Key)] = Body if isinstance(Body, bytes) else Body.encode()
+        return {'ETag': f'"{len(self.objects)}"'}
+
+    def get_object(self, Bucket, Key, **kwargs):
+        self._call('GetObject')
+        if (Bucket, Key) not in self.objects:
+            raise FakeClientError('NoSuchKey', Key)
+        return {'Body': io.BytesIO(self.objects[(Bucket, Key)])}
+
+    def create_multipart_upload(self, Bucket, Key, **kwargs):
+        self._call('CreateMultipartUpload')
+        self.upload_seq += 1
+        upload_id = f"upload-{self.upload_seq}"
+        self.uploads[upload_id] = {'bucket': Bucket, 'key': Key, 'parts': {}}
+        return {'UploadId': upload_id}
+
+    def upload_part(self, Bucket, Key, UploadId, PartNumber, Body, **kwargs):
+        self._call('UploadPart')
+        if UploadId not in self.uploads:
+            raise FakeClientError('NoSuchUpload', UploadId)
+        self.uploads[UploadId]['parts'][PartNumber] = Body
+        return {'ETag': f'"{UploadId}-{PartNumber}"'}
+
+    def complete_multipart_upload(self, Bucket, Key, UploadId, MultipartUpload, **kwargs):
+        self._call('CompleteMultipartUpload')
+        upload = self.uploads.pop(UploadId, None)
+        if upload is None:
+            raise FakeClientError('NoSuchUpload', UploadId)
+        numbers = [part['PartNumber'] for part in MultipartUpload['Parts']]
+        self.objects[(Bucket, Key)] = b''.join(upload['parts'][n] for n in numbers)
+        return {'Key': Key}
+
+    def abort_multipart_upload(self, Bucket, Key, UploadId, **kwargs):
+        self._call('AbortMultipartUpload')
+        if self.uploads.pop(UploadId, None) is None:
+            raise FakeClientError('NoSuchUpload', UploadId)
+        return {}
+
+    def get_paginator(self, operation):
+        fake = self
+
+        class Paginator:
+            def paginate(self, Bucket, Prefix='', **kwargs):
+                fake._call('ListObjectsV2')
+                keys = sorted(k for b, k in fake.objects if b == Bucket and k.startswith(Prefix))
+                yield {'Contents': [{'Key': k, 'Size': len(fake.objects[(Bucket, k)])} for k in keys]}
+
+        return Paginator()
+
+
+class FakeBoto3(types.ModuleType):
+    """Drop-in ``boto3`` module whose client() returns the registered fakes"""
+
+    def __init__(self, clients):
+        super().__init__('boto3')
+        self.clients = {c.service_name: c for c in clients}
+
+    def client(self, service_name, *args, **kwargs):
+        if service_name not in self.clients:
+            raise ValueError(f"No fake client registered for {service_name}")
+        return self.clients[service_name]
+
+    def register(self, client):
+        self.clients[client.service_name] = client
+
+    def Session(self, *args, **kwargs):
+        # Every session hands out the same registered fakes
+        return self
+
+
+def install_boto3(clients):
+    """Install a fake boto3 module so layer imports never reach AWS"""
+    fake = FakeBoto3(clients)
+    sys.modules['boto3'] = fake
+    return fake
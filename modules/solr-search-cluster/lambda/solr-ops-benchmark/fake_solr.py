@@ -0,0 +1,465 @@
+import json
+import random
+import zlib
+from collections import Counter
+from urllib.parse import parse_qsl, urlparse
+
+SOLR_PORT = 8983
+
+
+def node_name_for(ip):
+    return f"{ip}:{SOLR_PORT}_solr"
+
+
+def base_url_for(node_name):
+    host, _ = node_name.split('_', 1)
+    return f"http://{host}/solr"
+
+
+class FakeResponse:
+    """Minimal stand-in for urllib3's HTTPResponse"""
+
+    def __init__(self, status, body):
+        self.status = status
+        self.data = body
+        self.headers = {'Content-Type': 'application/json', 'Content-Length': str(len(body))}
+
+
+class FakeSolrCloud:
+    """In-process SolrCloud Collections/Cores API backed by a synthetic cluster.
+
+    Implements the subset of the admin API the ops layer uses. Every request
+    costs ``latency`` simulated seconds plus transfer time at ``bandwidth``
+    bytes/s; async operations finish ``async_duration`` seconds after submission,
+    plus index copy time at ``copy_rate`` bytes/s for MOVEREPLICA/ADDREPLICA.
+    Searches on a core cost ``query_latency``, multiplied by the number of index
+    copies running into its node, plus up to ``cold_penalty`` until the core has
+    answered ``warm_queries`` searches since it was created by a move or add.
+    A replica made by ADDREPLICA recovers for ``add_recovery`` seconds; the
+    async request only waits for that with waitForFinalState=true.
+    Counts requests per action and response bytes so benchmarks can report them.
+    """
+
+    def __init__(self, clock, latency=0.01, bandwidth=50_000_000, async_duration=2.0,
+                 copy_rate=100_000_000, recovery_duration=8.0, query_latency=0.02, cold_penalty=0.3,
+                 warm_queries=5, add_recovery=0.0, seed=0):
+        self.clock = clock
+        self.latency = latency
+        self.bandwidth = bandwidth
+        self.async_duration = async_duration
+        self.copy_rate = copy_rate
+        self.recovery_duration = recovery_duration
+        self.query_latency = query_latency
+        self.cold_penalty = cold_penalty
+        self.warm_queries = warm_queries
+        self.add_recovery = add_recovery
+        self.random = random.Random(seed)
+        self.collections = {}
+        self.live_nodes = []
+        self.cores = {}  # core name -> index stats
+        self.queries = Counter()  # core name -> searches answered
+        self.async_requests = {}
+        self.scheduled = []  # (due_time, callable)
+        self.request_counts = Counter()
+        self.response_bytes = Counter()
+        self.replica_seq = 0
+        self.copies_into = Counter()  # node -> index copies in flight towards it
+        self.documents = {}  # collection -> shard -> uid -> stored doc, for collection-level select/update
+        self.commits = Counter()  # collection -> hard commits
+
+    # -- cluster construction -------------------------------------------------
+
+    def add_node(self, ip, live=True):
+        name = node_name_for(ip)
+        if live and name not in self.live_nodes:
+            self.live_nodes.append(name)
+        return name
+
+    def kill_node(self, node_name):
+        if node_name in self.live_nodes:
+            self.live_nodes.remove(node_name)
+
+    def add_replica(self, collection, shard, node_name, replica_type='NRT', state='active',
+                    leader=False, size_bytes=0, num_docs=0, data_dir=None, warm=True):
+        self.replica_seq += 1
+        replica_name = f"core_node{self.replica_seq}"
+        core = f"{collection}_{shard}_replica_{replica_type[0].lower()}{self.replica_seq}"
+        coll = self.collections.setdefault(collection, {'shards': {}})
+        shard_data = coll['shards'].setdefault(shard, {'range': None, 'state': 'active', 'replicas': {}})
+        replica = {
+            'core': core,
+            'node_name': node_name,
+            'base_url': base_url_for(node_name),
+            'state': state,
+            'type': replica_type,
+            'force_set_state': 'false',
+            'dataDir': data_dir or f"/var/solr/data/{core}/data/",
+            'instanceDir': f"/var/solr/data/{core}"
+        }
+        if leader:
+            replica['leader'] = 'true'
+        shard_data['replicas'][replica_name] = replica
+        self.cores[core] = {
+            'numDocs': num_docs,
+            'sizeInBytes': size_bytes,
+            'lastModified': '2024-01-01T00:00:00Z',
+            'version': self.replica_seq
+        }
+        self.queries[core] = self.warm_queries if warm else 0
+        return replica_name
+
+    def add_documents(self, collection, shard, docs):
+        """Store docs in a shard; collection-level selects page them by cursorMark in uid order"""
+        self.documents.setdefault(collection, {}).setdefault(shard, {}).update((doc['uid'], doc) for doc in docs)
+
+    def generate(self, collections=('search', 'oai', 'statistics'), shards=2, replicas=3, nodes=3,
+                 dead_nodes=0, recovery_failed=0, mean_size_bytes=200_000_000):
+        """Build N collections x M shards x R replicas (1 NRT leader + PULL followers) across nodes"""
+        live = [self.add_node(f"10.0.{i // 250}.{i % 250 + 1}") for i in range(nodes)]
+        dead = [self.add_node(f"10.1.{i // 250}.{i % 250 + 1}", live=False) for i in range(dead_nodes)]
+        all_nodes = live + dead
+        slot = 0
+        for collection in collections:
+            for s in range(shards):
+                shard = f"shard{s + 1}"
+                size = int(self.random.expovariate(1.0 / mean_size_bytes)) if mean_size_bytes else 0
+                docs = size // 2000
+                for r in range(replicas):
+                    self.add_replica(collection, shard, all_nodes[(slot + r) % len(all_nodes)],
+                                     replica_type='NRT' if r == 0 else 'PULL', leader=(r == 0),
+                                     size_bytes=size, num_docs=docs)
+                slot += 1
+        failed = [rep for rep in self._all_replicas() if rep['node_name'] in self.live_nodes]
+        for rep in self.random.sample(failed, min(recovery_failed, len(failed))):
+            rep['state'] = 'recovery_failed'
+        return self
+
+    def _all_replicas(self):
+        for coll in self.collections.values():
+            for shard in coll['shards'].values():
+                yield from shard['replicas'].values()
+
+    def _health(self, coll):
+        health = 'GREEN'
+        for shard in coll['shards'].values():
+            active = [r for r in shard['replicas'].values()
+                      if r['state'] == 'active' and r['node_name'] in self.live_nodes]
+            if not active:
+                return 'RED'
+            if len(active) < len(shard['replicas']):
+                health = 'YELLOW'
+        return health
+
+    def _elect_leader(self, shard_data):
+        replicas = shard_data['replicas']
+        if any(r.get('leader') == 'true' for r in replicas.values()):
+            return
+        for r in replicas.values():
+            if r['type'] in ('NRT', 'TLOG') and r['state'] == 'active' and r['node_name'] in self.live_nodes:
+                r['leader'] = 'true'
+                return
+
+    # -- time ----------------------------------------------------------------
+
+    def _run_due(self):
+        due = [item for item in self.scheduled if item[0] <= self.clock.monotonic()]
+        for item in sorted(due, key=lambda i: i[0]):
+            self.scheduled.remove(item)
+            item[1]()
+
+    def _schedule(self, delay, fn):
+        self.scheduled.append((self.clock.monotonic() + delay, fn))
+
+    # -- HTTP entry point ------------------------------------------------------
+
+    def request(self, method, url, fields=None, body=None, headers=None, timeout=None, **kwargs):
+        parsed = urlparse(url)
+        params = dict(parse_qsl(parsed.query))
+        if fields:
+            params.update(fields)
+        if body and isinstance(body, (bytes, str)) and method == 'POST' and \
+                (headers or {}).get('Content-Type', '').startswith('application/x-www-form-urlencoded'):
+            params.update(dict(parse_qsl(body.decode() if isinstance(body, bytes) else body)))
+
+        self.clock.advance(self.latency)
+        self._run_due()
+
+        path = parsed.path.rstrip('/')
+        if path.endswith('/admin/collections'):
+            status, payload = self._collections_api(params)
+            key = params.get('action', '?')
+        elif path.endswith('/admin/cores'):
+            status, payload = self._cores_api(parsed.netloc, params)
+            key = f"cores:{params.get('action', '?')}"
+        else:
+            status, payload = self._handler(path, params, method, body)
+            key = path.rsplit('/', 1)[-1]
+
+        payload.setdefault('responseHeader', {'status': 0 if status == 200 else status, 'QTime': 1})
+        data = json.dumps(payload).encode('utf-8')
+        self.request_counts[key] += 1
+        self.response_bytes[key] += len(data)
+        self.clock.advance(len(data) / self.bandwidth)
+        return FakeResponse(status, data)
+
+    def _handler(self, path, params, method, body):
+        parts = path.strip('/').split('/')
+        if len(parts) == 3 and parts[2] == 'select' and parts[1] in self.cores:
+            return self._select(parts[1])
+        if len(parts) == 3 and parts[2] == 'select' and parts[1] in self.collections:
+            return self._cursor_select(parts[1], params)
+        if len(parts) == 3 and parts[2] == 'update' and parts[1] in self.collections and method == 'POST':
+            return self._update(parts[1], params, body)
+        return 404, {'error': {'msg': f'no handler for {path}', 'code': 404}}
+
+    def _select(self, core):
+        node = next((r['node_name'] for r in self._all_replicas() if r['core'] == core), None)
+        if node not in self.live_nodes:
+            return 503, {'error': {'msg': f'{core} is not available', 'code': 503}}
+        cold = max(0, self.warm_queries - self.queries[core]) / self.warm_queries if self.warm_queries else 0
+        self.clock.advance(self.query_latency * (1 + self.copies_into[node]) + self.cold_penalty * cold)
+        self.queries[core] += 1
+        return 200, {'response': {'numFound': self.cores[core]['numDocs'], 'start': 0, 'docs': []}}
+
+    def _cursor_select(self, collection, params):
+        """Deep paging with sort=uid asc; ``shards`` limits it to one shard, fq is ignored"""
+        shards = self.documents.get(collection, {})
+        names = [params['shards']] if params.get('shards') else list(shards)
+        docs = sorted((doc for name in names for doc in shards.get(name, {}).values()), key=lambda d: d['uid'])
+        cursor = params.get('cursorMark', '*')
+        if cursor != '*':
+            docs = [doc for doc in docs if doc['uid'] > cursor]
+        page = [dict(doc) for doc in docs[:int(params.get('rows', 10))]]
+        return 200, {'response': {'numFound': len(docs), 'start': 0, 'docs': page},
+                     'nextCursorMark': page[-1]['uid'] if page else cursor}
+
+    def _update(self, collection, params, body):
+        """JSON array of docs, routed to shards by a hash of their uid; a doc with a known uid replaces it"""
+        docs = json.loads(body or b'[]')
+        shards = sorted(self.collections[collection]['shards'])
+        for doc in docs:
+            self.add_documents(collection, shards[zlib.crc32(doc['uid'].encode()) % len(shards)], [doc])
+        if params.get('commit') == 'true':
+            self.commits[collection] += 1
+        return 200, {}
+
+    # -- Collections API -------------------------------------------------------
+
+    def _collections_api(self, params):
+        action = params.get('action', '').upper()
+        handler = getattr(self, f"_action_{action.lower()}", None)
+        if handler is None:
+            return 400, {'error': {'msg': f'Unknown action: {action}', 'code': 400}}
+        async_id = params.get('async')
+        if async_id and action not in ('REQUESTSTATUS', 'DELETESTATUS', 'CLUSTERSTATUS'):
+            self.async_requests[async_id] = {'state': 'submitted'}
+            try:
+                delay, apply = handler(params, async_mode=True)
+            except KeyError as e:
+                self.async_requests[async_id] = {'state': 'failed', 'msg': f'not found: {e}'}
+                return 200, {'requestid': async_id}
+
+            def finish():
+                try:
+                    apply()
+                    self.async_requests[async_id] = {'state': 'completed', 'msg': 'found [' + async_id + '] in completed tasks'}
+                except Exception as e:
+                    self.async_requests[async_id] = {'state': 'failed', 'msg': str(e)}
+
+            self.async_requests[async_id] = {'state': 'running'}
+            self._schedule(delay, finish)
+            return 200, {'requestid': async_id}
+        return handler(params)
+
+    def _action_clusterstatus(self, params):
+        names = [params['collection']] if params.get('collection') else list(self.collections)
+        shard_filter = set(params['shard'].split(',')) if params.get('shard') else None
+        collections = {}
+        for name in names:
+            if name not in self.collections:
+                return 400, {'error': {'msg': f'Collection: {name} not found', 'code': 400}}
+            coll = self.collections[name]
+            shards = {s: d for s, d in coll['shards'].items() if shard_filter is None or s in shard_filter}
+            collections[name] = {
+                'replicationFactor': '1',
+                'router': {'name': 'compositeId'},
+                'shards': shards,
+                'health': self._health(coll),
+                'znodeVersion': 1
+            }
+        return 200, {'cluster': {'collections': collections, 'live_nodes': list(self.live_nodes)}}
+
+    def _action_requeststatus(self, params):
+        request_id = params.get('requestid')
+        status = self.async_requests.get(request_id)
+        if status is None:
+            return 200, {'status': {'state': 'notfound', 'msg': f'Did not find [{request_id}] in any tasks queue'}}
+        return 200, {'status': dict(status)}
+
+    def _action_deletestatus(self, params):
+        self.async_requests.pop(params.get('requestid'), None)
+        return 200, {'status': 'successfully removed stored response for [' + str(params.get('requestid')) + ']'}
+
+    def _shard(self, params):
+        return self.collections[params['collection']]['shards'][params['shard']]
+
+    def _action_deletereplica(self, params, async_mode=False):
+        shard_data = self._shard(params)
+        shard_data['replicas'][params['replica']]
+
+        def apply():
+            removed = shard_data['replicas'].pop(params['replica'])
+            self.cores.pop(removed['core'], None)
+            self._elect_leader(shard_data)
+        if async_mode:
+            return self.async_duration / 4, apply
+        apply()
+        return 200, {'success': {}}
+
+    def _action_addreplica(self, params, async_mode=False):
+        shard_data = self._shard(params)
+        node = params.get('node') or self.live_nodes[0]
+        size = max((self.cores.get(r['core'], {}).get('sizeInBytes', 0) for r in shard_data['replicas'].values()),
+                   default=0)
+        docs = max((self.cores.get(r['core'], {}).get('numDocs', 0) for r in shard_data['replicas'].values()),
+                   default=0)
+
+        # Without waitForFinalState the request completes while the new core is still recovering
+        recovering = self.add_recovery and params.get('waitForFinalState', 'false') != 'true'
+
+        def apply():
+            self.copies_into[node] -= async_mode
+            if node not in self.live_nodes:
+                raise RuntimeError(f"Node {node} is not live")
+            name = self.add_replica(params['collection'], params['shard'], node, params.get('type', 'NRT'),
+                                    state='recovering' if recovering else 'active', size_bytes=size,
+                                    num_docs=docs, data_dir=params.get('dataDir'), warm=False)
+            if recovering:
+                replica = shard_data['replicas'][name]
+
+                def recover():
+                    if replica['node_name'] in self.live_nodes:
+                        replica['state'] = 'active'
+                        self._elect_leader(shard_data)
+                self._schedule(self.add_recovery, recover)
+            self._elect_leader(shard_data)
+        if async_mode:
+            self.copies_into[node] += 1
+            return self.async_duration + size / self.copy_rate + (0 if recovering else self.add_recovery), apply
+        apply()
+        return 200, {'success': {}}
+
+    def _action_movereplica(self, params, async_mode=False):
+        shard_data = self._shard(params)
+        replica = shard_data['replicas'][params['replica']]
+        target = params['targetNode']
+        size = self.cores.get(replica['core'], {}).get('sizeInBytes', 0)
+
+        def apply():
+            self.copies_into[target] -= async_mode
+            if target not in self.live_nodes:
+                raise RuntimeError(f"Target node {target} is not live")
+            was_leader = replica.get('leader') == 'true'
+            moved = self.cores.get(replica['core'], {})
+            shard_data['replicas'].pop(params['replica'])
+            self.cores.pop(replica['core'], None)
+            name = self.add_replica(params['collection'], params['shard'], target, replica['type'],
+                                    size_bytes=moved.get('sizeInBytes', 0), num_docs=moved.get('numDocs', 0),
+                                    warm=False)
+            if was_leader:
+                shard_data['replicas'][name]['leader'] = 'true'
+            self._elect_leader(shard_data)
+        if async_mode:
+            self.copies_into[target] += 1
+            return self.async_duration + size / self.copy_rate, apply
+        apply()
+        return 200, {'success': {}}
+
+    def _action_addreplicaprop(self, params, async_mode=False):
+        shard_data = self._shard(params)
+        key = f"property.{params['property'].lower().removeprefix('property.')}"
+        if params['replica'] not in shard_data['replicas']:
+            return 400, {'error': {'msg': f"Could not find replica {params['replica']}", 'code': 400}}
+        if params.get('shardUnique', 'false') == 'true' or key == 'property.preferredleader':
+            for r in shard_data['replicas'].values():
+                r.pop(key, None)
+        shard_data['replicas'][params['replica']][key] = params['property.value']
+        return 200, {}
+
+    def _action_rebalanceleaders(self, params, async_mode=False):
+        coll = self.collections.get(params.get('collection'))
+        if coll is None:
+            return 400, {'error': {'msg': f"Collection {params.get('collection')} not found", 'code': 400}}
+        changed = {}
+        for shard_name, shard_data in coll['shards'].items():
+            preferred = [r for r in shard_data['replicas'].values() if r.get('property.preferredleader') == 'true'
+                         and r.get('leader') != 'true' and r['type'] != 'PULL' and r['state'] == 'active'
+                         and r['node_name'] in self.live_nodes]
+            if preferred:
+                for r in shard_data['replicas'].values():
+                    r.pop('leader', None)
+                preferred[0]['leader'] = 'true'
+                changed[shard_name] = preferred[0]['core']
+        # Each election waits for the old leader to step down
+        self.clock.advance(self.async_duration / 2 * len(changed))
+        return 200, {'Summary': {'Success': f"Successfully changed {len(changed)} leaders"}, 'successes': changed}
+
+    def _action_reload(self, params, async_mode=False):
+        if params.get('name') not in self.collections:
+            return 400, {'error': {'msg': f"Could not find collection : {params.get('name')}", 'code': 400}}
+        self.clock.advance(self.async_duration / 2)
+        return 200, {'success': {}}
+
+    def _action_collectionprop(self, params, async_mode=False):
+        return 200, {}
+
+    def _action_modifycollection(self, params, async_mode=False):
+        return 200, {'success': {}}
+
+    # -- Cores API -------------------------------------------------------------
+
+    def _node_for_host(self, netloc):
+        for node in self.live_nodes:
+            if node.split('_', 1)[0] == netloc:
+                return node
+        # Load-balanced URL: the ALB picks any live node
+        return self.random.choice(self.live_nodes) if self.live_nodes else None
+
+    def _cores_on(self, node):
+        for replica in self._all_replicas():
+            if replica['node_name'] == node:
+                yield replica
+
+    def _core_status(self, replica):
+        stats = self.cores.get(replica['core'], {})
+        return {
+            'name': replica['core'],
+            'instanceDir': replica.get('instanceDir'),
+            'dataDir': replica.get('dataDir'),
+            'index': dict(stats)
+        }
+
+    def _cores_api(self, netloc, params):
+        action = params.get('action', '').upper()
+        node = self._node_for_host(netloc)
+        local = {r['core']: r for r in self._cores_on(node)} if node else {}
+
+        if action == 'STATUS':
+            if params.get('core'):
+                core = params['core']
+                return 200, {'status': {core: self._core_status(local[core]) if core in local else {}}}
+            return 200, {'status': {name: self._core_status(r) for name, r in local.items()}}
+
+        if action == 'REQUESTRECOVERY':
+            replica = local.get(params.get('core'))
+            if replica is None:
+                return 400, {'error': {'msg': f"Core {params.get('core')} not found", 'code': 400}}
+            replica['state'] = 'recovering'
+
+            def recover():
+                if replica['node_name'] in self.live_nodes:
+                    replica['state'] = 'active'
+            self._schedule(self.recovery_duration, recover)
+            return 200, {}
+
+        return 400, {'error': {'msg': f'Unsupported core action: {action}', 'code': 400}}
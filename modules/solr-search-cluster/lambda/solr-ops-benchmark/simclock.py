@@ -0,0 +1,40 @@
+import time
+
+
+class SimulatedClock:
+    """Virtual clock that replaces time.sleep/time.monotonic while a benchmark runs.
+
+    Sleeping advances the clock instantly, so waits of minutes cost nothing in
+    real time while still being counted in the reported simulated duration.
+    """
+
+    def __init__(self, start=1_000_000.0):
+        self.now = start
+        self._originals = None
+
+    def monotonic(self):
+        return self.now
+
+    def sleep(self, seconds):
+        if seconds > 0:
+            self.now += seconds
+
+    def advance(self, seconds):
+        self.sleep(seconds)
+
+    def install(self):
+        self._originals = (time.sleep, time.monotonic)
+        time.sleep = self.sleep
+        time.monotonic = self.monotonic
+        return self
+
+    def uninstall(self):
+        if self._originals:
+            time.sleep, time.monotonic = self._originals
+            self._originals = None
+
+    def __enter__(self):
+        return self.install()
+
+    def __exit__(self, *exc):
+        self.uninstall()
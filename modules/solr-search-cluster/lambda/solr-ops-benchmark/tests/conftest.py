@@ -0,0 +1,48 @@
+"""Fixtures wiring the layer (and the DSpace Lambdas that share its helpers) to the benchmark fakes"""
+import os
+import sys
+
+import pytest
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+BENCHMARK = os.path.dirname(HERE)
+sys.path.insert(0, BENCHMARK)
+sys.path.insert(0, os.path.join(BENCHMARK, '..', 'solr-ops-layer', 'python'))
+# The DSpace Lambdas carry copies of clients.py and waiters.py; the layer's are found first
+sys.path.append(os.path.join(BENCHMARK, '..', '..', '..', 'dspace-app-services'))
+
+from fake_aws import FakeCloudWatch, FakeECS, FakeS3, FakeSNS, FakeSSM, install_boto3  # noqa: E402
+from fake_solr import FakeSolrCloud  # noqa: E402
+from simclock import SimulatedClock  # noqa: E402
+
+SOLR_URL = 'http://solr.internal:8983'
+
+
+@pytest.fixture
+def clock():
+    with SimulatedClock() as clock:
+        yield clock
+
+
+@pytest.fixture
+def aws(clock):
+    """Fake ECS, SSM, CloudWatch, S3 and SNS behind a fake boto3, with the client registry cleared around the test"""
+    import clients
+    fakes = {'ecs': FakeECS(clock), 'ssm': FakeSSM(clock), 'cloudwatch': FakeCloudWatch(clock), 's3': FakeS3(clock),
+             'sns': FakeSNS(clock)}
+    saved = sys.modules.get('boto3')
+    install_boto3(list(fakes.values()))
+    clients.reset()
+    yield fakes
+    clients.reset()
+    if saved is None:
+        sys.modules.pop('boto3', None)
+    else:
+        sys.modules['boto3'] = saved
+
+
+@pytest.fixture
+def solr(clock):
+    """Three live nodes holding two collections of four shards, one NRT leader and two PULL replicas each"""
+    return FakeSolrCloud(clock).generate(collections=('search', 'statistics'), shards=4, replicas=3, nodes=3,
+                                         mean_size_bytes=50_000_000)
@@ -0,0 +1,40 @@
+import json
+
+import pytest
+
+import alerting
+
+TOPIC = 'arn:aws:sns:us-east-1:123456789012:solr-alerts'
+
+
+@pytest.fixture
+def alerts(aws, monkeypatch):
+    monkeypatch.setenv('SNS_ALERT_TOPIC_ARN', TOPIC)
+    monkeypatch.setattr(alerting, '_alarms_checked', set())
+    return aws
+
+
+def test_alarm_is_written_once_and_details_go_to_the_topic(alerts):
+    cloudwatch, sns = alerts['cloudwatch'], alerts['sns']
+    alerting.send_sns_alert('boom', 'old-1', 'new-1', collection='search', phase='replace', node='node-1')
+    alerting.send_sns_alert('bang', 'old-2', 'new-2', phase='wait')
+    assert cloudwatch.call_counts['PutMetricAlarm'] == 1
+    assert cloudwatch.call_counts['DescribeAlarms'] == 1
+    assert cloudwatch.alarms[alerting.ALARM_NAME]['AlarmActions'] == [TOPIC]
+    assert [m['TopicArn'] for m in sns.messages] == [TOPIC, TOPIC]
+    first = json.loads(sns.messages[0]['Message'])
+    assert first['source'] == 'custom'
+    assert 'Old Task: old-1' in first['content']['description'] and 'Error: boom' in first['content']['description']
+    assert sns.messages[1]['Subject'] == 'Solr rollover failed at wait'
+    dimensioned = [d for _, d in cloudwatch.metric_data if d.get('Dimensions')]
+    assert {'Name': 'Node', 'Value': 'node-1'} in dimensioned[0]['Dimensions']
+    assert sum(1 for _, d in cloudwatch.metric_data if not d.get('Dimensions')) == 2
+
+
+def test_drifted_alarm_is_fixed_once_per_container(alerts):
+    cloudwatch = alerts['cloudwatch']
+    cloudwatch.put_metric_alarm(**{**alerting.alarm_definition(TOPIC), 'Threshold': 5.0})
+    assert alerting.ensure_alarm()
+    assert cloudwatch.alarms[alerting.ALARM_NAME]['Threshold'] == 0.0
+    assert not alerting.ensure_alarm()
+    assert cloudwatch.call_counts['DescribeAlarms'] == 1
@@ -0,0 +1,28 @@
+import pytest
+
+from async_requests import AsyncRequestTracker
+from cluster_state import ClusterState
+from conftest import SOLR_URL
+
+
+def move(solr, tracker):
+    target = solr.add_node('10.0.5.1')
+    replica = next(r for r in ClusterState(solr, SOLR_URL).replicas if not r.is_leader)
+    return tracker.submit({'action': 'MOVEREPLICA', 'collection': replica.collection, 'shard': replica.shard, 'replica': replica.name,
+                           'targetNode': target}, label=replica.path)
+
+
+def test_wait_returns_at_its_timeout(solr, clock):
+    tracker = AsyncRequestTracker(solr, SOLR_URL)
+    request = move(solr, tracker)
+    start = clock.monotonic()
+    assert tracker.wait([request], timeout=1) == []
+    assert clock.monotonic() - start == pytest.approx(1, abs=0.1)
+    assert tracker.wait([request]) == [request]
+    assert request.succeeded
+
+
+def test_wait_rejects_requests_it_does_not_poll(solr):
+    other = move(solr, AsyncRequestTracker(solr, SOLR_URL))
+    with pytest.raises(ValueError, match='not tracked'):
+        AsyncRequestTracker(solr, SOLR_URL).wait([other])
@@ -0,0 +1,101 @@
+import sys
+import types
+
+import pytest
+
+import clients
+
+
+@pytest.fixture
+def created(monkeypatch):
+    """Fake boto3 recording every session and client it builds"""
+    created = []
+
+    class Session:
+        def __init__(self, region_name=None):
+            created.append(('session', region_name))
+            self.region_name = region_name
+
+        def client(self, service_name):
+            created.append(('client', service_name))
+            return types.SimpleNamespace(service_name=service_name, region_name=self.region_name,
+                                         describe=lambda: service_name)
+
+    monkeypatch.setitem(sys.modules, 'boto3', types.SimpleNamespace(Session=Session))
+    clients.reset()
+    yield created
+    clients.reset()
+
+
+def test_lazy_client_builds_nothing_until_used(created):
+    ssm = clients.lazy_client('ssm')
+    assert created == []
+    assert ssm.describe() == 'ssm'
+    assert created == [('session', None), ('client', 'ssm')]
+
+
+def test_client_is_cached_per_service_and_region(created):
+    first = clients.client('ecs')
+    assert clients.client('ecs') is first
+    assert clients.client('ecs', region_name='us-west-2') is not first
+    assert clients.client('ssm') is not first
+    # One session per region, shared by its clients
+    assert [c for c in created if c[0] == 'session'] == [('session', None), ('session', 'us-west-2')]
+
+
+def test_lazy_clients_share_the_registry(created):
+    a, b = clients.lazy_client('ecs'), clients.lazy_client('ecs')
+    a.describe()
+    b.describe()
+    assert created.count(('client', 'ecs')) == 1
+
+
+def test_wrap_is_applied_once_and_keys_the_cache(created):
+    wrapped = []
+
+    def wrap(client):
+        wrapped.append(client)
+        return types.SimpleNamespace(inner=client)
+
+    first = clients.client('cloudwatch', wrap=wrap)
+    assert clients.client('cloudwatch', wrap=wrap) is first
+    assert len(wrapped) == 1
+    plain = clients.client('cloudwatch')
+    assert plain is not first and not hasattr(plain, 'inner')
+
+
+def test_reset_forgets_sessions_clients_and_pools(created, monkeypatch):
+    pools = []
+    monkeypatch.setitem(sys.modules, 'urllib3', types.SimpleNamespace(
+        PoolManager=lambda **kwargs: pools.append(kwargs) or object()))
+    client = clients.client('ecs')
+    pool = clients.http_pool('solr', maxsize=4)
+    clients.reset()
+    assert clients.client('ecs') is not client
+    assert clients.http_pool('solr', maxsize=8) is not pool
+    assert created.count(('session', None)) == 2
+    assert pools == [{'maxsize': 4}, {'maxsize': 8}]
+
+
+def test_http_pool_kwargs_only_apply_on_creation(created, monkeypatch):
+    pools = []
+    monkeypatch.setitem(sys.modules, 'urllib3', types.SimpleNamespace(
+        PoolManager=lambda **kwargs: pools.append(kwargs) or object()))
+    pool = clients.http_pool('solr', maxsize=4)
+    assert clients.http_pool('solr', maxsize=16) is pool
+    assert clients.http_pool('other') is not pool
+    assert pools == [{'maxsize': 4}, {}]
+
+
+def test_layer_modules_hold_lazy_clients(created):
+    import concurrency
+    assert isinstance(concurrency.ssm, clients.LazyClient)
+    assert created == []
+
+
+def test_cold_import_builds_no_client():
+    import bench
+    result = bench.run_coldstart(None)
+    assert result['clients_at_import'] == 0
+    # The first lookup builds the client, the second reuses it
+    assert result['clients_created'] == 1
@@ -0,0 +1,157 @@
+import json
+import types
+
+import pytest
+
+import concurrency
+from concurrency import Lease
+
+
+@pytest.fixture
+def ssm(aws, clock, monkeypatch):
+    # Lease expiry is wall-clock time; run it on the simulated clock
+    monkeypatch.setattr(concurrency, 'time', types.SimpleNamespace(time=clock.monotonic))
+    return aws['ssm']
+
+
+def test_acquire_free_lock(ssm):
+    lease = Lease(owner='a', ttl=60)
+    assert lease.acquire()
+    assert lease.held
+
+
+def test_second_owner_waits_for_unexpired_lease(ssm):
+    assert Lease(owner='a', ttl=60).acquire()
+    assert not Lease(owner='b', ttl=60).acquire()
+
+
+def test_expired_lease_is_taken_over_and_old_holder_loses_it(ssm, clock):
+    first = Lease(owner='a', ttl=60)
+    assert first.acquire()
+    clock.advance(61)
+    assert not first.held
+    second = Lease(owner='b', ttl=60)
+    assert second.acquire()
+    assert not first.renew()
+    assert first.lost
+    assert second.renew()
+
+
+def test_renew_extends_the_lease(ssm, clock):
+    lease = Lease(owner='a', ttl=60)
+    assert lease.acquire()
+    clock.advance(50)
+    assert lease.renew()
+    clock.advance(50)
+    assert lease.held
+    assert not Lease(owner='b', ttl=60).acquire()
+
+
+def test_same_owner_resumes_its_lease(ssm):
+    assert Lease(owner='a', ttl=60).acquire()
+    resumed = Lease(owner='a', ttl=60)
+    assert resumed.acquire()
+    assert resumed.held
+
+
+def test_force_recovery_takes_a_live_lease(ssm):
+    first = Lease(owner='a', ttl=60)
+    assert first.acquire()
+    assert Lease(owner='b', ttl=60).acquire(force_recovery=True)
+    assert not first.renew()
+
+
+def test_release_frees_the_lock_only_for_its_owner(ssm, clock):
+    first = Lease(owner='a', ttl=60)
+    assert first.acquire()
+    clock.advance(61)
+    second = Lease(owner='b', ttl=60)
+    assert second.acquire()
+    first.release()
+    assert not Lease(owner='c', ttl=60).acquire()
+    second.release()
+    assert Lease(owner='c', ttl=60).acquire()
+    assert claims(ssm) == []
+
+
+def test_legacy_timestamp_lock_blocks_until_lock_timeout(ssm, clock):
+    ssm.put_parameter(Name=concurrency.LOCK_PARAMETER, Value=str(clock.monotonic()), Type='String')
+    assert not Lease(owner='a', ttl=60).acquire()
+    clock.advance(concurrency.LOCK_TIMEOUT + 1)
+    assert Lease(owner='a', ttl=60).acquire()
+
+
+def claims(ssm):
+    return [name for name in ssm.parameters if name.startswith(concurrency.CLAIM_PREFIX)]
+
+
+def test_only_one_of_two_racing_takeovers_wins(ssm, clock):
+    assert Lease(owner='a', ttl=60).acquire()
+    clock.advance(61)
+    b, c = Lease(owner='b', ttl=60), Lease(owner='c', ttl=60)
+    record_b, _ = b._read()
+    record_c, _ = c._read()
+    assert b._replace(record_b)
+    # c read the same expired record; its write must not land on top of b's
+    assert not c._replace(record_c)
+    assert b.renew()
+    assert json.loads(ssm.parameters[concurrency.LOCK_PARAMETER]['Value'])['owner'] == 'b'
+    assert claims(ssm) == []
+
+
+def test_claim_in_progress_blocks_other_writers(ssm, clock):
+    assert Lease(owner='a', ttl=60).acquire()
+    clock.advance(61)
+    b, c = Lease(owner='b', ttl=60), Lease(owner='c', ttl=60)
+    record, _ = b._read()
+    assert b._claim(record)
+    assert not c.acquire()
+
+
+def test_expired_lease_is_not_renewed(ssm, clock):
+    lease = Lease(owner='a', ttl=60)
+    assert lease.acquire()
+    version = ssm.parameters[concurrency.LOCK_PARAMETER]['Version']
+    clock.advance(61)
+    assert not lease.renew()
+    assert lease.lost
+    assert ssm.parameters[concurrency.LOCK_PARAMETER]['Version'] == version
+
+
+def test_suspended_lease_is_resumed_by_its_owner(ssm, clock):
+    assert Lease(owner='a', ttl=60).acquire()
+    clock.advance(61)
+    resumed = Lease(owner='a', ttl=60)
+    assert resumed.acquire()
+    assert resumed.renew()
+
+
+def crash_after_claim(owner):
+    """A writer that dies after claiming the current record, before writing the lock"""
+    lease = Lease(owner=owner, ttl=60)
+    record, _ = lease._read()
+    assert lease._claim(record)
+
+
+def test_claim_of_a_crashed_writer_expires(ssm, clock):
+    assert Lease(owner='a', ttl=60).acquire()
+    clock.advance(61)
+    crash_after_claim('b')
+    assert not Lease(owner='c', ttl=60).acquire()
+    clock.advance(concurrency.LEASE_TTL)
+    assert Lease(owner='c', ttl=60).acquire()
+    assert json.loads(ssm.parameters[concurrency.LOCK_PARAMETER]['Value'])['owner'] == 'c'
+    assert claims(ssm) == []
+
+
+def test_force_recovery_gets_past_stale_claims(ssm, clock):
+    assert Lease(owner='a', ttl=3600).acquire()
+    crash_after_claim('b')
+    assert not Lease(owner='e').acquire(force_recovery=True)
+    clock.advance(concurrency.LEASE_TTL)
+    crash_after_claim('d')  # supersedes b's claim with the next generation, then dies too
+    assert len(claims(ssm)) == 2
+    assert not Lease(owner='e').acquire(force_recovery=True)
+    clock.advance(concurrency.LEASE_TTL)
+    assert Lease(owner='e').acquire(force_recovery=True)
+    assert claims(ssm) == []
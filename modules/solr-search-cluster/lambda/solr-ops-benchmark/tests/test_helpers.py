@@ -0,0 +1,24 @@
+import os
+
+import pytest
+
+import waiters
+
+MODULES = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', '..', '..')
+LAYER = os.path.join(MODULES, 'solr-search-cluster', 'lambda', 'solr-ops-layer', 'python')
+COPIES = [os.path.join(MODULES, 'dspace-app-services'), os.path.join(MODULES, 'drcc-foundation', 'lambda')]
+
+
+@pytest.mark.parametrize('name', ['clients.py', 'waiters.py'])
+@pytest.mark.parametrize('directory', COPIES)
+def test_copies_match_the_layer(directory, name):
+    with open(os.path.join(LAYER, name), 'rb') as original, open(os.path.join(directory, name), 'rb') as copy:
+        header = [copy.readline(), copy.readline()]
+        assert all(line.startswith(b'# ') for line in header)
+        assert copy.read() == original.read()
+
+
+def test_wait_until_needs_a_deadline(clock):
+    with pytest.raises(ValueError, match='needs a timeout'):
+        waiters.wait_until(lambda: False)
+    assert waiters.wait_until(lambda: False, timeout=30) is None
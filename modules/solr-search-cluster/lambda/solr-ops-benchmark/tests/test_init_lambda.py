@@ -0,0 +1,117 @@
+import json
+import types
+
+import pytest
+
+import init_lambda
+from bench import FakeLambdaContext
+
+NETWORK = {'awsvpcConfiguration': {'subnets': ['subnet-1'], 'securityGroups': ['sg-1'], 'assignPublicIp': 'DISABLED'}}
+
+
+@pytest.fixture
+def ecs(aws):
+    ecs = aws['ecs']
+    ecs.task_behaviour = {'db': {'run_time': 300}, 'solr': {'run_time': 120}, 'bad': {'run_time': 30, 'exit_code': 1}}
+    return ecs
+
+
+@pytest.fixture
+def env(monkeypatch):
+    monkeypatch.setenv('CLUSTER_ARN', 'cluster')
+    monkeypatch.setenv('SUBNET_IDS', json.dumps(['subnet-1']))
+    monkeypatch.setenv('SECURITY_GROUP_ID', 'sg-1')
+
+    def steps(*steps):
+        monkeypatch.setenv('INIT_STEPS', json.dumps([
+            {'name': name, 'task_definition': task_definition, 'depends_on': list(depends_on)}
+            for name, task_definition, depends_on in steps]))
+    return steps
+
+
+def started(ecs):
+    """Task definition -> simulated start time of its task"""
+    return {t['taskDefinitionArn']: t['started_at'] for t in ecs.tasks.values()}
+
+
+def test_dependent_step_starts_after_its_dependency_succeeds(ecs):
+    steps = [{'name': 'db-init', 'task_definition': 'db', 'depends_on': []},
+             {'name': 'solr-init', 'task_definition': 'solr', 'depends_on': ['db-init']}]
+    state = {}
+    assert init_lambda.run_steps('cluster', steps, NETWORK, state)
+    assert [s['status'] for s in state.values()] == ['SUCCESS', 'SUCCESS']
+    times = started(ecs)
+    assert times['solr'] - times['db'] >= ecs.start_delay + 300
+
+
+def test_independent_steps_start_together(ecs):
+    steps = [{'name': 'db-init', 'task_definition': 'db', 'depends_on': []},
+             {'name': 'solr-init', 'task_definition': 'solr', 'depends_on': []}]
+    assert init_lambda.run_steps('cluster', steps, NETWORK, {})
+    times = started(ecs)
+    assert abs(times['solr'] - times['db']) < 1
+
+
+def test_failure_stops_running_steps_and_skips_dependents(ecs):
+    steps = [{'name': 'db-init', 'task_definition': 'db', 'depends_on': []},
+             {'name': 'bad', 'task_definition': 'bad', 'depends_on': []},
+             {'name': 'solr-init', 'task_definition': 'solr', 'depends_on': ['db-init']}]
+    state = {}
+    assert init_lambda.run_steps('cluster', steps, NETWORK, state)
+    assert {name: s['status'] for name, s in state.items()} == {
+        'db-init': 'STOPPED', 'bad': 'FAILED', 'solr-init': 'SKIPPED'}
+    assert ecs.call_counts['StopTask'] == 1
+    db_task = next(t for t in ecs.tasks.values() if t['taskDefinitionArn'] == 'db')
+    assert db_task['desiredStatus'] == 'STOPPED'
+
+
+def test_handler_hands_off_with_a_continuation(ecs, env, clock):
+    env(('db-init', 'db', ()), ('solr-init', 'solr', ('db-init',)))
+    response = init_lambda.handler({}, FakeLambdaContext(clock, 120))
+    invocations = 1
+    while response['statusCode'] == 202:
+        continuation = json.loads(json.dumps(response['continuation']))
+        response = init_lambda.handler({'continuation': continuation}, FakeLambdaContext(clock, 120))
+        invocations += 1
+    assert response['statusCode'] == 200
+    assert invocations > 2
+    assert ecs.call_counts['RunTask'] == 2
+    results = json.loads(response['body'])['results']
+    assert results['database_init'] == results['db-init'] and results['solr_init'] == results['solr-init']
+
+
+def test_handler_reports_failures(ecs, env, clock):
+    env(('bad', 'bad', ()), ('solr-init', 'solr', ('bad',)))
+    response = init_lambda.handler({}, FakeLambdaContext(clock, 900))
+    body = json.loads(response['body'])
+    assert response['statusCode'] == 500
+    assert body['results']['solr-init']['status'] == 'SKIPPED'
+
+
+def test_timed_out_step_is_stopped(ecs, clock, monkeypatch):
+    monkeypatch.setattr(init_lambda, 'time', types.SimpleNamespace(time=clock.monotonic))
+    ecs.task_behaviour['slow'] = {'run_time': 5 * init_lambda.MAX_WAIT}
+    state = {}
+    assert init_lambda.run_steps('cluster', [{'name': 'slow', 'task_definition': 'slow', 'depends_on': []}],
+                                 NETWORK, state, wait_seconds=2 * init_lambda.MAX_WAIT)
+    assert state['slow']['status'] == 'TIMEOUT'
+    assert ecs.call_counts['StopTask'] == 1
+    assert next(iter(ecs.tasks.values()))['desiredStatus'] == 'STOPPED'
+
+
+@pytest.mark.parametrize('steps, error', [
+    ([{'name': 'a', 'task_definition': 'db', 'depends_on': ['missing']}], 'unknown steps'),
+    ([{'name': 'a', 'task_definition': 'db', 'depends_on': ['b']},
+      {'name': 'b', 'task_definition': 'db', 'depends_on': ['a']}], 'circular'),
+])
+def test_invalid_step_graphs_are_rejected(monkeypatch, steps, error):
+    monkeypatch.setenv('INIT_STEPS', json.dumps(steps))
+    with pytest.raises(ValueError, match=error):
+        init_lambda.init_steps()
+
+
+def test_default_steps_run_solr_after_db(monkeypatch):
+    monkeypatch.delenv('INIT_STEPS', raising=False)
+    monkeypatch.setenv('DB_INIT_TASK_DEF', 'db')
+    monkeypatch.setenv('SOLR_INIT_TASK_DEF', 'solr')
+    assert [s['depends_on'] for s in init_lambda.init_steps()] == [[], ['db-init']]
@@ -0,0 +1,39 @@
+import json
+import logging
+
+import alerting
+import instrumentation
+
+
+def test_emf_lines_are_written_bare_and_not_through_the_root_logger(capsys):
+    class Recorder(logging.Handler):
+        def __init__(self):
+            super().__init__()
+            self.records = []
+
+        def emit(self, record):
+            self.records.append(record)
+
+    root = Recorder()
+    logging.getLogger().addHandler(root)
+    try:
+        instrumentation.metrics.reset()
+        instrumentation.metrics.record('solr', 'CLUSTERSTATUS', 12.0, 200, response_bytes=100)
+        instrumentation.metrics.flush()
+    finally:
+        logging.getLogger().removeHandler(root)
+    lines = capsys.readouterr().out.splitlines()
+    assert [json.loads(line)['Operation'] for line in lines] == ['CLUSTERSTATUS']
+    assert not root.records
+    assert instrumentation.metrics.summary() == {}
+
+
+def test_metric_buffer_emits_through_the_same_logger(capsys):
+    buffer = alerting.MetricBuffer(mode='emf')
+    buffer.add('RolloverStepSeconds', 4.5, 'Seconds', Phase='move_replicas')
+    buffer.add('RolloverStepSeconds', 2.0, 'Seconds', Phase='move_replicas')
+    assert buffer.flush() == 2
+    (line,) = capsys.readouterr().out.splitlines()
+    document = json.loads(line)
+    assert document['RolloverStepSeconds'] == [4.5, 2.0]
+    assert document['_aws']['CloudWatchMetrics'][0]['Dimensions'] == [['Phase']]
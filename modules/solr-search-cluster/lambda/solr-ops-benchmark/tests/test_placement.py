@@ -0,0 +1,72 @@
+from cluster_state import ClusterState
+from conftest import SOLR_URL
+from fake_solr import FakeSolrCloud
+from placement import execute_plan, plan_placement, plan_replacements
+
+
+def cluster(clock, nodes=4, dead_nodes=1):
+    return FakeSolrCloud(clock).generate(collections=('search', 'statistics'), shards=4, replicas=3, nodes=nodes,
+                                         dead_nodes=dead_nodes, mean_size_bytes=50_000_000)
+
+
+def test_plan_replaces_replicas_of_a_dead_node_on_live_nodes(clock):
+    state = ClusterState(cluster(clock), SOLR_URL)
+    plan = plan_placement(state)
+    live = set(state.live_nodes)
+    # NRT replicas are left to recovery, which reuses their dataDir
+    dead = {r.path for r in state.replicas if r.node_name not in live and r.type == 'PULL'}
+    deleted = {f"{op['collection']}/{op['shard']}/{op['replica']}" for op in plan['operations']
+               if op['action'] == 'DELETE'}
+    assert dead and dead <= deleted
+    assert all(op['target'] in live for op in plan['operations'] if op['action'] in ('ADD', 'MOVE'))
+    leaders = {r.name for r in state.replicas if r.is_leader}
+    assert not [op for op in plan['operations'] if op['action'] == 'MOVE' and op['replica'] in leaders]
+
+
+def test_operations_on_a_shard_form_a_chain(clock):
+    plan = plan_placement(ClusterState(cluster(clock), SOLR_URL))
+    previous = {}
+    for op in plan['operations']:
+        key = (op['collection'], op['shard'])
+        assert op['depends_on'] == ([previous[key]] if key in previous else [])
+        previous[key] = op['id']
+
+
+def test_executed_plan_reaches_the_desired_topology(clock):
+    solr = cluster(clock)
+    state = ClusterState(solr, SOLR_URL)
+    operations = execute_plan(solr, SOLR_URL, plan_placement(state), cluster_state=state)
+    assert all(op['status'] == 'completed' for op in operations)
+
+    after = state.refresh()
+    for collection in ('search', 'statistics'):
+        for shard in ('shard1', 'shard2', 'shard3', 'shard4'):
+            replicas = after.shard_replicas(collection, shard)
+            pulls = [r for r in replicas if r.type == 'PULL']
+            assert [r.type for r in replicas].count('NRT') == 1
+            assert len(pulls) == 2 and all(r.node_name in after.live_nodes for r in pulls)
+            assert len({r.node_name for r in replicas}) == 3
+    assert not plan_placement(after)['operations']
+
+
+def test_replacements_go_to_the_least_loaded_nodes(clock):
+    solr = cluster(clock, dead_nodes=0)
+    state = ClusterState(solr, SOLR_URL)
+    down = sorted(state.live_nodes)[0]
+    spare = solr.add_node('10.0.5.1')
+    targets = plan_replacements(state, down, state.refresh().live_nodes - {down})
+    assert set(targets) == {r.path for r in state.replicas_on_node(down)}
+    assert down not in targets.values()
+    # The empty node takes the largest share
+    assert max(set(targets.values()), key=list(targets.values()).count) == spare
+
+
+def test_node_zones_come_from_the_running_tasks(aws):
+    from ecs_operations import get_node_zones
+    ecs = aws['ecs']
+    ecs.add_service('solr', desired_count=3)
+    ecs.start_task(service='solr', ip='10.0.1.5', running=True)
+    zones = get_node_zones(ecs, 'cluster')
+    assert len(zones) == 4
+    assert zones['10.0.1.5:8983_solr'] == ecs.tasks[max(ecs.tasks)]['availabilityZone']
+    assert set(zones.values()) == {'us-east-1a', 'us-east-1b', 'us-east-1c'}
@@ -0,0 +1,90 @@
+from collections import Counter
+
+from cluster_state import ClusterState
+from conftest import SOLR_URL
+from replica_mover import ReplicaMoveScheduler
+
+
+def new_node(solr):
+    return solr.add_node('10.0.5.1')
+
+
+def test_moves_complete_within_per_node_and_collection_limits(solr):
+    target = new_node(solr)
+    state = ClusterState(solr, SOLR_URL)
+    source = sorted(state.live_nodes - {target})[0]
+    running, peak_node, peak_collection = set(), Counter(), Counter()
+
+    def on_progress(task):
+        if task.status == 'running':
+            running.add(task)
+        else:
+            running.discard(task)
+        peak_node[task.target_node] = max(peak_node[task.target_node],
+                                          sum(1 for t in running if t.target_node == task.target_node))
+        peak_collection[task.collection] = max(peak_collection[task.collection],
+                                               sum(1 for t in running if t.collection == task.collection))
+
+    scheduler = ReplicaMoveScheduler(solr, SOLR_URL, cluster_state=state, max_in_flight=8, per_node_limit=2,
+                                     per_collection_limit=3, on_progress=on_progress)
+    moving = state.replicas_on_node(source)
+    for replica in moving:
+        scheduler.add_move(replica, target)
+    tasks = scheduler.run()
+
+    assert [t.status for t in tasks] == ['completed'] * len(moving)
+    assert peak_node[target] == 2
+    assert max(peak_collection.values()) <= 3
+    after = state.refresh()
+    assert not after.replicas_on_node(source)
+    assert len(after.replicas_on_node(target)) == len(moving)
+
+
+def test_leader_moves_after_the_rest_of_its_shard(solr):
+    target = new_node(solr)
+    state = ClusterState(solr, SOLR_URL)
+    shard = state.shard_replicas('search', 'shard1')
+    order = []
+
+    def on_progress(task):
+        if task.status == 'running':
+            order.append((task.is_leader, task.replica.name))
+
+    scheduler = ReplicaMoveScheduler(solr, SOLR_URL, cluster_state=state, on_progress=on_progress,
+                                     order='submitted')
+    leader = next(r for r in shard if r.is_leader)
+    scheduler.add_move(leader, target)
+    follower = next(r for r in shard if not r.is_leader)
+    scheduler.add_move(follower, solr.add_node('10.0.5.2'))
+    scheduler.run()
+    assert [is_leader for is_leader, _ in order] == [False, True]
+
+
+def test_dependent_task_fails_with_its_dependency(solr):
+    target = new_node(solr)
+    state = ClusterState(solr, SOLR_URL)
+    replica = state.shard_replicas('search', 'shard1')[1]
+    missing = replica._replace(name='core_node999')
+    scheduler = ReplicaMoveScheduler(solr, SOLR_URL, cluster_state=state)
+    delete = scheduler.add_delete(missing)
+    move = scheduler.add_move(replica, target)
+    move.depends_on = [delete]
+    scheduler.run()
+    assert delete.status == 'failed'
+    assert (move.status, move.error) == ('failed', 'dependency failed')
+    assert replica.name in {r.name for r in state.refresh().shard_replicas('search', 'shard1')}
+
+
+def test_added_replica_is_active_when_the_task_completes(clock, solr):
+    solr.add_recovery = 30.0
+    target = new_node(solr)
+    state = ClusterState(solr, SOLR_URL)
+    leader = state.leader('search', 'shard2')
+    scheduler = ReplicaMoveScheduler(solr, SOLR_URL, cluster_state=state)
+    task = scheduler.add_add(leader, target)
+    started = clock.monotonic()
+    scheduler.run()
+    assert task.status == 'completed'
+    assert clock.monotonic() - started >= 30
+    added = [r for r in state.refresh().shard_replicas('search', 'shard2') if r.node_name == target]
+    assert [(r.type, r.state) for r in added] == [('NRT', 'active')]
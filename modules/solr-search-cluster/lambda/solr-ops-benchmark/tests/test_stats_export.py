@@ -0,0 +1,112 @@
+import gzip
+import json
+import threading
+import types
+
+import pytest
+
+import stats_export
+from conftest import SOLR_URL
+from fake_solr import FakeSolrCloud
+
+BUCKET = 'exports'
+DOCS = {'shard1': 900, 'shard2': 700, 'shard3': 0}
+
+
+@pytest.fixture
+def env(aws, clock, monkeypatch):
+    """Statistics collection of three shards, with the exporter on the simulated clock"""
+    solr = FakeSolrCloud(clock).generate(collections=('statistics',), shards=3, replicas=1, nodes=1)
+    for shard, count in DOCS.items():
+        solr.add_documents('statistics', shard, [{'uid': f"{shard}-{i:05d}", 'type': 2, '_version_': 1}
+                                                 for i in range(count)])
+    fake_time = types.SimpleNamespace(time=clock.monotonic, sleep=clock.sleep)
+    monkeypatch.setattr(stats_export, 'time', fake_time)
+    monkeypatch.setattr(stats_export, 'MIN_PART_SIZE', 1024)
+    return types.SimpleNamespace(solr=solr, s3=aws['s3'], clock=clock)
+
+
+def exporter(env, prefix='full/', **kwargs):
+    return stats_export.StatisticsExport(f"{SOLR_URL}/solr", BUCKET, prefix, rows=100, part_size=1024, workers=1,
+                                         s3_client=env.s3, http=env.solr, **kwargs)
+
+
+def exported_uids(env, prefix='full/'):
+    uids = {}
+    for (bucket, key), body in env.s3.objects.items():
+        if bucket == BUCKET and key.startswith(prefix) and key.endswith('.ndjson.gz'):
+            uids[key] = [json.loads(line)['uid'] for line in gzip.decompress(body).splitlines()]
+    return uids
+
+
+def manifest(env, prefix='full/'):
+    return json.loads(env.s3.objects[(BUCKET, f"{prefix}_manifest.json")])
+
+
+def test_export_writes_every_shard_in_uid_order(env):
+    assert exporter(env).run()
+    uids = exported_uids(env)
+    for shard, count in DOCS.items():
+        assert uids[f"full/statistics-{shard}.ndjson.gz"] == [f"{shard}-{i:05d}" for i in range(count)]
+    assert manifest(env)['complete']
+    assert not env.s3.uploads
+
+
+def test_export_stopped_at_the_deadline_resumes_where_it_left_off(env):
+    assert not exporter(env).run(deadline=env.clock.monotonic() + 0.2)
+    assert not manifest(env)['complete']
+    assert exporter(env).run()
+    uids = exported_uids(env)
+    assert sum(len(v) for v in uids.values()) == sum(DOCS.values())
+    assert all(len(v) == len(set(v)) for v in uids.values())
+
+
+def test_complete_export_is_replaced_by_the_next_run(env):
+    assert exporter(env).run()
+    first = manifest(env)['started_at']
+    env.clock.advance(3600)
+    env.solr.add_documents('statistics', 'shard3', [{'uid': 'shard3-new'}])
+    assert exporter(env).run()
+    assert manifest(env)['started_at'] > first
+    assert exported_uids(env)['full/statistics-shard3.ndjson.gz'] == ['shard3-new']
+
+
+def test_continuation_of_a_complete_export_does_nothing(env):
+    assert exporter(env).run()
+    uploads = env.s3.call_counts['CreateMultipartUpload']
+    assert exporter(env).run(continuing=True)
+    assert env.s3.call_counts['CreateMultipartUpload'] == uploads
+
+
+def test_force_aborts_the_unfinished_export(env):
+    assert not exporter(env).run(deadline=env.clock.monotonic() + 0.2)
+    assert env.s3.uploads
+    assert exporter(env).run(force=True)
+    assert not env.s3.uploads
+    assert env.s3.call_counts['AbortMultipartUpload'] >= 1
+
+
+def test_manifest_of_another_export_is_not_resumed(env):
+    assert not exporter(env).run(deadline=env.clock.monotonic() + 0.2)
+    with pytest.raises(ValueError, match='use force'):
+        exporter(env, last='m').run()
+
+
+
+def test_manifest_writes_never_land_out_of_order(env):
+    export = exporter(env)
+    export.manifest = export.new_manifest()
+    entry = export.manifest['shards'].setdefault('shard1', {'done': False})
+    threads = []
+    with export._save_lock:
+        # Both snapshots are taken while a write is in flight; only the newer may be the last one stored
+        for done in (False, True):
+            entry['done'] = done
+            thread = threading.Thread(target=export.save)
+            thread.start()
+            while export._revision < len(threads) + 1:
+                thread.join(0.001)
+            threads.append(thread)
+    for thread in threads:
+        thread.join()
+    assert manifest(env)['shards']['shard1']['done']
@@ -0,0 +1,50 @@
+import types
+
+import pytest
+
+import stats_import
+from conftest import SOLR_URL
+from fake_solr import FakeSolrCloud
+from test_stats_export import BUCKET, DOCS, env, exporter, manifest  # noqa: F401
+
+
+@pytest.fixture
+def importing(env, monkeypatch):
+    """The export environment with the importer on the simulated clock too"""
+    monkeypatch.setattr(stats_import, 'time', types.SimpleNamespace(time=env.clock.monotonic, sleep=env.clock.sleep))
+    return env
+
+
+def test_import_loads_an_export_and_restarts_for_a_new_one(importing):
+    env = importing
+    assert exporter(env).run()
+    target = FakeSolrCloud(env.clock).generate(collections=('statistics',), shards=2, replicas=1, nodes=1)
+    source = stats_import.S3Source(BUCKET, 'full/', s3_client=env.s3)
+
+    def run():
+        importer = stats_import.StatisticsImport(f"{SOLR_URL}/solr", source, batch_docs=250, max_workers=2,
+                                                 http=target)
+        assert importer.run()
+        return importer
+
+    assert run().state['docs'] == sum(DOCS.values())
+    stored = {uid for shard in target.documents['statistics'].values() for uid in shard}
+    assert len(stored) == sum(DOCS.values())
+
+    # Same export: nothing to do
+    assert run().state['docs'] == sum(DOCS.values())
+    assert target.commits['statistics'] == 1
+
+    env.clock.advance(3600)
+    assert exporter(env).run()
+    assert run().state['export'] == manifest(env)['started_at']
+    assert target.commits['statistics'] == 2
+
+
+def test_import_of_a_prefix_without_exported_objects_fails(importing):
+    env = importing
+    env.s3.put_object(Bucket=BUCKET, Key='csv/statistics.csv', Body=b'uid,type\n')
+    source = stats_import.S3Source(BUCKET, 'csv/', s3_client=env.s3)
+    importer = stats_import.StatisticsImport(f"{SOLR_URL}/solr", source, http=env.solr)
+    with pytest.raises(ValueError, match='No objects'):
+        importer.run()
@@ -1,44 +1,187 @@
-import boto3
+import json
 import logging
 import os
+import threading
+import time
+
+from clients import client
+from instrumentation import MAX_EMF_VALUES, emit_emf, instrument_client
 
 logger = logging.getLogger()
 
-def send_sns_alert(message, old_task_id, new_task_id):
-    """Send alert via CloudWatch Alarm for AWS Chatbot compatibility"""
+ALARM_NAME = 'DSpace-Solr-Unhealthy-ECSRollover'
+NAMESPACE = 'DSpace/Solr'
+METRICS_MODE = os.environ.get('SOLR_ALERT_METRICS_MODE', 'emf')  # 'emf' (log lines, no API calls) or 'api'
+MAX_METRIC_DATA = 1000  # PutMetricData limit on items per call
+MAX_SNS_SUBJECT = 100  # Publish limit on Subject
+
+# Alarms checked in this container; the definition only changes with the deployment
+_alarms_checked = set()
+_alarms_lock = threading.Lock()
+
+
+def alarm_definition(sns_topic_arn):
+    """put_metric_alarm arguments of the rollover failure alarm"""
+    return {
+        'AlarmName': ALARM_NAME,
+        'AlarmDescription': ('Solr rollover failed; the SNS topic also receives a message with the old and new '
+                             'task IDs, phase, node and error'),
+        'ActionsEnabled': True,
+        'AlarmActions': [sns_topic_arn],
+        'MetricName': 'RolloverFailure',
+        'Namespace': NAMESPACE,
+        'Statistic': 'Sum',
+        'Period': 60,
+        'EvaluationPeriods': 1,
+        'Threshold': 0.0,
+        'ComparisonOperator': 'GreaterThanThreshold',
+        'TreatMissingData': 'notBreaching'
+    }
+
+
+def ensure_alarm(cloudwatch=None, sns_topic_arn=None):
+    """Create or update the rollover alarm if it differs from alarm_definition(); checked once per container"""
+    sns_topic_arn = sns_topic_arn if sns_topic_arn is not None else os.environ.get('SNS_ALERT_TOPIC_ARN', '')
+    definition = alarm_definition(sns_topic_arn)
+    key = (ALARM_NAME, sns_topic_arn)
+    if key in _alarms_checked:
+        return False
+    with _alarms_lock:
+        if key in _alarms_checked:
+            return False
+        cloudwatch = cloudwatch or client('cloudwatch', wrap=instrument_client)
+        try:
+            existing = cloudwatch.describe_alarms(AlarmNames=[ALARM_NAME]).get('MetricAlarms', [])
+        except Exception as e:
+            logger.warning(f"Could not describe alarm {ALARM_NAME}, writing it: {e}")
+            existing = []
+        changed = not existing or any(existing[0].get(k) != v for k, v in definition.items())
+        if changed:
+            cloudwatch.put_metric_alarm(**definition)
+            logger.info(f"Alarm {ALARM_NAME} created or updated")
+        _alarms_checked.add(key)
+        return changed
+
+
+class MetricBuffer:
+    """Metric points collected during an invocation and published together by flush().
+
+    In 'emf' mode the points are written as CloudWatch Embedded Metric Format
+    lines (instrumentation.emit_emf), one per dimension set, which cost no API calls. In 'api' mode they
+    are sent with put_metric_data, MAX_METRIC_DATA points per call.
+    """
+
+    def __init__(self, namespace=NAMESPACE, mode=METRICS_MODE):
+        self.namespace = namespace
+        self.mode = mode
+        self.points = []
+        self._lock = threading.Lock()
+
+    def add(self, name, value=1, unit='Count', **dimensions):
+        """Buffer one point; dimensions whose value is None are left out"""
+        dimensions = {k: str(v) for k, v in dimensions.items() if v is not None}
+        with self._lock:
+            self.points.append((name, value, unit, dimensions, time.time()))
+
+    def flush(self, cloudwatch=None):
+        """Publish and clear the buffered points; returns how many were published"""
+        with self._lock:
+            points, self.points = self.points, []
+        if not points:
+            return 0
+        try:
+            if self.mode == 'api':
+                self._put_metric_data(points, cloudwatch or client('cloudwatch', wrap=instrument_client))
+            else:
+                emit_emf(self.emf_lines(points))
+        except Exception as e:
+            logger.error(f"Failed to publish {len(points)} metric points: {e}")
+            return 0
+        return len(points)
+
+    def emf_lines(self, points):
+        """One EMF line per dimension set, starting another once a metric has MAX_EMF_VALUES values"""
+        lines = []
+        current = {}
+        for name, value, unit, dimensions, timestamp in points:
+            key = tuple(sorted(dimensions.items()))
+            line = current.get(key)
+            if line is None or len(line.get(name, ())) >= MAX_EMF_VALUES:
+                line = current[key] = {
+                    '_aws': {
+                        'Timestamp': int(timestamp * 1000),
+                        'CloudWatchMetrics': [{'Namespace': self.namespace, 'Dimensions': [sorted(dimensions)],
+                                               'Metrics': []}]
+                    },
+                    **dimensions
+                }
+                lines.append(line)
+            if name not in line:
+                line['_aws']['CloudWatchMetrics'][0]['Metrics'].append({'Name': name, 'Unit': unit})
+                line[name] = []
+            line[name].append(value)
+        return [json.dumps(line) for line in lines]
+
+    def _put_metric_data(self, points, cloudwatch):
+        data = [{
+            'MetricName': name,
+            'Value': value,
+            'Unit': unit,
+            'Timestamp': timestamp,
+            'Dimensions': [{'Name': k, 'Value': v} for k, v in sorted(dimensions.items())]
+        } for name, value, unit, dimensions, timestamp in points]
+        for start in range(0, len(data), MAX_METRIC_DATA):
+            cloudwatch.put_metric_data(Namespace=self.namespace, MetricData=data[start:start + MAX_METRIC_DATA])
+
+
+metric_buffer = MetricBuffer()
+
+
+def record_metric(name, value=1, unit='Count', collection=None, phase=None, node=None, **dimensions):
+    """Buffer a metric point with the usual Collection/Phase/Node dimensions"""
+    metric_buffer.add(name, value, unit, Collection=collection, Phase=phase, Node=node, **dimensions)
+
+
+def flush_metrics(cloudwatch=None):
+    """Publish the buffered metric points (call once at the end of an invocation)"""
+    return metric_buffer.flush(cloudwatch)
+
+
+def send_sns_alert(message, old_task_id, new_task_id, collection=None, phase=None, node=None):
+    """Send alert via CloudWatch Alarm for AWS Chatbot compatibility.
+
+    The alarm is checked once per container; the details of this failure go
+    to the alarm's SNS topic as a Chatbot custom notification, and as
+    dimensions on a copy of the metric point.
+    """
     try:
-        cloudwatch = boto3.client('cloudwatch')
+        cloudwatch = client('cloudwatch', wrap=instrument_client)
+        details = (f"Solr rollover failed | Old Task: {old_task_id} | New Task: {new_task_id} | "
+                   f"Phase: {phase} | Node: {node} | Error: {message}")
+        logger.error(details)
+
         sns_topic_arn = os.environ.get('SNS_ALERT_TOPIC_ARN', '')
-        
-        # Update alarm description with task details
-        alarm_description = f"Solr rollover failed | Old Task: {old_task_id} | New Task: {new_task_id} | Error: {message}"
-        
-        cloudwatch.put_metric_alarm(
-            AlarmName='DSpace-Solr-Unhealthy-ECSRollover',
-            AlarmDescription=alarm_description,
-            ActionsEnabled=True,
-            AlarmActions=[sns_topic_arn],
-            MetricName='RolloverFailure',
-            Namespace='DSpace/Solr',
-            Statistic='Sum',
-            Period=60,
-            EvaluationPeriods=1,
-            Threshold=0.0,
-            ComparisonOperator='GreaterThanThreshold',
-            TreatMissingData='notBreaching'
-        )
-        
-        # Send metric to trigger alarm
-        cloudwatch.put_metric_data(
-            Namespace='DSpace/Solr',
-            MetricData=[{
-                'MetricName': 'RolloverFailure',
-                'Value': 1,
-                'Unit': 'Count'
-            }]
-        )
-        
-        logger.info(f"CloudWatch alarm updated and triggered for Old Task: {old_task_id}, New Task: {new_task_id}")
-        
+        ensure_alarm(cloudwatch, sns_topic_arn)
+        if sns_topic_arn:
+            try:
+                client('sns', wrap=instrument_client).publish(
+                    TopicArn=sns_topic_arn,
+                    Subject=f"Solr rollover failed at {phase or 'unknown phase'}"[:MAX_SNS_SUBJECT],
+                    Message=json.dumps({'version': '1.0', 'source': 'custom',
+                                        'content': {'title': f"{ALARM_NAME}: Solr rollover failed",
+                                                    'description': details}}))
+            except Exception as e:
+                logger.error(f"Failed to publish alert details to {sns_topic_arn}: {e}")
+
+        # The alarm watches the metric without dimensions, so that point is sent now to fire it this minute
+        dimensions = {'Collection': collection, 'Phase': phase, 'Node': node}
+        data = [{'MetricName': 'RolloverFailure', 'Value': 1, 'Unit': 'Count'}]
+        if any(dimensions.values()):
+            data.append({'MetricName': 'RolloverFailure', 'Value': 1, 'Unit': 'Count',
+                         'Dimensions': [{'Name': k, 'Value': str(v)} for k, v in dimensions.items() if v is not None]})
+        cloudwatch.put_metric_data(Namespace=NAMESPACE, MetricData=data)
+
+        logger.info(f"CloudWatch alarm triggered for Old Task: {old_task_id}, New Task: {new_task_id}")
+
     except Exception as e:
         logger.error(f"Failed to send CloudWatch alert: {e}")
@@ -0,0 +1,192 @@
+import logging
+import time
+import uuid
+
+from solr_client import SolrAdminClient, is_success
+
+logger = logging.getLogger()
+
+INITIAL_POLL_INTERVAL = 0.5  # seconds before the first REQUESTSTATUS of a new request
+MAX_POLL_INTERVAL = 8
+POLL_BACKOFF = 1.6
+
+FINAL_STATES = ('completed', 'failed', 'timeout', 'notfound')
+
+
+class AsyncRequest:
+    """Future-like handle for one async Collections API request"""
+
+    def __init__(self, tracker, request_id, timeout, label=None):
+        self.tracker = tracker
+        self.request_id = request_id
+        self.label = label or request_id
+        self.timeout = timeout
+        self.submitted_at = time.monotonic()
+        self.finished_at = None
+        self.state = 'submitted'
+        self.response = None
+        self.interval = tracker.initial_interval
+        self.next_poll = self.submitted_at + self.interval
+        self._callbacks = []
+
+    def done(self):
+        return self.state in FINAL_STATES
+
+    @property
+    def succeeded(self):
+        return self.state == 'completed'
+
+    @property
+    def elapsed(self):
+        return (self.finished_at or time.monotonic()) - self.submitted_at
+
+    def result(self):
+        """Block until the request finishes and return whether it completed successfully"""
+        if not self.done():
+            self.tracker.wait([self])
+        return self.succeeded
+
+    def add_done_callback(self, fn):
+        if self.done():
+            fn(self)
+        else:
+            self._callbacks.append(fn)
+
+    def _finish(self, state, response=None):
+        self.state = state
+        self.response = response
+        self.finished_at = time.monotonic()
+        for fn in self._callbacks:
+            try:
+                fn(self)
+            except Exception as e:
+                logger.warning(f"Callback for request {self.request_id} failed: {e}")
+        self._callbacks = []
+
+
+class AsyncRequestTracker:
+    """Tracks all outstanding async Collections API requests of an invocation.
+
+    Outstanding requests are polled together in sweeps. Each request backs off
+    on its own schedule, so a new request is checked within half a second while
+    long-running copies are polled every few seconds. Finished request IDs are
+    removed from the Overseer with DELETESTATUS.
+    """
+
+    def __init__(self, http, solr_url, initial_interval=INITIAL_POLL_INTERVAL,
+                 max_interval=MAX_POLL_INTERVAL, backoff=POLL_BACKOFF, delete_status=True, client=None):
+        self.client = client or SolrAdminClient(solr_url, http)
+        self.http = self.client.http
+        self.solr_url = solr_url
+        self.initial_interval = initial_interval
+        self.max_interval = max_interval
+        self.backoff = backoff
+        self.delete_status = delete_status
+        self.outstanding = []
+
+    def submit(self, params, timeout=300, label=None):
+        """Send a Collections API action with a generated async ID and return its handle"""
+        request_id = str(uuid.uuid4())
+        request = AsyncRequest(self, request_id, timeout, label)
+        params = dict(params)
+        action = params.pop('action')
+        try:
+            result = self.client.collections(action, {**params, 'async': request_id})
+        except Exception as e:
+            logger.error(f"Failed to submit {action} for {request.label}: {e}")
+            request._finish('failed', {'error': str(e)})
+            return request
+
+        if not is_success(result):
+            logger.error(f"Failed to submit {action} for {request.label}: {result}")
+            request._finish('failed', result)
+            return request
+
+        logger.info(f"{action} submitted for {request.label}, request_id: {request_id}")
+        self.outstanding.append(request)
+        return request
+
+    def track(self, request_id, timeout=300, label=None):
+        """Start tracking a request that was submitted elsewhere"""
+        request = AsyncRequest(self, request_id, timeout, label)
+        self.outstanding.append(request)
+        return request
+
+    def _request_status(self, request):
+        return self.client.collections('REQUESTSTATUS', {'requestid': request.request_id})
+
+    def _delete_status(self, request):
+        try:
+            self.client.collections('DELETESTATUS', {'requestid': request.request_id})
+        except Exception as e:
+            logger.debug(f"DELETESTATUS failed for {request.request_id}: {e}")
+
+    def poll(self):
+        """Run one sweep over the requests that are due and return those that finished"""
+        now = time.monotonic()
+        finished = []
+
+        for request in list(self.outstanding):
+            if request.next_poll > now:
+                continue
+
+            try:
+                result = self._request_status(request)
+                state = result.get('status', {}).get('state')
+            except Exception as e:
+                logger.warning(f"Error checking request status for {request.request_id}: {e}")
+                result, state = None, None
+
+            if state == 'completed':
+                logger.info(f"Request {request.label} completed after {request.elapsed:.1f}s")
+                request._finish('completed', result)
+            elif state == 'failed':
+                logger.error(f"Request {request.label} failed: {result}")
+                request._finish('failed', result)
+            elif state == 'notfound':
+                # Unknown ID: never submitted, or its status was already deleted by an earlier invocation
+                logger.warning(f"Request {request.label} not found in Solr's task queues")
+                request._finish('notfound', result)
+            elif time.monotonic() - request.submitted_at > request.timeout:
+                logger.error(f"Request {request.label} timed out after {request.timeout}s")
+                request._finish('timeout', result)
+            else:
+                request.interval = min(request.interval * self.backoff, self.max_interval)
+                request.next_poll = time.monotonic() + request.interval
+                continue
+
+            self.outstanding.remove(request)
+            if self.delete_status:
+                self._delete_status(request)
+            finished.append(request)
+
+        return finished
+
+    def wait(self, requests=None, first_completed=False, timeout=None):
+        """Poll until the given requests (default: all outstanding) are done.
+
+        With first_completed=True, return as soon as at least one of them is done;
+        with ``timeout`` (seconds), once it has passed. Returns the requests that
+        are done. Raises ValueError for an unfinished request this tracker is not
+        polling, which would never finish.
+        """
+        requests = list(self.outstanding if requests is None else requests)
+        untracked = [r.label for r in requests if not r.done() and r not in self.outstanding]
+        if untracked:
+            raise ValueError(f"Requests not tracked by this tracker: {untracked}")
+        deadline = None if timeout is None else time.monotonic() + timeout
+
+        while True:
+            done = [r for r in requests if r.done()]
+            pending = [r for r in requests if not r.done()]
+            if not pending or (first_completed and done):
+                return done
+            if deadline is not None and time.monotonic() >= deadline:
+                return done
+
+            delay = min(r.next_poll for r in pending) - time.monotonic()
+            if deadline is not None:
+                delay = min(delay, deadline - time.monotonic())
+            if delay > 0:
+                time.sleep(delay)
+            self.poll()
@@ -0,0 +1,194 @@
+import logging
+import time
+from collections import namedtuple
+
+from core_status import collect_core_status
+from solr_client import SolrAdminClient
+
+logger = logging.getLogger()
+
+DEFAULT_TTL = 5  # seconds a CLUSTERSTATUS snapshot is reused before refetching
+
+
+def fetch_cluster_status(client, collection=None, shard=None, replica_filter=None):
+    """Fetch CLUSTERSTATUS, narrowed to a collection/shard and pruned to matching replicas.
+
+    ``replica_filter`` is called with each replica dict as its shard finishes
+    decoding; replicas it rejects are dropped before the rest of the body is
+    parsed, so a full-cluster view only holds on to the replicas of interest.
+    """
+    object_hook = None
+    if replica_filter is not None:
+        def object_hook(obj):
+            replicas = obj.get('replicas')
+            if isinstance(replicas, dict):
+                obj['replicas'] = {name: data for name, data in replicas.items()
+                                   if isinstance(data, dict) and replica_filter(data)}
+            return obj
+
+    return client.collections('CLUSTERSTATUS', {'collection': collection or None, 'shard': shard or None},
+                              object_hook=object_hook)
+
+
+class Replica(namedtuple('Replica', ['collection', 'shard', 'name', 'data'])):
+    """A CLUSTERSTATUS replica entry together with its collection/shard coordinates"""
+    __slots__ = ()
+
+    @property
+    def node_name(self):
+        return self.data.get('node_name')
+
+    @property
+    def state(self):
+        return self.data.get('state')
+
+    @property
+    def type(self):
+        return self.data.get('type', 'NRT')
+
+    @property
+    def core(self):
+        return self.data.get('core')
+
+    @property
+    def is_leader(self):
+        return self.data.get('leader') == 'true'
+
+    @property
+    def path(self):
+        return f"{self.collection}/{self.shard}/{self.name}"
+
+
+class ClusterState:
+    """Shared CLUSTERSTATUS snapshot with precomputed replica indexes.
+
+    A single instance is passed to every solr_operations routine of an invocation
+    so the cluster tree is fetched and walked once instead of once per routine.
+    Reads reuse the snapshot while it is younger than ``ttl`` seconds; routines
+    call ``invalidate()`` after every mutating admin call so the next read refetches.
+    A narrowed view (see ``view``) refetches with its own collection/shard/filter.
+    """
+
+    def __init__(self, http, solr_url, ttl=DEFAULT_TTL, client=None, collection=None, shard=None,
+                 replica_filter=None):
+        self.client = client or SolrAdminClient(solr_url, http)
+        self.http = self.client.http
+        self.solr_url = solr_url
+        self.ttl = ttl
+        self._fetch_args = {'collection': collection, 'shard': shard, 'replica_filter': replica_filter}
+        self._fetched_at = None
+        self._core_stats = None
+        self._core_stats_at = None
+        self._index({'cluster': {'collections': {}, 'live_nodes': []}})
+
+    def refresh(self):
+        """Fetch CLUSTERSTATUS now, regardless of snapshot age"""
+        self.load(fetch_cluster_status(self.client, **self._fetch_args))
+        return self
+
+    def view(self, collection=None, shard=None, replica_filter=None, refresh=False):
+        """Snapshot limited to one collection/shard and/or the replicas matching ``replica_filter``.
+
+        While the shared snapshot is fresh (and ``refresh`` is not set) it is
+        returned as is, since it already holds everything. Otherwise only the
+        narrow view is fetched, into a separate ClusterState that is not shared
+        and that repeats the same narrow fetch once its own TTL has passed.
+        """
+        if not refresh and self.is_fresh:
+            return self
+        return ClusterState(self.http, self.solr_url, ttl=self.ttl, client=self.client, collection=collection,
+                            shard=shard, replica_filter=replica_filter).refresh()
+
+    def load(self, cluster_status):
+        """Replace the snapshot with an already-decoded CLUSTERSTATUS response"""
+        self._index(cluster_status)
+        self._fetched_at = time.monotonic()
+        return self
+
+    def invalidate(self):
+        """Mark the snapshot stale so the next read refetches it"""
+        self._fetched_at = None
+        self._core_stats_at = None
+
+    def core_status(self, refresh=False):
+        """Per-core index stats of the live nodes (see core_status.collect_core_status), cached like the snapshot"""
+        if refresh or self._core_stats_at is None or time.monotonic() - self._core_stats_at >= self.ttl:
+            self._core_stats = collect_core_status(self)
+            self._core_stats_at = time.monotonic()
+        return self._core_stats
+
+    @property
+    def is_fresh(self):
+        return self._fetched_at is not None and time.monotonic() - self._fetched_at < self.ttl
+
+    def ensure_fresh(self):
+        """Refetch only if the snapshot is missing, invalidated or older than the TTL"""
+        if not self.is_fresh:
+            self.refresh()
+        return self
+
+    def _index(self, cluster_status):
+        cluster = cluster_status['cluster']
+        self._cluster_status = cluster_status
+        self._collections = cluster.get('collections', {})
+        self._live_nodes = frozenset(cluster.get('live_nodes', []))
+        self._replicas = []
+        self._by_node = {}
+        self._by_state = {}
+        self._by_type = {}
+        self._by_shard = {}
+        self._leaders = {}
+
+        for collection_name, collection_data in self._collections.items():
+            for shard_name, shard_data in collection_data.get('shards', {}).items():
+                shard_replicas = []
+                for replica_name, replica_data in shard_data.get('replicas', {}).items():
+                    replica = Replica(collection_name, shard_name, replica_name, replica_data)
+                    self._replicas.append(replica)
+                    shard_replicas.append(replica)
+                    self._by_node.setdefault(replica.node_name, []).append(replica)
+                    self._by_state.setdefault(replica.state, []).append(replica)
+                    self._by_type.setdefault(replica.type, []).append(replica)
+                    if replica.is_leader:
+                        self._leaders[(collection_name, shard_name)] = replica
+                self._by_shard[(collection_name, shard_name)] = shard_replicas
+
+    @property
+    def cluster_status(self):
+        """Raw decoded CLUSTERSTATUS response"""
+        return self.ensure_fresh()._cluster_status
+
+    @property
+    def collections(self):
+        return self.ensure_fresh()._collections
+
+    @property
+    def live_nodes(self):
+        return self.ensure_fresh()._live_nodes
+
+    @property
+    def replicas(self):
+        return list(self.ensure_fresh()._replicas)
+
+    def replicas_on_node(self, node_name):
+        return list(self.ensure_fresh()._by_node.get(node_name, []))
+
+    def replicas_in_state(self, state):
+        return list(self.ensure_fresh()._by_state.get(state, []))
+
+    def replicas_of_type(self, replica_type):
+        return list(self.ensure_fresh()._by_type.get(replica_type, []))
+
+    def shard_replicas(self, collection_name, shard_name):
+        return list(self.ensure_fresh()._by_shard.get((collection_name, shard_name), []))
+
+    def leader(self, collection_name, shard_name):
+        return self.ensure_fresh()._leaders.get((collection_name, shard_name))
+
+    def collection_health(self, collection_name):
+        return self.collections.get(collection_name, {}).get('health', 'UNKNOWN')
+
+    def down_nodes_with_replicas(self):
+        """Nodes that still have replicas assigned but are not in live_nodes"""
+        self.ensure_fresh()
+        return [node for node in self._by_node if node not in self._live_nodes]
@@ -1,58 +1,317 @@
-import boto3
+import hashlib
+import json
+import os
+import threading
 import time
 import logging
+import uuid
+
+from clients import lazy_client
+from instrumentation import instrument_client
 
 logger = logging.getLogger()
-ssm = boto3.client('ssm')
+ssm = lazy_client('ssm', wrap=instrument_client)  # created on first use, reused while warm
 
 LOCK_PARAMETER = '/dspace/solr-rollover/lock'
-LOCK_TIMEOUT = 1800  # 30 minutes (increased from 15)
+CLAIM_PREFIX = '/dspace/solr-rollover/lock-claims'  # one create-only parameter per replaced lock record
+LOCK_TIMEOUT = 1800  # age after which a legacy (bare timestamp) lock is considered stale
+LEASE_TTL = int(os.environ.get('SOLR_ROLLOVER_LEASE_TTL', '90'))  # seconds a lease lasts without renewal
+HOLDER_LABEL = 'lease-holder'
 
-def acquire_lock(force_recovery=False):
-    """Attempt to acquire execution lock with improved recovery"""
-    try:
-        # Try to create parameter (fails if exists)
-        ssm.put_parameter(
-            Name=LOCK_PARAMETER,
-            Value=str(int(time.time())),
-            Type='String',
-            Overwrite=False
-        )
-        logger.info("Lock acquired")
+_lease = None
+
+
+class Lease:
+    """Lease on LOCK_PARAMETER: an owner ID plus an expiry, renewed by heartbeats.
+
+    Every lock record carries a random token. Replacing or deleting a record
+    is compare-and-set on that token: the writer first creates the parameter
+    CLAIM_PREFIX/<token> with PutParameter without Overwrite, which only one
+    writer can do, then checks the lock still holds that token and writes.
+    The claim is deleted once the record is replaced. A claim records its
+    claimant and claim time; one older than LEASE_TTL was left by a writer
+    that crashed before writing, and is superseded by creating the next
+    generation of the claim (CLAIM_PREFIX/<token>.<n>), which again only one
+    writer can do. The winner deletes the generations before its own. The
+    written version carries the ``lease-holder`` label.
+    """
+
+    def __init__(self, owner=None, ttl=LEASE_TTL):
+        self.owner = owner or f"{os.environ.get('AWS_LAMBDA_FUNCTION_NAME', 'local')}/{uuid.uuid4().hex[:12]}"
+        self.ttl = ttl
+        self.version = None
+        self.expires = None
+        self.lost = False
+        self._stop = threading.Event()
+        self._thread = None
+
+    @property
+    def held(self):
+        return self.version is not None and not self.lost and time.time() < self.expires
+
+    def _record(self):
+        self.expires = time.time() + self.ttl
+        return json.dumps({'owner': self.owner, 'expires': self.expires, 'ttl': self.ttl,
+                           'token': uuid.uuid4().hex})
+
+    def _read(self):
+        """Return (record, version) of the current lock, or (None, None) if there is none"""
+        try:
+            parameter = ssm.get_parameter(Name=LOCK_PARAMETER)['Parameter']
+        except ssm.exceptions.ParameterNotFound:
+            return None, None
+        return _parse_record(parameter['Value']), parameter['Version']
+
+    def _claim(self, record):
+        """Win the right to replace ``record``; returns the claim name, or None if another writer has it"""
+        base = f"{CLAIM_PREFIX}/{record['token']}"
+        generation = 0
+        while True:
+            claim = f"{base}.{generation}" if generation else base
+            try:
+                ssm.put_parameter(Name=claim, Value=json.dumps({'owner': self.owner, 'claimed_at': time.time()}),
+                                  Type='String', Overwrite=False)
+                break
+            except ssm.exceptions.ParameterAlreadyExists:
+                pass
+            holder = _read_claim(claim)
+            if holder is None:
+                # Deleted by a writer that just finished; the record check below tells whether it changed
+                continue
+            age = time.time() - holder['claimed_at']
+            if age < LEASE_TTL:
+                logger.warning(f"Lost lock race: lock record {record['token']} is already being replaced "
+                               f"by {holder['owner']}")
+                return None
+            logger.warning(f"Lock claim {claim} of {holder['owner']} is {age:.0f}s old, superseding it")
+            generation += 1
+        # A claim deleted after its record was replaced can be created again; the record tells
+        current, _ = self._read()
+        if current is None or current['token'] != record['token']:
+            logger.warning("Lost lock race: the lock changed before it could be replaced")
+            self._unclaim(claim)
+            return None
+        return claim
+
+    def _unclaim(self, claim):
+        """Delete ``claim`` and the stale generations it superseded"""
+        base, _, generation = claim.partition('.')  # tokens never contain a dot
+        for name in [base] + [f"{base}.{n}" for n in range(1, int(generation or 0) + 1)]:
+            try:
+                ssm.delete_parameter(Name=name)
+            except ssm.exceptions.ParameterNotFound:
+                pass
+            except Exception as e:
+                logger.warning(f"Could not delete lock claim {name}: {e}")
+
+    def _replace(self, record):
+        """Replace ``record`` with a new record of this owner; returns True if this write won"""
+        claim = self._claim(record)
+        if claim is None:
+            return False
+        try:
+            self.version = ssm.put_parameter(Name=LOCK_PARAMETER, Value=self._record(), Type='String',
+                                             Overwrite=True)['Version']
+        finally:
+            self._unclaim(claim)
+        self._label()
         return True
-    except ssm.exceptions.ParameterAlreadyExists:
-        # Check if lock is stale or force recovery requested
+
+    def _label(self):
         try:
-            response = ssm.get_parameter(Name=LOCK_PARAMETER)
-            lock_time = int(response['Parameter']['Value'])
-            current_time = time.time()
-            lock_age = current_time - lock_time
-            
-            if force_recovery:
-                logger.warning(f"Force recovery requested, breaking lock (age: {lock_age:.0f}s)")
-                release_lock()
-                return acquire_lock()
-            elif lock_age > LOCK_TIMEOUT:
-                logger.warning(f"Stale lock detected (age: {lock_age:.0f}s > {LOCK_TIMEOUT}s), breaking it")
-                release_lock()
-                return acquire_lock()
-            else:
-                remaining = LOCK_TIMEOUT - lock_age
-                logger.error(f"Another rollover is in progress (remaining: {remaining:.0f}s)")
+            ssm.label_parameter_version(Name=LOCK_PARAMETER, ParameterVersion=self.version, Labels=[HOLDER_LABEL])
+        except Exception as e:
+            logger.debug(f"Could not label lock version {self.version}: {e}")
+
+    def acquire(self, force_recovery=False):
+        """Take the lease if it is free, expired, already ours, or force_recovery is set"""
+        try:
+            # Fast path: create the parameter (fails if it exists)
+            self.version = ssm.put_parameter(Name=LOCK_PARAMETER, Value=self._record(), Type='String',
+                                             Overwrite=False)['Version']
+            self._label()
+            self.lost = False
+            logger.info(f"Lock acquired by {self.owner}")
+            return True
+        except ssm.exceptions.ParameterAlreadyExists:
+            pass
+
+        record, version = self._read()
+        if version is None:
+            return self.acquire(force_recovery)
+
+        remaining = record['expires'] - time.time()
+        if record['owner'] == self.owner:
+            logger.info(f"Lock already held by {self.owner}, renewing")
+        elif force_recovery:
+            logger.warning(f"Force recovery requested, taking lock from {record['owner']} (expires in {remaining:.0f}s)")
+        elif remaining <= 0:
+            logger.warning(f"Lease of {record['owner']} expired {-remaining:.0f}s ago, taking over")
+        else:
+            logger.error(f"Another rollover is in progress (owner: {record['owner']}, lease expires in {remaining:.0f}s)")
+            return False
+
+        if self._replace(record):
+            self.lost = False
+            logger.info(f"Lock acquired by {self.owner}")
+            return True
+        return False
+
+    def renew(self):
+        """Extend the lease; marks it lost if it has expired or another owner took it over"""
+        if self.version is None or self.lost:
+            return False
+        if time.time() >= self.expires:
+            # Another rollover may already have taken over; only acquire() may take the lease back
+            logger.error(f"Lease of {self.owner} expired {time.time() - self.expires:.0f}s ago, not renewing")
+            self.lost = True
+            return False
+        try:
+            record, version = self._read()
+            if record is None or record['owner'] != self.owner:
+                logger.error(f"Lock lost to {record and record['owner']}")
+                self.lost = True
                 return False
+            if not self._replace(record):
+                self.lost = True
+                return False
+            return True
         except Exception as e:
-            logger.error(f"Error checking lock: {e}")
+            # A failed heartbeat is retried on the next interval while the lease is still valid
+            logger.warning(f"Lock heartbeat failed: {e}")
+            return self.held
+
+    def release(self):
+        """Stop heartbeats and delete the lock if this owner still holds it"""
+        self.stop_heartbeat()
+        try:
+            record, _ = self._read()
+            if record is not None and record['owner'] == self.owner:
+                claim = self._claim(record)
+                if claim is not None:
+                    try:
+                        ssm.delete_parameter(Name=LOCK_PARAMETER)
+                        logger.info("Lock released")
+                    finally:
+                        self._unclaim(claim)
+            elif record is not None:
+                logger.warning(f"Not releasing lock held by {record['owner']}")
+        except ssm.exceptions.ParameterNotFound:
+            pass
+        except Exception as e:
+            logger.error(f"Error releasing lock: {e}")
+        self.version = None
+
+    def start_heartbeat(self, interval=None):
+        """Renew the lease from a daemon thread every interval seconds (default: a third of the TTL).
+
+        The thread stops once the lease is lost or has expired without being renewed.
+        """
+        if self._thread is not None and self._thread.is_alive():
+            return
+        interval = interval or self.ttl / 3
+        self._stop.clear()
+
+        def beat():
+            while not self._stop.wait(interval):
+                if not self.renew():
+                    if self.lost:
+                        return
+
+        self._thread = threading.Thread(target=beat, name='lock-heartbeat', daemon=True)
+        self._thread.start()
+
+    def stop_heartbeat(self):
+        self._stop.set()
+        if self._thread is not None and self._thread is not threading.current_thread():
+            self._thread.join(timeout=5)
+        self._thread = None
+
+
+def _parse_record(value):
+    """Decode a lease record; bare timestamps written by older layers become leases of LOCK_TIMEOUT.
+
+    Records without a token (older layers) get one derived from their value.
+    """
+    try:
+        record = json.loads(value)
+    except ValueError:
+        record = None
+    if not isinstance(record, dict):
+        record = {'owner': 'legacy', 'expires': float(value) + LOCK_TIMEOUT}
+    record.setdefault('token', f"legacy-{hashlib.sha1(value.encode()).hexdigest()[:16]}")
+    return record
+
+
+def _read_claim(claim):
+    """Return the claimant and claim time of ``claim``, or None if it no longer exists.
+
+    Claims written by older layers hold just the owner and count as stale.
+    """
+    try:
+        value = ssm.get_parameter(Name=claim)['Parameter']['Value']
+    except ssm.exceptions.ParameterNotFound:
+        return None
+    try:
+        holder = json.loads(value)
+    except ValueError:
+        holder = None
+    if not isinstance(holder, dict):
+        holder = {'owner': value, 'claimed_at': 0}
+    return holder
+
+
+def acquire_lock(force_recovery=False, owner=None, heartbeat=True):
+    """Acquire the rollover lease and keep it renewed until release_lock().
+
+    Pass the ``owner`` of an earlier invocation (see lock_owner()) to resume
+    holding its lease.
+    """
+    global _lease
+    if _lease is not None:
+        # A lease left over from an earlier invocation in this container
+        _lease.stop_heartbeat()
+    try:
+        lease = Lease(owner=owner)
+        if not lease.acquire(force_recovery=force_recovery):
             return False
+        _lease = lease
+        if heartbeat:
+            lease.start_heartbeat()
+        return True
     except Exception as e:
         logger.error(f"Error acquiring lock: {e}")
         return False
 
+def renew_lock():
+    """Renew the lease now (heartbeats do this in the background); returns whether it is still held"""
+    return _lease is not None and _lease.renew()
+
+def suspend_lock():
+    """Stop renewing without releasing: the lease lapses after its TTL unless resumed with lock_owner()"""
+    if _lease is not None:
+        _lease.stop_heartbeat()
+
+def lock_held():
+    """Whether this invocation still holds an unexpired lease"""
+    return _lease is not None and _lease.held
+
+def lock_owner():
+    """Owner ID of the lease held by this invocation, or None"""
+    return _lease.owner if _lease is not None else None
+
 def release_lock():
     """Release execution lock"""
-    try:
-        ssm.delete_parameter(Name=LOCK_PARAMETER)
-        logger.info("Lock released")
-    except ssm.exceptions.ParameterNotFound:
-        pass
-    except Exception as e:
-        logger.error(f"Error releasing lock: {e}")
+    global _lease
+    if _lease is None:
+        # Nothing acquired in this invocation: keep the old behaviour of clearing the lock
+        try:
+            ssm.delete_parameter(Name=LOCK_PARAMETER)
+            logger.info("Lock released")
+        except ssm.exceptions.ParameterNotFound:
+            pass
+        except Exception as e:
+            logger.error(f"Error releasing lock: {e}")
+        return
+    _lease.release()
+    _lease = None
@@ -0,0 +1,63 @@
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+logger = logging.getLogger()
+
+STATUS_WORKERS = int(os.environ.get('SOLR_CORE_STATUS_WORKERS', '8'))  # nodes asked in parallel
+STATUS_TIMEOUT = 10
+
+
+def node_base_url(node_name):
+    """Base URL of a Solr node from its live_nodes name (10.0.0.1:8983_solr -> http://10.0.0.1:8983/solr)"""
+    host, _, context = node_name.partition('_')
+    return f"http://{host}/{context or 'solr'}"
+
+
+def _node_status(client, node_name, base_url, timeout):
+    try:
+        return node_name, client.cores('STATUS', base_url=base_url, timeout=timeout)
+    except Exception as e:
+        logger.warning(f"Cores STATUS failed on {node_name}: {e}")
+        return node_name, {}
+
+
+def collect_core_status(cluster_state, client=None, max_workers=STATUS_WORKERS, timeout=STATUS_TIMEOUT):
+    """Index stats of every core on the live nodes, with one Cores STATUS call per node.
+
+    Each node is asked directly (the Cores API only knows its own cores) and
+    the nodes are asked in parallel. Returns
+    {core: {'node', 'numDocs', 'sizeInBytes', 'lastModified', 'version'}}.
+    Nodes that cannot be reached are logged and left out.
+    """
+    state = cluster_state.ensure_fresh()
+    client = client or state.client
+    live_nodes = set(state.live_nodes)
+
+    base_urls = {}
+    for replica in state.replicas:
+        if replica.node_name in live_nodes:
+            base_urls.setdefault(replica.node_name, replica.data.get('base_url') or node_base_url(replica.node_name))
+
+    stats = {}
+    if not base_urls:
+        return stats
+    with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(base_urls)))) as pool:
+        results = list(pool.map(lambda item: _node_status(client, item[0], item[1], timeout), base_urls.items()))
+
+    for node_name, result in results:
+        for core, status in result.get('status', {}).items():
+            index = status.get('index', {})
+            stats[core] = {
+                'node': node_name,
+                'numDocs': index.get('numDocs', 0),
+                'sizeInBytes': index.get('sizeInBytes', 0),
+                'lastModified': index.get('lastModified'),
+                'version': index.get('version')
+            }
+    return stats
+
+
+def index_sizes(core_stats):
+    """{core: sizeInBytes} from collect_core_status()"""
+    return {core: stats['sizeInBytes'] for core, stats in core_stats.items()}
@@ -1,63 +1,90 @@
 import logging
-import time
+
+from instrumentation import instrument_client
+from waiters import describe_tasks_batched, wait_until
 
 logger = logging.getLogger()
 
-def wait_for_new_task(ecs, cluster_name, service_name, exclude_task_id):
+def wait_for_new_task(ecs, cluster_name, service_name, exclude_task_id, timeout=300, context=None):
     """Wait for new task to be running and healthy"""
-    for i in range(30):
+    ecs = instrument_client(ecs)
+    def check():
         response = ecs.list_tasks(cluster=cluster_name, serviceName=service_name, desiredStatus='RUNNING')
-        for task_arn in response['taskArns']:
-            task_id = task_arn.split('/')[-1]
-            if task_id != exclude_task_id:
-                task_response = ecs.describe_tasks(cluster=cluster_name, tasks=[task_id])
-                task = task_response['tasks'][0]
-                
-                if (task['lastStatus'] == 'RUNNING' and 
-                    task.get('healthStatus') in ['HEALTHY', 'UNKNOWN'] and
-                    task.get('connectivity') == 'CONNECTED'):
-                    logger.info(f"New task {task_id} is running and healthy")
-                    return task_id
-                    
-        logger.info(f"Waiting for new task... attempt {i+1}/30")
-        time.sleep(10)
-    return None
+        candidates = [arn for arn in response['taskArns'] if arn.split('/')[-1] != exclude_task_id]
+        if not candidates:
+            return None
+        
+        for task in describe_tasks_batched(ecs, cluster_name, candidates).values():
+            task_id = task['taskArn'].split('/')[-1]
+            if (task['lastStatus'] == 'RUNNING' and 
+                task.get('healthStatus') in ['HEALTHY', 'UNKNOWN'] and
+                task.get('connectivity') == 'CONNECTED'):
+                logger.info(f"New task {task_id} is running and healthy")
+                return task_id
+        return None
+    
+    return wait_until(check, timeout=timeout, context=context, description='new task')
 
-def wait_for_scale_down(ecs, cluster_name, service_name, target_count):
+def wait_for_scale_down(ecs, cluster_name, service_name, target_count, timeout=100, context=None):
     """Wait for service to scale down to target count"""
-    for i in range(20):
-        try:
-            response = ecs.describe_services(cluster=cluster_name, services=[service_name])
-            service = response['services'][0]
-            running_count = service['runningCount']
-            
-            if running_count == target_count:
-                logger.info(f"Service scaled down to {target_count} tasks")
-                return True
-                
-            logger.info(f"Waiting for scale down... current: {running_count}, target: {target_count}")
-            time.sleep(5)
-        except Exception as e:
-            logger.warning(f"Error checking scale down status: {e}")
-            
+    ecs = instrument_client(ecs)
+    def check():
+        response = ecs.describe_services(cluster=cluster_name, services=[service_name])
+        running_count = response['services'][0]['runningCount']
+        
+        if running_count == target_count:
+            logger.info(f"Service scaled down to {target_count} tasks")
+            return True
+        logger.info(f"Waiting for scale down... current: {running_count}, target: {target_count}")
+        return False
+    
+    if wait_until(check, timeout=timeout, context=context, description='scale down'):
+        return True
+    
     logger.warning("Scale down did not complete within timeout")
     return False
 
 def get_node_from_task(ecs, cluster_name, task_id):
     """Get Solr node name from ECS task ID"""
+    ecs = instrument_client(ecs)
     try:
         response = ecs.describe_tasks(cluster=cluster_name, tasks=[task_id])
         if not response['tasks']:
             return None
-            
-        task = response['tasks'][0]
-        
-        for attachment in task.get('attachments', []):
-            for detail in attachment.get('details', []):
-                if detail['name'] == 'privateIPv4Address':
-                    ip = detail['value']
-                    return f"{ip}:8983_solr"
-        
-        return None
+        return _task_node(response['tasks'][0])
     except Exception:
         return None
+
+def get_node_zones(ecs, cluster_name):
+    """Map the Solr node name of every running task in the cluster to its availability zone.
+
+    Returns {} if the tasks cannot be listed, which leaves placement AZ-blind.
+    """
+    ecs = instrument_client(ecs)
+    try:
+        task_arns = []
+        kwargs = {}
+        while True:
+            response = ecs.list_tasks(cluster=cluster_name, desiredStatus='RUNNING', **kwargs)
+            task_arns.extend(response['taskArns'])
+            if not response.get('nextToken'):
+                break
+            kwargs['nextToken'] = response['nextToken']
+        zones = {}
+        for task in describe_tasks_batched(ecs, cluster_name, task_arns).values():
+            node = _task_node(task)
+            if node and task.get('availabilityZone'):
+                zones[node] = task['availabilityZone']
+        return zones
+    except Exception as e:
+        logger.warning(f"Could not map Solr nodes to availability zones: {e}")
+        return {}
+
+def _task_node(task):
+    """Solr node name of a described task, from its ENI's private IP"""
+    for attachment in task.get('attachments', []):
+        for detail in attachment.get('details', []):
+            if detail['name'] == 'privateIPv4Address':
+                ip = detail['value']
+                return f"{ip}:8983_solr"
+    return None
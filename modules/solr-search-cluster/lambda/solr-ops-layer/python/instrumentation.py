@@ -0,0 +1,254 @@
+import functools
+import json
+import logging
+import os
+import sys
+import threading
+import time
+from urllib.parse import parse_qsl, urlparse
+
+logger = logging.getLogger()
+
+METRICS_NAMESPACE = os.environ.get('SOLR_OPS_METRICS_NAMESPACE', 'DSpace/Solr')
+MAX_EMF_VALUES = 100  # CloudWatch EMF limit on values per metric per line
+
+
+class RawStdoutHandler(logging.Handler):
+    """Writes each record's message alone on a line of the current sys.stdout"""
+
+    def emit(self, record):
+        try:
+            sys.stdout.write(f"{self.format(record)}\n")
+            sys.stdout.flush()
+        except Exception:
+            self.handleError(record)
+
+
+# CloudWatch Logs only extracts EMF from a log event that is a bare JSON object,
+# so EMF lines skip the Lambda root handler, which prefixes level and request ID
+emf_logger = logging.getLogger('solr_ops.emf')
+emf_logger.propagate = False
+emf_logger.setLevel(logging.INFO)
+if not emf_logger.handlers:
+    emf_logger.addHandler(RawStdoutHandler())
+
+
+def emit_emf(lines):
+    """Write EMF JSON lines as their own log events; every EMF line of the layer goes through here"""
+    for line in lines:
+        emf_logger.info(line)
+
+
+class CallStats:
+    """Latency samples, status codes, response sizes and retries for one operation"""
+
+    def __init__(self):
+        self.latencies = []
+        self.statuses = {}
+        self.errors = 0
+        self.retries = 0
+        self.response_bytes = 0
+
+    def add(self, latency_ms, status, response_bytes=0, retries=0, error=False):
+        self.latencies.append(latency_ms)
+        self.statuses[str(status)] = self.statuses.get(str(status), 0) + 1
+        self.response_bytes += response_bytes
+        self.retries += retries
+        if error:
+            self.errors += 1
+
+    def percentile(self, p):
+        ordered = sorted(self.latencies)
+        if not ordered:
+            return 0.0
+        return ordered[min(len(ordered) - 1, int(round(p / 100.0 * (len(ordered) - 1))))]
+
+    def latency_values(self):
+        """At most MAX_EMF_VALUES latencies, evenly sampled across the sorted distribution"""
+        ordered = sorted(self.latencies)
+        if len(ordered) <= MAX_EMF_VALUES:
+            return ordered
+        step = (len(ordered) - 1) / (MAX_EMF_VALUES - 1)
+        return [ordered[int(round(i * step))] for i in range(MAX_EMF_VALUES)]
+
+
+class MetricsRecorder:
+    """Per-invocation call statistics keyed by (service, operation)"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.stats = {}
+
+    def record(self, service, operation, latency_ms, status, response_bytes=0, retries=0, error=False):
+        with self._lock:
+            stats = self.stats.setdefault((service, operation), CallStats())
+            stats.add(latency_ms, status, response_bytes, retries, error)
+
+    def reset(self):
+        with self._lock:
+            self.stats = {}
+
+    def summary(self):
+        """Plain dict of the recorded statistics, for logging or return values"""
+        with self._lock:
+            return {
+                f"{service}:{operation}": {
+                    'calls': len(s.latencies),
+                    'errors': s.errors,
+                    'retries': s.retries,
+                    'total_ms': round(sum(s.latencies), 1),
+                    'p50_ms': round(s.percentile(50), 1),
+                    'p99_ms': round(s.percentile(99), 1),
+                    'response_bytes': s.response_bytes,
+                    'statuses': dict(s.statuses)
+                }
+                for (service, operation), s in sorted(self.stats.items())
+            }
+
+    def emf_lines(self, namespace=METRICS_NAMESPACE):
+        """Render one CloudWatch Embedded Metric Format JSON line per operation"""
+        timestamp = int(time.time() * 1000)
+        lines = []
+        with self._lock:
+            for (service, operation), s in sorted(self.stats.items()):
+                lines.append(json.dumps({
+                    '_aws': {
+                        'Timestamp': timestamp,
+                        'CloudWatchMetrics': [{
+                            'Namespace': namespace,
+                            'Dimensions': [['Service', 'Operation']],
+                            'Metrics': [
+                                {'Name': 'Latency', 'Unit': 'Milliseconds'},
+                                {'Name': 'Calls', 'Unit': 'Count'},
+                                {'Name': 'Errors', 'Unit': 'Count'},
+                                {'Name': 'Retries', 'Unit': 'Count'},
+                                {'Name': 'ResponseBytes', 'Unit': 'Bytes'}
+                            ]
+                        }]
+                    },
+                    'Service': service,
+                    'Operation': operation,
+                    'Latency': [round(v, 2) for v in s.latency_values()],
+                    'Calls': len(s.latencies),
+                    'Errors': s.errors,
+                    'Retries': s.retries,
+                    'ResponseBytes': s.response_bytes,
+                    'LatencyP50': round(s.percentile(50), 2),
+                    'LatencyP99': round(s.percentile(99), 2),
+                    'StatusCodes': dict(s.statuses)
+                }))
+        return lines
+
+    def flush(self, namespace=METRICS_NAMESPACE):
+        """Emit the EMF lines (see emit_emf) and reset"""
+        emit_emf(self.emf_lines(namespace))
+        self.reset()
+
+
+metrics = MetricsRecorder()
+
+
+def _solr_operation(url, fields, body=None):
+    parsed = urlparse(url)
+    params = dict(parse_qsl(parsed.query))
+    if fields:
+        params.update(fields)
+    if body:
+        # Form-encoded POST bodies sent by SolrAdminClient
+        params.update(parse_qsl(body.decode('utf-8') if isinstance(body, bytes) else body))
+    path = parsed.path.rstrip('/')
+    action = params.get('action', '').upper()
+    if path.endswith('/admin/collections'):
+        return action or 'collections'
+    if path.endswith('/admin/cores'):
+        return f"cores:{action or 'STATUS'}"
+    return path.rsplit('/', 1)[-1] or 'root'
+
+
+class InstrumentedHttp:
+    """Wraps a urllib3 PoolManager and records every request per Solr action"""
+
+    def __init__(self, http, recorder=None):
+        self._http = http
+        self._recorder = recorder or metrics
+
+    def request(self, method, url, fields=None, **kwargs):
+        operation = _solr_operation(url, fields, kwargs.get('body'))
+        start = time.monotonic()
+        try:
+            if fields is not None:
+                response = self._http.request(method, url, fields=fields, **kwargs)
+            else:
+                response = self._http.request(method, url, **kwargs)
+        except Exception:
+            self._recorder.record('solr', operation, (time.monotonic() - start) * 1000, 'error', error=True)
+            raise
+        retries = getattr(response, 'retries', None)
+        retry_count = len(retries.history) if retries is not None and getattr(retries, 'history', None) else 0
+        status = getattr(response, 'status', 0)
+        self._recorder.record('solr', operation, (time.monotonic() - start) * 1000, status,
+                              len(response.data or b''), retry_count, error=status >= 400)
+        return response
+
+    def __getattr__(self, name):
+        return getattr(self._http, name)
+
+
+class InstrumentedClient:
+    """Wraps a boto3 client and records every API call per operation"""
+
+    def __init__(self, client, recorder=None):
+        self._client = client
+        self._recorder = recorder or metrics
+        meta = getattr(client, 'meta', None)
+        self._service = getattr(meta, 'service_model', None) and meta.service_model.service_name \
+            or getattr(client, 'service_name', 'aws')
+
+    def __getattr__(self, name):
+        attr = getattr(self._client, name)
+        if not callable(attr) or name.startswith('_') or name in ('exceptions', 'meta', 'get_paginator', 'get_waiter'):
+            return attr
+
+        @functools.wraps(attr)
+        def call(*args, **kwargs):
+            start = time.monotonic()
+            try:
+                result = attr(*args, **kwargs)
+            except Exception as e:
+                code = getattr(e, 'response', {}).get('Error', {}).get('Code', 'error')
+                self._recorder.record(self._service, name, (time.monotonic() - start) * 1000, code, error=True)
+                raise
+            metadata = result.get('ResponseMetadata', {}) if isinstance(result, dict) else {}
+            self._recorder.record(self._service, name, (time.monotonic() - start) * 1000,
+                                  metadata.get('HTTPStatusCode', 200), retries=metadata.get('RetryAttempts', 0))
+            return result
+        return call
+
+
+def instrument_http(http):
+    """Return http wrapped for metrics; already-wrapped pools are returned unchanged"""
+    if http is None or isinstance(http, InstrumentedHttp):
+        return http
+    return InstrumentedHttp(http)
+
+
+def instrument_client(client):
+    """Return a boto3 client wrapped for metrics; already-wrapped clients are returned unchanged"""
+    if client is None or isinstance(client, InstrumentedClient):
+        return client
+    return InstrumentedClient(client)
+
+
+def instrumented_handler(handler):
+    """Decorate a Lambda handler so call metrics are emitted as EMF when it returns or raises"""
+    @functools.wraps(handler)
+    def wrapper(event, context):
+        metrics.reset()
+        try:
+            return handler(event, context)
+        finally:
+            try:
+                metrics.flush()
+            except Exception as e:
+                logger.warning(f"Failed to emit call metrics: {e}")
+    return wrapper
@@ -0,0 +1,233 @@
+import json
+import logging
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlencode
+
+from core_status import node_base_url
+from waiters import wait_until
+
+logger = logging.getLogger()
+
+# Representative DSpace discovery and OAI requests; SOLR_PROBE_QUERIES replaces them with a JSON list
+DEFAULT_QUERIES = [
+    {'collection': 'search', 'params': {'q': '*:*', 'rows': 10}},
+    {'collection': 'search', 'params': {'q': '*:*', 'rows': 0, 'facet': 'true', 'facet.field': 'search.resourcetype'}},
+    {'collection': 'oai', 'params': {'q': '*:*', 'rows': 10, 'sort': 'item.lastmodified desc'}}
+]
+PROBE_QUERIES = json.loads(os.environ['SOLR_PROBE_QUERIES']) if os.environ.get('SOLR_PROBE_QUERIES') else DEFAULT_QUERIES
+PROBE_SAMPLES = int(os.environ.get('SOLR_PROBE_SAMPLES', '3'))  # times each query is sent to each core per probe
+PROBE_MAX_CORES = int(os.environ.get('SOLR_PROBE_MAX_CORES', '16'))  # cores probed per round, rotated between rounds
+PROBE_WORKERS = 4
+PROBE_TIMEOUT = 5
+LATENCY_GATE = os.environ.get('SOLR_LATENCY_GATE', 'false').lower() == 'true'  # opt in: probing adds queries
+LATENCY_BUDGET_MS = float(os.environ.get('SOLR_LATENCY_BUDGET_MS', '500'))  # p95 always allowed
+LATENCY_BUDGET_RATIO = float(os.environ.get('SOLR_LATENCY_BUDGET_RATIO', '2.0'))  # p95 allowed, times the baseline p95
+PROBE_INTERVAL = float(os.environ.get('SOLR_PROBE_INTERVAL', '15'))  # seconds a probe result is reused
+MAX_PAUSE = float(os.environ.get('SOLR_LATENCY_MAX_PAUSE', '300'))  # seconds moves wait for latency before going on one at a time
+
+# Gate states
+OK = 'ok'
+SLOW = 'slow'
+PAUSE = 'pause'
+
+
+def percentile(values, pct):
+    """Nearest-rank percentile of ``values`` (None if empty)"""
+    if not values:
+        return None
+    ordered = sorted(values)
+    rank = max(1, -(-len(ordered) * pct // 100))
+    return ordered[int(rank) - 1]
+
+
+def query_core(http, replica, query, timeout=PROBE_TIMEOUT):
+    """Send one query straight to a replica's core (distrib=false); milliseconds taken, or None if it failed"""
+    params = dict(query.get('params', {}), distrib='false', wt='json')
+    base_url = replica.data.get('base_url') or node_base_url(replica.node_name)
+    url = f"{base_url}/{replica.core}/select?{urlencode(params, doseq=True)}"
+    started = time.monotonic()
+    try:
+        response = http.request('GET', url, timeout=timeout)
+    except Exception as e:
+        logger.debug(f"Query to {replica.core} failed: {e}")
+        return None
+    if response.status != 200:
+        logger.debug(f"Query to {replica.core} returned HTTP {response.status}")
+        return None
+    return (time.monotonic() - started) * 1000
+
+
+class LatencyProbe:
+    """Times representative queries against individual replicas with distrib=false.
+
+    Each round sends every query ``samples`` times to up to ``max_cores`` active
+    cores of the queried collections, on the given nodes or on all live nodes.
+    Rounds rotate through the cores, so a large node is covered over a few
+    rounds. Returns percentile latencies in milliseconds.
+    """
+
+    def __init__(self, cluster_state, queries=None, samples=PROBE_SAMPLES, max_cores=PROBE_MAX_CORES,
+                 max_workers=PROBE_WORKERS, timeout=PROBE_TIMEOUT):
+        self.state = cluster_state
+        self.queries = queries if queries is not None else PROBE_QUERIES
+        self.samples = max(1, samples)
+        self.max_cores = max(1, max_cores)
+        self.max_workers = max(1, max_workers)
+        self.timeout = timeout
+        self._offset = 0
+
+    def targets(self, nodes=None):
+        """(replica, query) pairs to probe this round"""
+        state = self.state.ensure_fresh()
+        nodes = set(nodes) if nodes else set(state.live_nodes)
+        collections = {query['collection'] for query in self.queries}
+        replicas = sorted((r for r in state.replicas
+                           if r.collection in collections and r.state == 'active'
+                           and r.node_name in nodes and r.node_name in state.live_nodes),
+                          key=lambda r: (r.node_name, r.core))
+        if len(replicas) > self.max_cores:
+            start = self._offset % len(replicas)
+            self._offset += self.max_cores
+            replicas = (replicas[start:] + replicas[:start])[:self.max_cores]
+        return [(replica, query) for replica in replicas for query in self.queries
+                if query['collection'] == replica.collection]
+
+    def measure(self, nodes=None):
+        """Probe one round; returns {'p50', 'p95', 'p99', 'max', 'count', 'errors', 'slowest'} (ms)"""
+        targets = self.targets(nodes)
+        jobs = [target for target in targets for _ in range(self.samples)]
+        if not jobs:
+            return {'p50': None, 'p95': None, 'p99': None, 'max': None, 'count': 0, 'errors': 0, 'slowest': None}
+        with ThreadPoolExecutor(max_workers=min(self.max_workers, len(jobs))) as pool:
+            results = list(pool.map(lambda target: self._query(*target), jobs))
+
+        timings = [(ms, replica.path) for ms, replica in results if ms is not None]
+        latencies = [ms for ms, _ in timings]
+        return {
+            'p50': percentile(latencies, 50),
+            'p95': percentile(latencies, 95),
+            'p99': percentile(latencies, 99),
+            'max': max(latencies) if latencies else None,
+            'count': len(latencies),
+            'errors': len(results) - len(latencies),
+            'slowest': max(timings)[1] if timings else None
+        }
+
+    def _query(self, replica, query):
+        return query_core(self.state.http, replica, query, timeout=self.timeout), replica
+
+
+class LatencyGate:
+    """Lets replica moves go ahead, slow down or pause according to probed query latency.
+
+    The first check measures a baseline. The budget is the larger of
+    ``budget_ms`` and ``ratio`` times the baseline p95. A p95 within the budget
+    is OK (full concurrency), up to twice the budget is SLOW (one move at a
+    time), and above that is PAUSE (no new moves until it recovers, for at most
+    ``max_pause`` seconds). Probe results are reused for ``interval`` seconds.
+    Rounds that time nothing (no cores to probe, or every query failed) count
+    as OK, so a broken probe never stops maintenance.
+    """
+
+    def __init__(self, probe, budget_ms=LATENCY_BUDGET_MS, ratio=LATENCY_BUDGET_RATIO, interval=PROBE_INTERVAL,
+                 max_pause=MAX_PAUSE, context=None):
+        self.probe = probe
+        self.budget_ms = budget_ms
+        self.ratio = ratio
+        self.interval = interval
+        self.max_pause = max_pause
+        self.context = context
+        self.baseline = None
+        self.last = None
+        self.status = OK
+        self.rounds = 0
+        self.slowdowns = 0
+        self.pauses = 0
+        self.paused_seconds = 0.0
+        self.max_p95 = None
+        self._checked_at = None
+
+    @property
+    def budget(self):
+        baseline_p95 = (self.baseline or {}).get('p95')
+        return max(self.budget_ms, baseline_p95 * self.ratio) if baseline_p95 else self.budget_ms
+
+    def start(self):
+        """Measure the baseline on every live node before the first move"""
+        self.baseline = self.probe.measure()
+        logger.info(f"Query latency baseline: p50 {_ms(self.baseline['p50'])}, p95 {_ms(self.baseline['p95'])} "
+                    f"over {self.baseline['count']} queries; budget p95 {self.budget:.0f}ms")
+        return self.baseline
+
+    def check(self, nodes=None, force=False):
+        """OK, SLOW or PAUSE from the latest probe round (probed again once ``interval`` has passed)"""
+        now = time.monotonic()
+        if not force and self._checked_at is not None and now - self._checked_at < self.interval:
+            return self.status
+        if self.baseline is None:
+            self.start()
+        self._checked_at = now
+        self.last = self.probe.measure(nodes)
+        self.rounds += 1
+        p95 = self.last['p95']
+        if p95 is None:
+            if self.last['errors']:
+                logger.warning(f"Latency probe got no answers ({self.last['errors']} errors); not gating moves")
+            status = OK
+        else:
+            self.max_p95 = max(self.max_p95 or 0, p95)
+            status = OK if p95 <= self.budget else SLOW if p95 <= 2 * self.budget else PAUSE
+        if status != self.status:
+            log = logger.info if status == OK else logger.warning
+            log(f"Query latency p95 {_ms(p95)} (p99 {_ms(self.last['p99'])}, slowest {self.last['slowest']}) "
+                f"against budget {self.budget:.0f}ms: moves {'resume' if status == OK else status}")
+            if status == SLOW:
+                self.slowdowns += 1
+        self.status = status
+        return status
+
+    def limit(self, max_in_flight, nodes=None):
+        """Moves that may run at once now: max_in_flight, 1 when SLOW, 0 when PAUSE"""
+        status = self.check(nodes)
+        return max_in_flight if status == OK else 1 if status == SLOW else 0
+
+    def wait(self, nodes=None):
+        """Wait (probing) until latency is out of PAUSE; returns False if ``max_pause`` or Lambda time ran out"""
+        self.pauses += 1
+        started = time.monotonic()
+        recovered = wait_until(lambda: self.check(nodes, force=True) != PAUSE, timeout=self.max_pause,
+                               context=self.context, description='query latency within budget',
+                               initial_delay=self.interval, max_delay=self.interval * 2)
+        self.paused_seconds += time.monotonic() - started
+        if not recovered:
+            logger.warning(f"Query latency still above budget after {time.monotonic() - started:.0f}s; "
+                           f"continuing one move at a time")
+        return bool(recovered)
+
+    def summary(self):
+        return {
+            'baseline_p95_ms': _round((self.baseline or {}).get('p95')),
+            'budget_ms': round(self.budget),
+            'max_p95_ms': _round(self.max_p95),
+            'rounds': self.rounds,
+            'slowdowns': self.slowdowns,
+            'pauses': self.pauses,
+            'paused_seconds': round(self.paused_seconds, 1)
+        }
+
+
+def latency_gate(cluster_state, context=None):
+    """A LatencyGate with the SOLR_PROBE_* and SOLR_LATENCY_* settings, or None if SOLR_LATENCY_GATE is false"""
+    if not LATENCY_GATE:
+        return None
+    return LatencyGate(LatencyProbe(cluster_state), context=context)
+
+
+def _ms(value):
+    return f"{value:.0f}ms" if value is not None else 'n/a'
+
+
+def _round(value):
+    return round(value, 1) if value is not None else None
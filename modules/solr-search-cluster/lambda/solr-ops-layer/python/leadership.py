@@ -0,0 +1,133 @@
+import logging
+import os
+
+from replica_mover import MAX_IN_FLIGHT, PER_COLLECTION_LIMIT, PER_NODE_LIMIT, ReplicaMoveScheduler
+from solr_client import is_success
+from waiters import wait_until
+
+logger = logging.getLogger()
+
+LEADER_HANDOFF = os.environ.get('SOLR_LEADER_HANDOFF', 'false').lower() == 'true'
+HANDOFF_TIMEOUT = int(os.environ.get('SOLR_LEADER_HANDOFF_TIMEOUT', '120'))  # seconds for leaders to move
+REBALANCE_MAX_AT_ONCE = int(os.environ.get('SOLR_REBALANCE_LEADERS_MAX_AT_ONCE', '10'))
+
+# PULL replicas can never become leader
+LEADER_TYPES = ('NRT', 'TLOG')
+
+
+def leader_candidate(state, replica, target_node=None):
+    """Healthy NRT/TLOG replica of ``replica``'s shard on another live node, preferring target_node"""
+    candidates = [r for r in state.shard_replicas(replica.collection, replica.shard)
+                  if r.name != replica.name and r.node_name != replica.node_name and r.type in LEADER_TYPES
+                  and r.state == 'active' and r.node_name in state.live_nodes]
+    candidates.sort(key=lambda r: (r.node_name != target_node, r.type != replica.type, r.name))
+    return candidates[0] if candidates else None
+
+
+def leaders_without_candidate(state, node, target_node=None):
+    """Leader replicas on ``node`` whose shard has no other healthy NRT/TLOG replica to take over"""
+    return [r for r in state.replicas_on_node(node) if r.is_leader and leader_candidate(state, r, target_node) is None]
+
+
+def wait_for_candidates(state, leaders, target_node=None, timeout=HANDOFF_TIMEOUT, context=None):
+    """Wait until every shard of ``leaders`` has a leader candidate, e.g. a just-added replica done recovering"""
+    def ready():
+        current = state.refresh()
+        return all(leader_candidate(current, r, target_node) is not None for r in leaders)
+
+    return bool(leaders) and bool(wait_until(ready, timeout=timeout, context=context,
+                                             description=f"{len(leaders)} new replicas to be active",
+                                             initial_delay=1, max_delay=5))
+
+
+def hand_off_leadership(http, solr_url, node, target_node, cluster_state, context=None, timeout=HANDOFF_TIMEOUT,
+                        core_sizes=None, on_progress=None, max_in_flight=MAX_IN_FLIGHT,
+                        per_node_limit=PER_NODE_LIMIT, per_collection_limit=PER_COLLECTION_LIMIT, added=()):
+    """Move leadership of every shard led from ``node`` elsewhere before the node is drained.
+
+    Shards without another healthy NRT/TLOG replica first get one on
+    ``target_node`` (ADDREPLICA of the leader's type), except the
+    (collection, shard) pairs in ``added``, whose replacement the caller has
+    already requested. New replicas are waited for until they are active, since
+    only an active replica can be marked preferred leader. The chosen replica of
+    each shard gets the preferredLeader property, each affected collection gets
+    one REBALANCELEADERS, and the leaders are then polled until they have left
+    ``node``. Returns {'handed_off': [...], 'added': [...], 'failed': [...]} as
+    shard paths; shards in 'failed' still have their leader on ``node``.
+    """
+    state = cluster_state.refresh()
+    leaders = [r for r in state.replicas_on_node(node) if r.is_leader]
+    result = {'handed_off': [], 'added': [], 'failed': []}
+    if not leaders:
+        return result
+    logger.info(f"Handing off leadership of {len(leaders)} shards from {node}")
+
+    # A shard whose only NRT replica is the leader needs a second one to hand over to
+    added = set(added)
+    missing = [r for r in leaders_without_candidate(state, node, target_node) if (r.collection, r.shard) not in added]
+    if missing:
+        scheduler = ReplicaMoveScheduler(http, solr_url, cluster_state=state, max_in_flight=max_in_flight,
+                                         per_node_limit=per_node_limit, per_collection_limit=per_collection_limit,
+                                         on_progress=on_progress)
+        for replica in missing:
+            scheduler.add_add(replica, target_node, size_bytes=(core_sizes or {}).get(replica.core, 0))
+        for task in scheduler.run():
+            if task.status == 'completed':
+                result['added'].append(f"{task.replica.collection}/{task.replica.shard}")
+        added.update((r.collection, r.shard) for r in missing)
+    # ADDREPLICA can report completed while the new core is still recovering
+    current = state.refresh()
+    recovering = [r for r in leaders_without_candidate(current, node, target_node)
+                  if (r.collection, r.shard) in added and _added_on(current, r, target_node)]
+    wait_for_candidates(state, recovering, target_node, timeout=timeout, context=context)
+    state = state.refresh()
+
+    preferred = {}
+    for replica in leaders:
+        shard_path = f"{replica.collection}/{replica.shard}"
+        candidate = leader_candidate(state, replica, target_node)
+        if candidate is None:
+            logger.warning(f"No healthy NRT/TLOG replica to take over {shard_path} from {node}")
+            result['failed'].append(shard_path)
+            continue
+        response = state.client.collections('ADDREPLICAPROP', {
+            'collection': replica.collection, 'shard': replica.shard, 'replica': candidate.name,
+            'property': 'preferredLeader', 'property.value': 'true', 'shardUnique': 'true'})
+        if not is_success(response):
+            logger.error(f"Failed to mark {candidate.path} as preferred leader: {response}")
+            result['failed'].append(shard_path)
+            continue
+        preferred[(replica.collection, replica.shard)] = candidate
+
+    for collection in sorted({collection for collection, _ in preferred}):
+        response = state.client.collections('REBALANCELEADERS', {
+            'collection': collection, 'maxAtOnce': REBALANCE_MAX_AT_ONCE, 'maxWaitSeconds': min(timeout, 60)})
+        if not is_success(response):
+            # Leaders that did move are still picked up by the check below
+            logger.warning(f"REBALANCELEADERS for {collection} did not succeed: {response}")
+    state.invalidate()
+
+    def moved():
+        current = state.refresh()
+        return all(getattr(current.leader(collection, shard), 'node_name', node) != node
+                   for collection, shard in preferred)
+
+    wait_until(moved, timeout=timeout, context=context, description=f"leaders to leave {node}",
+               initial_delay=1, max_delay=5)
+    for (collection, shard), candidate in preferred.items():
+        leader = state.leader(collection, shard)
+        if leader is not None and leader.node_name != node:
+            result['handed_off'].append(f"{collection}/{shard}")
+        else:
+            logger.warning(f"Leader of {collection}/{shard} is still on {node}; it will move with MOVEREPLICA")
+            result['failed'].append(f"{collection}/{shard}")
+
+    logger.info(f"Leadership handed off for {len(result['handed_off'])}/{len(leaders)} shards "
+                f"({len(result['added'])} replicas added, {len(result['failed'])} left on {node})")
+    return result
+
+
+def _added_on(state, leader, node):
+    """Whether leader's shard has a replica that could lead on node, in any state"""
+    return any(r.node_name == node and r.type in LEADER_TYPES and r.name != leader.name
+               for r in state.shard_replicas(leader.collection, leader.shard))
@@ -0,0 +1,300 @@
+import logging
+import math
+import os
+
+from cluster_state import Replica
+from replica_mover import MAX_IN_FLIGHT, PER_COLLECTION_LIMIT, PER_NODE_LIMIT, ReplicaMoveScheduler
+
+logger = logging.getLogger()
+
+DESIRED_NRT = 1
+DESIRED_PULL = 2
+BALANCE_TOLERANCE = float(os.environ.get('SOLR_PLACEMENT_TOLERANCE', '0.05'))  # node load spread allowed, as a fraction of the mean
+MAX_BALANCE_MOVES = int(os.environ.get('SOLR_PLACEMENT_MAX_MOVES', '50'))
+
+ACTION_ORDER = {'DELETE': 0, 'ADD': 1, 'MOVE': 2}
+
+
+class Layout:
+    """Planned replica-to-node assignment with per-node replica counts and bytes.
+
+    A node's load is its share of all replicas plus its share of all index
+    bytes, so replica count and index size are evened out together. Without
+    sizes only counts are balanced.
+    """
+
+    def __init__(self, live_nodes, core_sizes=None, node_zones=None):
+        self.nodes = sorted(live_nodes)
+        self.core_sizes = core_sizes or {}
+        self.node_zones = node_zones or {}
+        self.placements = {}  # key -> {'shard': (collection, shard), 'node', 'bytes', 'leader'}
+        self.shards = {}  # (collection, shard) -> {key: node}
+        self.counts = dict.fromkeys(self.nodes, 0)
+        self.bytes = dict.fromkeys(self.nodes, 0)
+
+    def size_of(self, replica):
+        return self.core_sizes.get(replica.core) or 0
+
+    def place(self, key, shard_key, node, size=0, leader=False):
+        if key in self.placements:
+            self.remove(key)
+        self.placements[key] = {'shard': shard_key, 'node': node, 'bytes': size, 'leader': leader}
+        self.shards.setdefault(shard_key, {})[key] = node
+        self.counts[node] = self.counts.get(node, 0) + 1
+        self.bytes[node] = self.bytes.get(node, 0) + size
+
+    def remove(self, key):
+        placement = self.placements.pop(key)
+        del self.shards[placement['shard']][key]
+        self.counts[placement['node']] -= 1
+        self.bytes[placement['node']] -= placement['bytes']
+
+    def move(self, key, node):
+        placement = self.placements[key]
+        self.place(key, placement['shard'], node, placement['bytes'], placement['leader'])
+
+    def weight(self, count, size):
+        total_count = sum(self.counts.values()) or 1
+        total_bytes = sum(self.bytes.values())
+        return count / total_count + (size / total_bytes if total_bytes else 0)
+
+    def load(self, node):
+        return self.weight(self.counts.get(node, 0), self.bytes.get(node, 0))
+
+    def zone_ok(self, shard_key, node, moving=None):
+        """Whether node can take a replica of the shard without overfilling its AZ"""
+        if not self.node_zones:
+            return True
+        zones = set(self.node_zones.get(n) for n in self.nodes)
+        members = {k: n for k, n in self.shards.get(shard_key, {}).items() if k != moving}
+        cap = math.ceil((len(members) + 1) / len(zones))
+        zone = self.node_zones.get(node)
+        return sum(1 for n in members.values() if self.node_zones.get(n) == zone) < cap
+
+    def can_host(self, shard_key, node, moving=None):
+        """Whether node does not host the shard yet and keeps its AZ spread"""
+        hosting = any(n == node for k, n in self.shards.get(shard_key, {}).items() if k != moving)
+        return not hosting and self.zone_ok(shard_key, node, moving)
+
+    def candidates(self, shard_key, moving=None):
+        return [n for n in self.nodes if self.can_host(shard_key, n, moving)]
+
+    def lightest(self, shard_key, moving=None):
+        nodes = self.candidates(shard_key, moving)
+        return min(nodes, key=lambda n: (self.load(n), n)) if nodes else None
+
+    def summary(self):
+        return {node: {'replicas': self.counts[node], 'bytes': self.bytes[node]} for node in self.nodes}
+
+
+def plan_placement(cluster_state, nrt=DESIRED_NRT, pull=DESIRED_PULL, core_sizes=None, node_zones=None,
+                   max_moves=MAX_BALANCE_MOVES, tolerance=BALANCE_TOLERANCE):
+    """Compute the operations that bring every shard to the desired topology on evenly loaded nodes.
+
+    Each shard should have ``nrt`` NRT and ``pull`` PULL replicas on distinct
+    live nodes, spread over AZs when ``node_zones`` ({node: az}) is given.
+    ``core_sizes`` ({core: bytes}, e.g. from Cores STATUS) weights replicas by
+    index size. The plan is returned as data::
+
+        {'operations': [{'id', 'action', 'collection', 'shard', 'replica', 'type',
+                         'source', 'target', 'bytes', 'reason', 'depends_on'}, ...],
+         'skipped': [...], 'before': {node: {...}}, 'after': {node: {...}}}
+
+    Only replicas on dead nodes or in recovery_failed state are deleted, and
+    leaders are never moved. Missing replicas are only added while the shard
+    has a live NRT to copy from; missing NRT replicas are left to recovery,
+    which reuses their dataDir. Operations on a shard depend on the previous
+    operation on that shard, so each shard changes one step at a time.
+    """
+    state = cluster_state.ensure_fresh()
+    live_nodes = set(state.live_nodes)
+    layout = Layout(live_nodes, core_sizes, node_zones)
+    operations = []
+    skipped = []
+
+    def add_operation(action, replica, reason, source=None, target=None, size=0):
+        op = {
+            'id': None,
+            'action': action,
+            'collection': replica.collection,
+            'shard': replica.shard,
+            'replica': replica.name,
+            'type': replica.type,
+            'source': source,
+            'target': target,
+            'bytes': size,
+            'reason': reason,
+            'depends_on': []
+        }
+        operations.append(op)
+        return op
+
+    # Current layout of healthy replicas
+    shards = []
+    for collection_name, collection_data in state.collections.items():
+        for shard_name in collection_data['shards']:
+            shard_key = (collection_name, shard_name)
+            replicas = state.shard_replicas(collection_name, shard_name)
+            healthy = [r for r in replicas if r.node_name in live_nodes and r.state != 'recovery_failed']
+            for replica in sorted(healthy, key=lambda r: not r.is_leader):
+                layout.place(replica.path, shard_key, replica.node_name, layout.size_of(replica), replica.is_leader)
+            shards.append((shard_key, replicas, healthy))
+    before = layout.summary()
+
+    # Per-shard topology: add missing replicas, delete broken excess ones, split co-located replicas
+    for shard_key, replicas, healthy in shards:
+        collection_name, shard_name = shard_key
+        has_nrt = any(r.type == 'NRT' for r in healthy)
+        copy_size = max((layout.size_of(r) for r in healthy), default=0)
+
+        for replica_type, desired in (('NRT', nrt), ('PULL', pull)):
+            of_type = [r for r in replicas if r.type == replica_type]
+            broken = [r for r in of_type if r not in healthy]
+            missing = desired - (len(of_type) - len(broken))
+            added = 0
+
+            for i in range(max(missing, 0)):
+                new = Replica(collection_name, shard_name, f"+{replica_type.lower()}{i + 1}", {'type': replica_type})
+                target = layout.lightest(shard_key)
+                if not has_nrt:
+                    skipped.append(f"{collection_name}/{shard_name}: no live NRT to copy a new {replica_type} replica from")
+                elif target is None:
+                    skipped.append(f"{collection_name}/{shard_name}: no node can take another {replica_type} replica")
+                else:
+                    layout.place(new.path, shard_key, target, copy_size)
+                    added += 1
+                    add_operation('ADD', new, f"{replica_type} replicas below {desired}", target=target, size=copy_size)
+
+            excess = len(of_type) + added - desired
+            for replica in broken[:max(excess, 0)]:
+                if replica_type == 'NRT' and not has_nrt:
+                    skipped.append(f"{replica.path}: kept, it is the shard's only NRT")
+                    continue
+                add_operation('DELETE', replica, 'excess replica on a dead node' if replica.node_name not in live_nodes
+                              else 'excess replica in recovery_failed state', source=replica.node_name)
+
+        seen = set()
+        for replica in sorted(healthy, key=lambda r: not r.is_leader):
+            colocated = replica.node_name in seen
+            seen.add(replica.node_name)
+            if replica.is_leader or not (colocated or not layout.zone_ok(shard_key, replica.node_name, replica.path)):
+                continue
+            target = layout.lightest(shard_key, moving=replica.path)
+            if target is None:
+                skipped.append(f"{replica.path}: no node to move it off {replica.node_name}")
+                continue
+            layout.move(replica.path, target)
+            add_operation('MOVE', replica, 'shares a node or AZ with another replica of its shard',
+                          source=replica.node_name, target=target, size=layout.placements[replica.path]['bytes'])
+
+    # Even out node load: repeatedly move the follower that best closes the gap between
+    # the most and the least loaded node that can take it
+    replicas_by_path = {r.path: r for _, replicas, _ in shards for r in replicas}
+    fixed = {f"{op['collection']}/{op['shard']}/{op['replica']}" for op in operations}
+    balance_moves = {}  # key -> MOVE operation, retargeted if the replica is picked again
+    while len(balance_moves) < max_moves:
+        loads = {node: layout.load(node) for node in layout.nodes}
+        if not loads:
+            break
+        mean = sum(loads.values()) / len(loads)
+        if max(loads.values()) - min(loads.values()) <= tolerance * mean:
+            break
+
+        best = None
+        for source in sorted(layout.nodes, key=lambda n: -loads[n]):
+            for target in sorted(layout.nodes, key=lambda n: loads[n]):
+                gap = loads[source] - loads[target]
+                if gap <= 0:
+                    break
+                for key, placement in layout.placements.items():
+                    if placement['node'] != source or placement['leader'] or key in fixed or key not in replicas_by_path:
+                        continue
+                    weight = layout.weight(1, placement['bytes'])
+                    # Only moves that shrink the gap between the two nodes
+                    if weight >= gap or not layout.can_host(placement['shard'], target, moving=key):
+                        continue
+                    score = abs(gap - 2 * weight)
+                    if best is None or score < best[0]:
+                        best = (score, key, source, target)
+                if best is not None:
+                    break
+            if best is not None:
+                break
+        if best is None:
+            break
+
+        _, key, source, target = best
+        layout.move(key, target)
+        op = balance_moves.get(key)
+        if op is None:
+            balance_moves[key] = add_operation('MOVE', replicas_by_path[key], 'balance node load', source=source,
+                                               target=target, size=layout.placements[key]['bytes'])
+        elif op['source'] == target:
+            operations.remove(op)
+            del balance_moves[key]
+        else:
+            op['target'] = target
+
+    # Dependency order: within a shard DELETE, then ADD, then MOVE, one after the other
+    operations.sort(key=lambda op: ACTION_ORDER[op['action']])
+    by_shard = {}
+    for i, op in enumerate(operations):
+        op['id'] = f"op{i + 1}"
+        chain = by_shard.setdefault((op['collection'], op['shard']), [])
+        if chain:
+            op['depends_on'] = [chain[-1]['id']]
+        chain.append(op)
+
+    counts = ', '.join(f"{sum(1 for op in operations if op['action'] == action)} {action}" for action in ACTION_ORDER)
+    logger.info(f"Placement plan: {len(operations)} operations ({counts}), {len(skipped)} skipped")
+    return {'operations': operations, 'skipped': skipped, 'before': before, 'after': layout.summary()}
+
+
+def plan_replacements(cluster_state, down_node, live_nodes, core_sizes=None, node_zones=None):
+    """Pick a live target node for each replica on down_node, largest first onto the least loaded node.
+
+    Returns {replica path: target node}.
+    """
+    state = cluster_state.ensure_fresh()
+    layout = Layout(live_nodes, core_sizes, node_zones)
+    for replica in state.replicas:
+        if replica.node_name in layout.counts:
+            layout.place(replica.path, (replica.collection, replica.shard), replica.node_name,
+                         layout.size_of(replica), replica.is_leader)
+
+    targets = {}
+    for replica in sorted(state.replicas_on_node(down_node), key=lambda r: -layout.size_of(r)):
+        shard_key = (replica.collection, replica.shard)
+        # Fall back to the least loaded node if every node already hosts the shard
+        target = layout.lightest(shard_key) or min(layout.nodes, key=lambda n: (layout.load(n), n))
+        layout.place(replica.path, shard_key, target, layout.size_of(replica))
+        targets[replica.path] = target
+    return targets
+
+
+def execute_plan(http, solr_url, plan, cluster_state=None, max_in_flight=MAX_IN_FLIGHT,
+                 per_node_limit=PER_NODE_LIMIT, per_collection_limit=PER_COLLECTION_LIMIT, on_progress=None,
+                 gate=None):
+    """Run a plan from plan_placement in dependency order; sets 'status' (and 'error') on each operation"""
+    scheduler = ReplicaMoveScheduler(http, solr_url, cluster_state=cluster_state, max_in_flight=max_in_flight,
+                                     per_node_limit=per_node_limit, per_collection_limit=per_collection_limit,
+                                     on_progress=on_progress, gate=gate)
+    tasks = {}
+    for op in plan['operations']:
+        replica = Replica(op['collection'], op['shard'], op['replica'], {'type': op['type'], 'node_name': op['source']})
+        if op['action'] == 'MOVE':
+            task = scheduler.add_move(replica, op['target'], size_bytes=op['bytes'] or 0)
+        elif op['action'] == 'ADD':
+            task = scheduler.add_add(replica, op['target'], size_bytes=op['bytes'] or 0)
+        else:
+            task = scheduler.add_delete(replica)
+        task.depends_on = [tasks[op_id] for op_id in op['depends_on']]
+        tasks[op['id']] = task
+
+    scheduler.run()
+    for op in plan['operations']:
+        task = tasks[op['id']]
+        op['status'] = task.status
+        if task.error:
+            op['error'] = task.error
+    return plan['operations']
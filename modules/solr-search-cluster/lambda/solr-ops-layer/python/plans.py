@@ -0,0 +1,77 @@
+import logging
+import os
+
+logger = logging.getLogger()
+
+COPY_RATE_MBPS = float(os.environ.get('SOLR_COPY_RATE_MBPS', '50'))  # aggregate index copy throughput (EFS)
+
+# Fixed cost per admin operation (seconds), on top of any index copy
+ACTION_SECONDS = {
+    'MOVE': 10,
+    'ADD': 10,
+    'DELETE': 3,
+    'REQUESTRECOVERY': 10,
+    'RELOAD': 5,
+    'MODIFYCOLLECTION': 2
+}
+
+# Operations that copy a full index from the shard leader
+COPY_ACTIONS = ('MOVE', 'ADD', 'REQUESTRECOVERY')
+
+
+def plan_operation(action, collection, shard=None, replica=None, replica_type=None,
+                   source=None, target=None, reason=None, **params):
+    """One admin operation of a plan, in the same shape as placement plans"""
+    operation = {
+        'action': action,
+        'collection': collection,
+        'shard': shard,
+        'replica': replica,
+        'type': replica_type,
+        'source': source,
+        'target': target,
+        'bytes': None,
+        'reason': reason
+    }
+    if params:
+        operation['params'] = params
+    return operation
+
+
+def estimate_plan(operations, cluster_state, core_stats=None, copy_rate_mbps=COPY_RATE_MBPS):
+    """Add bytes to copy and expected seconds to each operation and total them.
+
+    Copy sizes come from Cores STATUS (``cluster_state.core_status()`` if ``core_stats`` is not given
+    and a copy is planned): the shard leader's index size, or the largest
+    replica of the shard if the leader is unknown. Copies share the EFS
+    throughput, so the total assumes they do not speed each other up.
+    """
+    if core_stats is None and any(op['action'] in COPY_ACTIONS and op.get('bytes') is None for op in operations):
+        core_stats = cluster_state.core_status()
+    core_stats = core_stats or {}
+
+    def shard_size(collection_name, shard_name):
+        leader = cluster_state.leader(collection_name, shard_name)
+        if leader is not None and leader.core in core_stats:
+            return core_stats[leader.core]['sizeInBytes']
+        return max((core_stats.get(r.core, {}).get('sizeInBytes', 0)
+                    for r in cluster_state.shard_replicas(collection_name, shard_name)), default=0)
+
+    rate = copy_rate_mbps * 1_000_000
+    for op in operations:
+        if op['action'] not in COPY_ACTIONS:
+            op['bytes'] = 0
+        elif op.get('bytes') is None:
+            op['bytes'] = shard_size(op['collection'], op['shard'])
+        op['estimated_seconds'] = round(ACTION_SECONDS.get(op['action'], 5) + op['bytes'] / rate, 1)
+
+    bytes_to_copy = sum(op['bytes'] for op in operations)
+    estimated_seconds = round(sum(ACTION_SECONDS.get(op['action'], 5) for op in operations) + bytes_to_copy / rate, 1)
+    logger.info(f"Plan: {len(operations)} operations, {bytes_to_copy / 1_000_000:.0f} MB to copy, "
+                f"about {estimated_seconds:.0f}s at {copy_rate_mbps:g} MB/s")
+    return {
+        'operations': operations,
+        'bytes_to_copy': bytes_to_copy,
+        'estimated_seconds': estimated_seconds,
+        'copy_rate_mbps': copy_rate_mbps
+    }
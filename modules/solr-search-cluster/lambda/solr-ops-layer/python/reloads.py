@@ -0,0 +1,90 @@
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+from solr_client import is_success
+from waiters import wait_until
+
+logger = logging.getLogger()
+
+RELOAD_PARALLEL = int(os.environ.get('SOLR_RELOAD_PARALLEL', '2'))  # collections reloaded at once
+RELOAD_THRESHOLD = int(os.environ.get('SOLR_RELOAD_THRESHOLD', '0'))  # dirty collections that force a flush (0: only on flush())
+HEALTH_TIMEOUT = int(os.environ.get('SOLR_RELOAD_HEALTH_TIMEOUT', '30'))  # seconds to wait for GREEN after a flush
+
+
+class ReloadCoordinator:
+    """Collects collections whose replicas changed and reloads each of them once.
+
+    Routines call ``mark_dirty`` instead of reloading straight away. ``flush``
+    reloads every dirty collection, at most ``max_parallel`` at a time, then
+    waits for all of them to turn GREEN with one CLUSTERSTATUS per check. If
+    ``threshold`` is set, marking that many collections dirty flushes early.
+    """
+
+    def __init__(self, cluster_state, max_parallel=RELOAD_PARALLEL, threshold=RELOAD_THRESHOLD,
+                 health_timeout=HEALTH_TIMEOUT):
+        self.state = cluster_state
+        self.max_parallel = max(1, max_parallel)
+        self.threshold = threshold
+        self.health_timeout = health_timeout
+        self.dirty = set()
+        self.reloaded = []
+        self.failed = []
+
+    @property
+    def pending(self):
+        return sorted(self.dirty)
+
+    def mark_dirty(self, *collections, context=None):
+        """Record collections that need a RELOAD; flushes once the threshold is reached"""
+        self.dirty.update(name for name in collections if name)
+        if self.threshold and len(self.dirty) >= self.threshold:
+            logger.info(f"{len(self.dirty)} collections need a reload, flushing early")
+            self.flush(context=context)
+
+    def flush(self, context=None):
+        """Reload every dirty collection and wait for them to be GREEN.
+
+        Returns {'reloaded', 'failed', 'unhealthy'}, each a list of collection names.
+        """
+        names = self.pending
+        self.dirty.clear()
+        if not names:
+            return {'reloaded': [], 'failed': [], 'unhealthy': []}
+
+        with ThreadPoolExecutor(max_workers=min(self.max_parallel, len(names))) as pool:
+            results = list(pool.map(self._reload, names))
+        self.state.invalidate()
+
+        reloaded = [name for name, ok in zip(names, results) if ok]
+        failed = [name for name, ok in zip(names, results) if not ok]
+        self.reloaded.extend(reloaded)
+        self.failed.extend(failed)
+
+        unhealthy = set(reloaded)
+
+        def check():
+            state = self.state.refresh()
+            for name in list(unhealthy):
+                if state.collection_health(name) == 'GREEN':
+                    logger.info(f"Collection {name} is healthy")
+                    unhealthy.discard(name)
+            return not unhealthy
+
+        if reloaded and not wait_until(check, timeout=self.health_timeout, context=context,
+                                       description=f"health of {len(reloaded)} reloaded collections"):
+            logger.warning(f"Collections not GREEN within {self.health_timeout}s of reload: {sorted(unhealthy)}")
+        logger.info(f"Reloaded {len(reloaded)} collections ({len(failed)} failed)")
+        return {'reloaded': reloaded, 'failed': failed, 'unhealthy': sorted(unhealthy)}
+
+    def _reload(self, name):
+        try:
+            result = self.state.client.collections('RELOAD', {'name': name})
+        except Exception as e:
+            logger.warning(f"Failed to reload {name}: {e}")
+            return False
+        if not is_success(result):
+            logger.warning(f"Failed to reload {name}: {result.get('error') or result.get('exception') or result['responseHeader']}")
+            return False
+        logger.info(f"Reloaded collection {name}")
+        return True
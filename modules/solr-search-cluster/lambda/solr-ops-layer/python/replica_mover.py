@@ -0,0 +1,315 @@
+import logging
+import os
+import time
+
+from async_requests import AsyncRequestTracker
+from plans import COPY_RATE_MBPS
+
+logger = logging.getLogger()
+
+MAX_IN_FLIGHT = int(os.environ.get('SOLR_MOVE_MAX_IN_FLIGHT', '8'))
+PER_NODE_LIMIT = int(os.environ.get('SOLR_MOVE_PER_NODE_LIMIT', '4'))
+PER_COLLECTION_LIMIT = int(os.environ.get('SOLR_MOVE_PER_COLLECTION_LIMIT', '4'))
+MOVE_ORDER = os.environ.get('SOLR_MOVE_ORDER', 'smallest')  # smallest, largest or submitted
+MAX_MB_IN_FLIGHT = int(os.environ.get('SOLR_MOVE_MAX_MB_IN_FLIGHT', '0'))  # index MB copied at once, 0 for no cap
+
+ORDER_KEYS = {
+    'smallest': lambda task: (task.is_leader, task.size_bytes),
+    'largest': lambda task: (task.is_leader, -task.size_bytes),
+    'submitted': lambda task: task.is_leader
+}
+
+
+class MoveTask:
+    """A replica relocation made of one or more async Collections API steps"""
+
+    def __init__(self, replica, target_node, steps, size_bytes=0):
+        self.replica = replica
+        self.target_node = target_node
+        self.steps = steps  # [(params, timeout_seconds), ...] executed in order
+        self.size_bytes = size_bytes  # index bytes the task copies
+        self.step_index = 0
+        self.request = None
+        self.status = 'pending'
+        self.error = None
+        self.depends_on = []  # tasks that must complete before this one starts
+        self.started_at = None
+        self.finished_at = None
+        self.expected_mbps = None
+
+    @property
+    def collection(self):
+        return self.replica.collection
+
+    @property
+    def shard_key(self):
+        return (self.replica.collection, self.replica.shard)
+
+    @property
+    def is_leader(self):
+        return self.replica.is_leader
+
+    @property
+    def action(self):
+        return self.steps[self.step_index][0]['action']
+
+    @property
+    def label(self):
+        return f"{self.replica.path} -> {self.target_node}" if self.target_node else self.replica.path
+
+    @property
+    def seconds(self):
+        if self.started_at is None:
+            return None
+        return (self.finished_at or time.monotonic()) - self.started_at
+
+    @property
+    def measured_mbps(self):
+        if not self.size_bytes or not self.finished_at or self.seconds <= 0:
+            return None
+        return self.size_bytes / 1_000_000 / self.seconds
+
+
+class ReplicaMoveScheduler:
+    """Runs replica moves concurrently within per-node and per-collection limits.
+
+    Followers are scheduled before leaders. A leader only starts once no other
+    move of its shard is pending or running, so at most one leader per shard
+    changes hands at a time and never while that shard is still copying.
+    A task waits for the tasks in its ``depends_on`` and fails if one of them fails.
+    ``on_progress(task)`` is called whenever a task is submitted, completes or fails.
+
+    Tasks with a known ``size_bytes`` are started smallest first (``order``)
+    and, with ``max_mb_in_flight``, no more index MB are copied at once than
+    that, so large replicas do not drain EFS burst credits together. Each
+    completed copy logs its measured MB/s against the expected share of
+    ``COPY_RATE_MBPS``.
+
+    With a ``gate`` (latency_probe.LatencyGate), query latency on the target
+    nodes is probed between starts: moves run one at a time while it is above
+    budget and no new move starts while it is far above, until it recovers.
+    """
+
+    def __init__(self, http, solr_url, cluster_state=None, max_in_flight=MAX_IN_FLIGHT,
+                 per_node_limit=PER_NODE_LIMIT, per_collection_limit=PER_COLLECTION_LIMIT,
+                 tracker=None, on_progress=None, order=MOVE_ORDER, max_mb_in_flight=MAX_MB_IN_FLIGHT, gate=None):
+        self.http = http
+        self.solr_url = solr_url
+        self.cluster_state = cluster_state
+        self.max_in_flight = max_in_flight
+        self.per_node_limit = per_node_limit
+        self.per_collection_limit = per_collection_limit
+        self.tracker = tracker or AsyncRequestTracker(
+            http, solr_url, client=cluster_state.client if cluster_state is not None else None)
+        self.on_progress = on_progress
+        self.order = order
+        self.max_mb_in_flight = max_mb_in_flight
+        self.gate = gate
+        self.tasks = []
+
+    def add_move(self, replica, target_node, timeout=300, size_bytes=0):
+        """Queue a MOVEREPLICA of a live replica to target_node"""
+        params = {
+            'action': 'MOVEREPLICA',
+            'collection': replica.collection,
+            'shard': replica.shard,
+            'replica': replica.name,
+            'targetNode': target_node
+        }
+        task = MoveTask(replica, target_node, [(params, timeout)], size_bytes)
+        self.tasks.append(task)
+        return task
+
+    def add_replace(self, replica, target_node, size_bytes=0):
+        """Queue a DELETEREPLICA of a replica on a down node followed by ADDREPLICA on target_node"""
+        delete_params = {
+            'action': 'DELETEREPLICA',
+            'collection': replica.collection,
+            'shard': replica.shard,
+            'replica': replica.name
+        }
+        add_params = {
+            'action': 'ADDREPLICA',
+            'collection': replica.collection,
+            'shard': replica.shard,
+            'node': target_node,
+            'type': replica.type
+        }
+        task = MoveTask(replica, target_node, [(delete_params, 60), (add_params, 300)], size_bytes)
+        self.tasks.append(task)
+        return task
+
+    def add_add(self, replica, target_node, timeout=300, size_bytes=0):
+        """Queue an ADDREPLICA of replica.type for replica's shard on target_node.
+
+        waitForFinalState keeps the request running until the new core is active, not just created.
+        """
+        params = {
+            'action': 'ADDREPLICA',
+            'collection': replica.collection,
+            'shard': replica.shard,
+            'node': target_node,
+            'type': replica.type,
+            'waitForFinalState': 'true'
+        }
+        task = MoveTask(replica, target_node, [(params, timeout)], size_bytes)
+        self.tasks.append(task)
+        return task
+
+    def add_delete(self, replica, timeout=60):
+        """Queue a DELETEREPLICA"""
+        params = {
+            'action': 'DELETEREPLICA',
+            'collection': replica.collection,
+            'shard': replica.shard,
+            'replica': replica.name
+        }
+        task = MoveTask(replica, None, [(params, timeout)])
+        self.tasks.append(task)
+        return task
+
+    def _can_start(self, task, pending, running):
+        if any(t.status != 'completed' for t in task.depends_on):
+            return False
+        # A task always starts on an idle scheduler, so a replica above the cap still moves (alone)
+        if self.max_mb_in_flight and running and \
+                sum(t.size_bytes for t in running) + task.size_bytes > self.max_mb_in_flight * 1_000_000:
+            return False
+        if task.target_node is not None and \
+                sum(1 for t in running if t.target_node == task.target_node) >= self.per_node_limit:
+            return False
+        if sum(1 for t in running if t.collection == task.collection) >= self.per_collection_limit:
+            return False
+        if any(t.shard_key == task.shard_key and t.is_leader for t in running):
+            return False
+        if task.is_leader:
+            if any(t.shard_key == task.shard_key for t in running):
+                return False
+            if any(t.shard_key == task.shard_key and not t.is_leader for t in pending):
+                return False
+        return True
+
+    def _submit(self, task):
+        params, timeout = task.steps[task.step_index]
+        task.request = self.tracker.submit(params, timeout=timeout,
+                                           label=task.label)
+        if self.cluster_state is not None:
+            self.cluster_state.invalidate()
+
+        if task.request.done():
+            task.status = 'failed'
+            task.error = f"{task.action} could not be submitted"
+            self._notify(task)
+            return False
+        task.status = 'running'
+        self._notify(task)
+        return True
+
+    def _notify(self, task):
+        if self.on_progress is not None:
+            try:
+                self.on_progress(task)
+            except Exception as e:
+                logger.warning(f"Progress callback failed for {task.replica.path}: {e}")
+
+    def _advance(self, task, running):
+        if task.request.succeeded:
+            if task.step_index + 1 < len(task.steps):
+                task.step_index += 1
+                if self._submit(task):
+                    return
+            else:
+                task.status = 'completed'
+                task.finished_at = time.monotonic()
+                if task.measured_mbps is not None:
+                    logger.info(f"{task.action} {task.label} finished in {task.seconds:.1f}s: "
+                                f"{task.size_bytes / 1_000_000:.0f} MB at {task.measured_mbps:.1f} MB/s "
+                                f"(expected {task.expected_mbps:.1f} MB/s)")
+                else:
+                    logger.info(f"{task.action} {task.label} finished in {task.seconds:.1f}s")
+        else:
+            task.status = 'failed'
+            task.error = f"{task.action} {task.request.state}"
+            task.finished_at = time.monotonic()
+        running.remove(task)
+        self._notify(task)
+
+    def _in_flight_limit(self, running):
+        """max_in_flight, lowered by the latency gate (if any) while latency on the target nodes is high"""
+        if self.gate is None:
+            return self.max_in_flight
+        nodes = {t.target_node for t in self.tasks if t.target_node is not None}
+        limit = self.gate.limit(self.max_in_flight, nodes)
+        if limit == 0 and not running:
+            # Nothing is copying, so waiting is all that can bring latency down
+            self.gate.wait(nodes)
+            limit = self.gate.limit(self.max_in_flight, nodes) or 1
+        return limit
+
+    def run(self):
+        """Execute all queued moves and return the task list with final statuses"""
+        # Stable sort keeps caller order among equal sizes, followers before leaders
+        pending = sorted((t for t in self.tasks if t.status == 'pending'),
+                         key=ORDER_KEYS.get(self.order, ORDER_KEYS['submitted']))
+        running = []
+        started_at = time.monotonic()
+        logger.info(f"Scheduling {len(pending)} replica moves (max in flight: {self.max_in_flight}, "
+                    f"per node: {self.per_node_limit}, per collection: {self.per_collection_limit}, "
+                    f"order: {self.order}, {sum(t.size_bytes for t in pending) / 1_000_000:.0f} MB)")
+
+        while pending or running:
+            for task in list(pending):
+                if any(t.status == 'failed' for t in task.depends_on):
+                    pending.remove(task)
+                    task.status = 'failed'
+                    task.error = 'dependency failed'
+                    logger.error(f"Skipping {task.label}: a dependency failed")
+                    self._notify(task)
+
+            # Rescan after each start since a failed submit can unblock a leader
+            limit = self._in_flight_limit(running) if pending else self.max_in_flight
+            started = True
+            while started and len(running) < limit:
+                started = False
+                for task in list(pending):
+                    if len(running) >= limit:
+                        break
+                    if self._can_start(task, pending, running):
+                        pending.remove(task)
+                        started = True
+                        # Concurrent copies share the copy throughput
+                        task.started_at = time.monotonic()
+                        task.expected_mbps = COPY_RATE_MBPS / (1 + sum(1 for t in running if t.size_bytes))
+                        if self._submit(task):
+                            running.append(task)
+
+            if not running:
+                for task in pending:
+                    task.status = 'failed'
+                    task.error = 'could not be scheduled'
+                    logger.error(f"{task.label} could not be scheduled")
+                break
+
+            self.tracker.wait([task.request for task in running], first_completed=True)
+            for task in list(running):
+                if task.request.done():
+                    self._advance(task, running)
+
+        completed = [t for t in self.tasks if t.status == 'completed']
+        copied = sum(t.size_bytes for t in completed) / 1_000_000
+        elapsed = time.monotonic() - started_at
+        logger.info(f"Replica moves finished: {len(completed)}/{len(self.tasks)} completed, "
+                    f"{copied:.0f} MB in {elapsed:.0f}s ({copied / elapsed if elapsed > 0 else 0:.1f} MB/s, "
+                    f"expected {COPY_RATE_MBPS:g} MB/s)")
+        return self.tasks
+
+    def throughput_report(self):
+        """Per completed task: MB copied, seconds, expected and measured MB/s"""
+        return [{
+            'replica': task.replica.path,
+            'target': task.target_node,
+            'mb': round(task.size_bytes / 1_000_000, 1),
+            'seconds': round(task.seconds, 1),
+            'expected_mbps': round(task.expected_mbps, 1) if task.expected_mbps else None,
+            'measured_mbps': round(task.measured_mbps, 1) if task.measured_mbps else None
+        } for task in self.tasks if task.status == 'completed']
@@ -0,0 +1,423 @@
+import json
+import logging
+import os
+import tempfile
+import time
+
+import clients
+import concurrency
+from alerting import flush_metrics, record_metric
+from async_requests import AsyncRequestTracker
+from cluster_state import ClusterState
+from ecs_operations import get_node_from_task, get_node_zones, wait_for_new_task, wait_for_scale_down
+from instrumentation import instrument_client
+from latency_probe import latency_gate
+from reloads import ReloadCoordinator
+from solr_operations import (check_collection_health, check_remaining_replicas, move_replicas,
+                             rebalance_replicas, tombstone_dead_nodes, wait_for_solr_ready)
+from warming import cache_warmer
+from waiters import Deadline
+
+logger = logging.getLogger()
+
+CHECKPOINT_PARAMETER = '/dspace/solr-rollover/checkpoint'
+MIN_REMAINING = 60  # seconds of Lambda time a step needs before it is started
+SAVE_INTERVAL = 5  # seconds between progress saves inside a step
+
+# Step outcomes
+DONE = 'done'
+FAILED = 'failed'
+PAUSED = 'paused'
+
+
+class SSMCheckpointStore:
+    """Checkpoint kept as JSON in an SSM parameter"""
+
+    def __init__(self, parameter=CHECKPOINT_PARAMETER, ssm=None):
+        self.parameter = parameter
+        self._ssm = ssm
+
+    @property
+    def ssm(self):
+        if self._ssm is None:
+            self._ssm = clients.client('ssm', wrap=instrument_client)
+        return self._ssm
+
+    def load(self):
+        try:
+            response = self.ssm.get_parameter(Name=self.parameter)
+        except self.ssm.exceptions.ParameterNotFound:
+            return None
+        return json.loads(response['Parameter']['Value'])
+
+    def save(self, checkpoint):
+        # Intelligent-Tiering moves to the 8KB advanced tier only when the checkpoint outgrows 4KB
+        self.ssm.put_parameter(Name=self.parameter, Value=json.dumps(checkpoint, separators=(',', ':')),
+                               Type='String', Overwrite=True, Tier='Intelligent-Tiering')
+
+    def clear(self):
+        try:
+            self.ssm.delete_parameter(Name=self.parameter)
+        except self.ssm.exceptions.ParameterNotFound:
+            pass
+
+
+class FileCheckpointStore:
+    """Checkpoint kept as a local JSON file (tests and local runs)"""
+
+    def __init__(self, path):
+        self.path = path
+
+    def load(self):
+        try:
+            with open(self.path) as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+
+    def save(self, checkpoint):
+        directory = os.path.dirname(os.path.abspath(self.path))
+        fd, tmp_path = tempfile.mkstemp(dir=directory, prefix='.checkpoint-')
+        with os.fdopen(fd, 'w') as f:
+            json.dump(checkpoint, f)
+        os.replace(tmp_path, self.path)
+
+    def clear(self):
+        try:
+            os.remove(self.path)
+        except FileNotFoundError:
+            pass
+
+
+def checkpoint_store_from_env():
+    """SSM store by default; SOLR_ROLLOVER_CHECKPOINT=file:<path> selects a local file"""
+    setting = os.environ.get('SOLR_ROLLOVER_CHECKPOINT', 'ssm')
+    if setting.startswith('file:'):
+        return FileCheckpointStore(setting[len('file:'):])
+    return SSMCheckpointStore(os.environ.get('SOLR_ROLLOVER_CHECKPOINT_PARAMETER', CHECKPOINT_PARAMETER))
+
+
+class RolloverStateMachine:
+    """Runs named steps in order and checkpoints after each one.
+
+    Each step is a callable taking the machine and returning DONE, FAILED or
+    PAUSED. Steps keep whatever later steps (or a resumed invocation) need in
+    ``machine.data``. A re-invocation with the same ``rollover_id`` skips the
+    steps already completed. A step is not started when less than
+    ``min_remaining`` seconds of Lambda time are left, or when ``guard(machine)``
+    returns an error message.
+    """
+
+    def __init__(self, store, rollover_id, context=None, min_remaining=MIN_REMAINING,
+                 save_interval=SAVE_INTERVAL, guard=None):
+        self.store = store
+        self.guard = guard
+        self.rollover_id = rollover_id
+        self.context = context
+        self.min_remaining = min_remaining
+        self.save_interval = save_interval
+        self.checkpoint = None
+        self._saved_at = None
+
+    @property
+    def data(self):
+        return self.checkpoint['data']
+
+    def begin(self, force_recovery=False):
+        """Load this rollover's checkpoint, or start a new one. Returns False if another rollover's is pending"""
+        existing = self.store.load()
+        if existing and existing.get('rollover_id') != self.rollover_id:
+            if not force_recovery:
+                logger.error(f"Checkpoint for rollover {existing.get('rollover_id')} is still pending "
+                             f"(completed: {existing.get('completed')}); resume it or use force_recovery")
+                return False
+            logger.warning(f"Force recovery requested, discarding checkpoint of rollover {existing.get('rollover_id')}")
+            existing = None
+
+        if existing:
+            logger.info(f"Resuming rollover {self.rollover_id} after steps {existing['completed']}")
+            self.checkpoint = existing
+            self.checkpoint['invocations'] += 1
+        else:
+            self.checkpoint = {'rollover_id': self.rollover_id, 'completed': [], 'data': {},
+                               'timings': {}, 'invocations': 1, 'started_at': int(time.time())}
+        return True
+
+    def deadline(self, timeout=None):
+        """Deadline for work inside a step: ``timeout`` capped by the Lambda time left"""
+        return Deadline(timeout, self.context, margin=self.min_remaining)
+
+    def save(self, force=True):
+        """Persist the checkpoint; with force=False only if save_interval has passed since the last save"""
+        now = time.monotonic()
+        if not force and self._saved_at is not None and now - self._saved_at < self.save_interval:
+            return
+        self.checkpoint['updated_at'] = int(time.time())
+        self.store.save(self.checkpoint)
+        self._saved_at = now
+
+    def run(self, steps):
+        """Run the (name, fn) steps not yet completed and return a status dict"""
+        for name, step in steps:
+            if name in self.checkpoint['completed']:
+                continue
+
+            if self.deadline().expired():
+                return self._stop(PAUSED, name)
+
+            error = self.guard(self) if self.guard is not None else None
+            if error:
+                self.checkpoint['error'] = error
+                return self._stop(FAILED, name)
+
+            logger.info(f"Rollover step {name} starting")
+            started = time.monotonic()
+            try:
+                outcome = step(self)
+            except Exception as e:
+                logger.error(f"Rollover step {name} raised: {e}")
+                self.checkpoint['error'] = str(e)
+                outcome = FAILED
+            elapsed = time.monotonic() - started
+            self.checkpoint['timings'][name] = round(self.checkpoint['timings'].get(name, 0) + elapsed, 1)
+
+            if outcome != DONE:
+                return self._stop(outcome, name)
+
+            self.checkpoint['completed'].append(name)
+            self.checkpoint.pop('error', None)
+            self.save()
+            logger.info(f"Rollover step {name} completed in {elapsed:.1f}s")
+
+        self.store.clear()
+        logger.info(f"Rollover {self.rollover_id} completed after {self.checkpoint['invocations']} invocation(s)")
+        return self._result('completed')
+
+    def _stop(self, outcome, step_name):
+        self.checkpoint['stopped_at'] = step_name
+        self.save()
+        if outcome == PAUSED:
+            logger.warning(f"Rollover {self.rollover_id} paused before finishing {step_name}; re-invoke to resume")
+        else:
+            logger.error(f"Rollover {self.rollover_id} failed in step {step_name}: {self.checkpoint.get('error')}")
+        return self._result(outcome, step_name)
+
+    def _result(self, status, step_name=None):
+        return {'status': status, 'step': step_name, 'rollover_id': self.rollover_id,
+                'completed': list(self.checkpoint['completed']), 'data': self.data,
+                'timings': dict(self.checkpoint['timings'])}
+
+
+def rollover_steps(ecs, http, solr_url, cluster_name, service_name, old_task_id,
+                   force_recovery=False, cluster_state=None):
+    """The rollover of one Solr task as (name, fn) steps for RolloverStateMachine"""
+    state = cluster_state or ClusterState(http, solr_url)
+    ecs = instrument_client(ecs)
+    # Tombstone and rebalance only mark collections dirty; the health step reloads each of them once
+    reloads = ReloadCoordinator(state)
+    # Probed query latency slows or pauses replica moves (None when SOLR_LATENCY_GATE is false)
+    gate = latency_gate(state)
+    # Moved cores are warmed before the old task goes away (None when SOLR_WARM_CACHES is false)
+    warmer = cache_warmer(state)
+
+    def gated(m):
+        if gate is not None:
+            gate.context = m.context
+            # A resumed rollover keeps the baseline measured before its first move
+            if gate.baseline is None and m.data.get('latency_baseline'):
+                gate.baseline = m.data['latency_baseline']
+        return gate
+
+    def record_latency(m):
+        if gate is not None:
+            m.data['latency_baseline'] = gate.baseline
+            m.data['latency'] = gate.summary()
+
+    def lock(m):
+        if not concurrency.acquire_lock(force_recovery=force_recovery):
+            m.checkpoint['error'] = 'another rollover holds the lock'
+            return FAILED
+        # Saved so a resumed invocation can take the lease back as the same owner
+        m.data['lock_owner'] = concurrency.lock_owner()
+        return DONE
+
+    def scale_up(m):
+        if 'old_node' not in m.data:
+            m.data['old_node'] = get_node_from_task(ecs, cluster_name, old_task_id)
+            if not m.data['old_node']:
+                m.checkpoint['error'] = f"could not find node of task {old_task_id}"
+                return FAILED
+        if 'desired_count' not in m.data:
+            # Saved before scaling so a retried step does not scale up twice
+            response = ecs.describe_services(cluster=cluster_name, services=[service_name])
+            m.data['desired_count'] = response['services'][0]['desiredCount']
+            m.save()
+        ecs.update_service(cluster=cluster_name, service=service_name, desiredCount=m.data['desired_count'] + 1)
+        return DONE
+
+    def wait_new_task(m):
+        deadline = m.deadline(300)
+        new_task_id = wait_for_new_task(ecs, cluster_name, service_name, old_task_id,
+                                        timeout=deadline.remaining())
+        if not new_task_id:
+            return PAUSED if m.deadline().expired() else FAILED
+        m.data['new_task_id'] = new_task_id
+        m.data['new_node'] = get_node_from_task(ecs, cluster_name, new_task_id)
+        return DONE
+
+    def wait_solr(m):
+        if wait_for_solr_ready(http, solr_url, m.data['new_node'], cluster_state=state,
+                               timeout=m.deadline(300).remaining()):
+            return DONE
+        return PAUSED if m.deadline().expired() else FAILED
+
+    def move(m):
+        # Only moves still in flight are checkpointed (bounded by the scheduler's limits). Replicas
+        # already moved are no longer on the old node, so a resumed step does not see them again.
+        in_flight = m.data.setdefault('moves_in_flight', {})
+        m.data.setdefault('moved', 0)
+
+        # Requests submitted by an earlier invocation keep running in Solr; wait for them instead of resubmitting
+        if in_flight:
+            tracker = AsyncRequestTracker(http, solr_url, client=state.client)
+            requests = {path: tracker.track(request_id, label=path) for path, request_id in in_flight.items()}
+            tracker.wait(list(requests.values()), timeout=m.deadline().remaining())
+            for path, request in requests.items():
+                if request.done():
+                    in_flight.pop(path)
+                    if request.succeeded:
+                        m.data['moved'] += 1
+            state.invalidate()
+            m.save()
+            if in_flight:
+                return PAUSED
+
+        def on_progress(task):
+            if task.status == 'running':
+                in_flight[task.replica.path] = task.request.request_id
+            else:
+                in_flight.pop(task.replica.path, None)
+                # Replicas added for a leader hand-off are counted when the old replica is deleted
+                if task.status == 'completed' and task.action != 'ADDREPLICA':
+                    m.data['moved'] += 1
+            m.save(force=task.status == 'running')
+
+        move_replicas(http, solr_url, m.data['old_node'], m.data['new_node'], cluster_state=state,
+                      on_progress=on_progress, gate=gated(m), context=m.context)
+        record_latency(m)
+        remaining = check_remaining_replicas(http, solr_url, m.data['old_node'], cluster_state=state)
+        if remaining:
+            m.checkpoint['error'] = f"{len(remaining)} replicas remain on {m.data['old_node']}: {remaining[:10]}"
+            return FAILED
+        return DONE
+
+    def warm(m):
+        if warmer is None:
+            return DONE
+        # Cores warmed by an invocation that ran out of time are not warmed again
+        warmed = m.data.get('warmed_cores', [])
+        result = warmer.warm_node(m.data['new_node'], skip=warmed, deadline=m.deadline(warmer.timeout))
+        warmed = warmed + result['warmed']
+        m.data['warm_queries'] = m.data.get('warm_queries', 0) + result['queries']
+        if not result['complete'] and m.deadline().expired():
+            m.data['warmed_cores'] = warmed
+            return PAUSED
+        # Past SOLR_WARM_TIMEOUT the old task goes anyway; only the count is kept
+        m.data.pop('warmed_cores', None)
+        m.data['warmed'] = len(warmed)
+        return DONE
+
+    def scale_down(m):
+        ecs.update_service(cluster=cluster_name, service=service_name, desiredCount=m.data['desired_count'])
+        if not wait_for_scale_down(ecs, cluster_name, service_name, m.data['desired_count'],
+                                   timeout=m.deadline(100).remaining()) and m.deadline().expired():
+            return PAUSED
+        return DONE
+
+    def tombstone(m):
+        m.data['tombstoned'] = len(tombstone_dead_nodes(http, solr_url, cluster_state=state, reloads=reloads))
+        m.data['reload_pending'] = reloads.pending
+        return DONE
+
+    def rebalance(m):
+        # Collections marked by a step that ran in an earlier invocation
+        reloads.mark_dirty(*m.data.get('reload_pending', []))
+        # Replicas of a shard are spread over AZs as well as nodes
+        node_zones = get_node_zones(ecs, cluster_name)
+        m.data['rebalanced'] = len(rebalance_replicas(http, solr_url, m.data['new_node'], cluster_state=state,
+                                                      node_zones=node_zones, reloads=reloads, gate=gated(m)))
+        record_latency(m)
+        m.data['reload_pending'] = reloads.pending
+        return DONE
+
+    def health(m):
+        reloads.mark_dirty(*m.data.get('reload_pending', []))
+        m.data['reloaded'] = reloads.flush(context=m.context)['reloaded']
+        m.data['reload_pending'] = []
+        m.data['unhealthy'] = check_collection_health(http, solr_url, cluster_state=state)
+        return DONE
+
+    def release(m):
+        concurrency.release_lock()
+        return DONE
+
+    return [
+        ('lock', lock),
+        ('scale_up', scale_up),
+        ('wait_new_task', wait_new_task),
+        ('wait_solr_ready', wait_solr),
+        ('move_replicas', move),
+        ('warm_caches', warm),
+        ('scale_down', scale_down),
+        ('tombstone', tombstone),
+        ('rebalance', rebalance),
+        ('health_check', health),
+        ('release_lock', release)
+    ]
+
+
+def hold_lock(machine):
+    """Guard for rollover steps: keep (or, after a resume, retake) the lease taken by the lock step"""
+    completed = machine.checkpoint['completed']
+    if 'lock' not in completed or 'release_lock' in completed or concurrency.lock_held():
+        return None
+    if concurrency.acquire_lock(owner=machine.data.get('lock_owner')):
+        return None
+    return 'rollover lock is held by another owner'
+
+
+def run_rollover(ecs, http, solr_url, cluster_name, service_name, old_task_id,
+                 context=None, store=None, force_recovery=False, cluster_state=None):
+    """Run (or resume) the checkpointed rollover of old_task_id and return its status dict"""
+    machine = RolloverStateMachine(store or checkpoint_store_from_env(), old_task_id, context=context,
+                                   guard=hold_lock)
+    if not machine.begin(force_recovery=force_recovery):
+        return {'status': 'blocked', 'step': None, 'rollover_id': old_task_id, 'completed': [], 'data': {}, 'timings': {}}
+    steps = rollover_steps(ecs, http, solr_url, cluster_name, service_name, old_task_id,
+                           force_recovery=force_recovery, cluster_state=cluster_state)
+    result = machine.run(steps)
+    if result['status'] != 'completed':
+        # Let the lease lapse unless this rollover is resumed within its TTL
+        concurrency.suspend_lock()
+    _record_rollover_metrics(result)
+    return result
+
+
+def _record_rollover_metrics(result):
+    """Buffer step durations and the outcome per phase and node, then publish them in one batch"""
+    node = result['data'].get('old_node')
+    for step_name, seconds in result['timings'].items():
+        record_metric('RolloverStepSeconds', seconds, unit='Seconds', phase=step_name, node=node)
+    if result['status'] in (FAILED, PAUSED):
+        record_metric('RolloverStepFailed' if result['status'] == FAILED else 'RolloverStepPaused',
+                      phase=result['step'], node=node)
+    for step_name, key in (('tombstone', 'tombstoned'), ('rebalance', 'rebalanced')):
+        count = result['data'].get(key)
+        if count:
+            record_metric('RolloverReplicasChanged', count, phase=step_name, node=node)
+    latency = result['data'].get('latency') or {}
+    if latency.get('max_p95_ms') is not None:
+        record_metric('RolloverQueryLatencyP95', latency['max_p95_ms'], unit='Milliseconds', node=node)
+    if latency.get('pauses'):
+        record_metric('RolloverLatencyPauses', latency['pauses'], node=node)
+    flush_metrics()
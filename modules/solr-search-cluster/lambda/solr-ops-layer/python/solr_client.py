@@ -0,0 +1,136 @@
+import json
+import logging
+import os
+import random
+import time
+from urllib.parse import urlencode
+
+import clients
+from instrumentation import instrument_http
+
+logger = logging.getLogger()
+
+CONNECT_TIMEOUT = float(os.environ.get('SOLR_CONNECT_TIMEOUT', '3'))
+DEFAULT_TIMEOUT = float(os.environ.get('SOLR_READ_TIMEOUT', '30'))
+POOL_MAXSIZE = 16  # connections kept alive per Solr host
+READ_RETRIES = 3
+RETRY_BACKOFF = 0.5  # seconds, doubled per attempt with full jitter
+RETRY_STATUSES = (429, 502, 503, 504)
+
+# Read timeouts (seconds) per action; async submissions return as soon as the Overseer queues them
+ACTION_TIMEOUTS = {
+    'CLUSTERSTATUS': 20,
+    'REQUESTSTATUS': 10,
+    'DELETESTATUS': 10,
+    'MOVEREPLICA': 15,
+    'ADDREPLICA': 15,
+    'DELETEREPLICA': 15,
+    'ADDREPLICAPROP': 15,
+    'REBALANCELEADERS': 90,
+    'RELOAD': 60,
+    'COLLECTIONPROP': 15,
+    'MODIFYCOLLECTION': 30,
+    'cores:STATUS': 10,
+    'cores:REQUESTRECOVERY': 10
+}
+
+# Idempotent reads: sent as GET and retried. Everything else is a POST that is only retried if it never connected.
+READ_ACTIONS = frozenset(['CLUSTERSTATUS', 'REQUESTSTATUS', 'DELETESTATUS', 'LIST', 'OVERSEERSTATUS',
+                          'COLSTATUS', 'LISTALIASES', 'cores:STATUS'])
+
+FORM_HEADERS = {'Content-Type': 'application/x-www-form-urlencoded'}
+CONNECT_ERRORS = ('NewConnectionError', 'ConnectTimeoutError', 'ConnectionRefusedError')
+
+def default_pool():
+    """Keep-alive connection pool shared by every client in this Lambda container"""
+    return clients.http_pool('solr', maxsize=POOL_MAXSIZE, block=False, retries=False,
+                             timeout=_timeout(DEFAULT_TIMEOUT))
+
+
+def _timeout(read_timeout):
+    try:
+        import urllib3
+    except ImportError:
+        return read_timeout
+    return urllib3.Timeout(connect=CONNECT_TIMEOUT, read=read_timeout)
+
+
+def _is_connect_error(error):
+    return any(cls.__name__ in CONNECT_ERRORS for cls in type(error).__mro__)
+
+
+def decode_response(response, object_hook=None):
+    """Decode a Solr JSON response so that responseHeader.status is always present.
+
+    Non-JSON bodies (proxy error pages, truncated responses) become an error
+    dict carrying the HTTP status.
+    """
+    try:
+        result = json.loads(response.data, object_hook=object_hook)
+    except ValueError:
+        body = (response.data or b'')[:200].decode('utf-8', 'replace')
+        result = {'error': {'msg': body, 'code': response.status}}
+    if not isinstance(result, dict):
+        result = {'response': result}
+    header = result.setdefault('responseHeader', {})
+    if 'status' not in header:
+        header['status'] = 0 if response.status == 200 else response.status
+    return result
+
+
+def is_success(result):
+    """Whether a decoded admin response reports success"""
+    return result.get('responseHeader', {}).get('status') == 0 and 'exception' not in result
+
+
+class SolrAdminClient:
+    """Collections and Cores API client with per-action timeouts and retries.
+
+    Reads are sent as GET and retried with jittered backoff on connection
+    errors and 429/5xx gateway responses. Mutations are sent as form-encoded
+    POST bodies, so values are always escaped. They are retried only when the
+    connection could not be opened, because then the request never reached
+    Solr. Every response is decoded by ``decode_response``.
+    """
+
+    def __init__(self, solr_url, http=None, retries=READ_RETRIES, backoff=RETRY_BACKOFF):
+        self.solr_url = solr_url.rstrip('/')
+        self.http = instrument_http(http if http is not None else default_pool())
+        self.retries = retries
+        self.backoff = backoff
+
+    def collections(self, action, params=None, timeout=None, object_hook=None):
+        """Call a Collections API action and return the decoded response"""
+        return self.request('collections', action, params, timeout=timeout, object_hook=object_hook)
+
+    def cores(self, action, params=None, base_url=None, timeout=None):
+        """Call a Cores API action, on base_url (the node hosting the core) when given"""
+        return self.request('cores', action, params, base_url=base_url, timeout=timeout)
+
+    def request(self, api, action, params=None, base_url=None, timeout=None, object_hook=None):
+        key = action if api == 'collections' else f"{api}:{action}"
+        query = {'action': action}
+        query.update((k, v) for k, v in (params or {}).items() if v is not None)
+        query['wt'] = 'json'
+        url = f"{(base_url or self.solr_url + '/solr').rstrip('/')}/admin/{api}"
+        timeout = _timeout(timeout or ACTION_TIMEOUTS.get(key, DEFAULT_TIMEOUT))
+        read = key in READ_ACTIONS
+
+        attempt = 0
+        while True:
+            try:
+                if read:
+                    response = self.http.request('GET', f"{url}?{urlencode(query)}", timeout=timeout)
+                else:
+                    response = self.http.request('POST', url, body=urlencode(query), headers=FORM_HEADERS,
+                                                 timeout=timeout)
+            except Exception as e:
+                if attempt >= self.retries or not (read or _is_connect_error(e)):
+                    raise
+                logger.warning(f"Solr {key} request failed ({e}), retrying")
+            else:
+                if not (read and response.status in RETRY_STATUSES and attempt < self.retries):
+                    return decode_response(response, object_hook)
+                logger.warning(f"Solr {key} returned HTTP {response.status}, retrying")
+            attempt += 1
+            time.sleep(random.uniform(0, self.backoff * 2 ** (attempt - 1)))
@@ -1,112 +1,150 @@
-import json
 import logging
+import os
 import time
-from urllib.parse import urlencode
+
+from async_requests import AsyncRequestTracker
+from cluster_state import ClusterState
+from core_status import index_sizes
+from leadership import LEADER_HANDOFF, hand_off_leadership, leaders_without_candidate
+from placement import execute_plan, plan_placement, plan_replacements
+from plans import estimate_plan, plan_operation
+from reloads import ReloadCoordinator
+from replica_mover import MAX_IN_FLIGHT, PER_COLLECTION_LIMIT, PER_NODE_LIMIT, ReplicaMoveScheduler
+from solr_client import SolrAdminClient, is_success
+from waiters import wait_until
 
 logger = logging.getLogger()
 
-def wait_for_solr_ready(http, solr_url, node_name):
+CONCURRENT_RECOVERY = os.environ.get('SOLR_RECOVERY_CONCURRENT', 'false').lower() == 'true'
+
+def _resolve_state(http, solr_url, cluster_state):
+    """Return the caller's shared ClusterState, or a private one for (http, solr_url) callers"""
+    if cluster_state is None:
+        cluster_state = ClusterState(http, solr_url)
+    return cluster_state
+
+def wait_for_solr_ready(http, solr_url, node_name, cluster_state=None, timeout=300, context=None):
     """Wait for Solr node to join cluster"""
-    for i in range(30):
-        try:
-            cluster_url = f"{solr_url}/solr/admin/collections?action=CLUSTERSTATUS&wt=json"
-            response = http.request('GET', cluster_url)
-            cluster_status = json.loads(response.data.decode('utf-8'))
-            if node_name in cluster_status['cluster']['live_nodes']:
-                return True
-        except Exception as e:
-            logger.info(f"Solr not ready yet: {e}")
-        logger.info(f"Waiting for Solr node {node_name}... attempt {i+1}/30")
-        time.sleep(10)
-    return False
+    state = _resolve_state(http, solr_url, cluster_state)
+    ready = wait_until(lambda: node_name in state.refresh().live_nodes,
+                       timeout=timeout, context=context, description=f"Solr node {node_name}")
+    return bool(ready)
 
-def move_replicas(http, solr_url, old_node, new_node):
-    """Move replicas from old to new node with leader-aware handling"""
-    cluster_url = f"{solr_url}/solr/admin/collections?action=CLUSTERSTATUS&wt=json"
-    response = http.request('GET', cluster_url)
-    cluster_status = json.loads(response.data.decode('utf-8'))
-    
-    moved_replicas = []
-    collections = cluster_status['cluster']['collections']
-    
-    leaders_on_old_node = []
-    followers_on_old_node = []
-    
-    for collection_name, collection_data in collections.items():
-        for shard_name, shard_data in collection_data['shards'].items():
-            for replica_name, replica_data in shard_data['replicas'].items():
-                if replica_data['node_name'] == old_node:
-                    if replica_data.get('leader') == 'true':
-                        leaders_on_old_node.append((collection_name, shard_name, replica_name, replica_data))
-                    else:
-                        followers_on_old_node.append((collection_name, shard_name, replica_name, replica_data))
-    
-    logger.info(f"Old node {old_node} has {len(leaders_on_old_node)} leaders and {len(followers_on_old_node)} followers")
+def move_replicas(http, solr_url, old_node, new_node, cluster_state=None,
+                  max_in_flight=MAX_IN_FLIGHT, per_node_limit=PER_NODE_LIMIT,
+                  per_collection_limit=PER_COLLECTION_LIMIT, on_progress=None, core_sizes=None, gate=None,
+                  handoff=LEADER_HANDOFF, context=None):
+    """Move replicas from old to new node with leader-aware handling.
+
+    ``gate`` (a latency_probe.LatencyGate) slows or pauses the moves while query latency is over budget.
+    With ``handoff`` (SOLR_LEADER_HANDOFF), leadership of the shards led from old_node is handed over
+    with preferredLeader/REBALANCELEADERS first, so the moves do not force elections; an old replica
+    whose shard then has an active replica of its type on new_node is deleted instead of moved.
+    """
+    state = _resolve_state(http, solr_url, cluster_state)
+    http, solr_url = state.http, state.solr_url
     
-    for collection_name, shard_name, replica_name, replica_data in followers_on_old_node:
-        logger.info(f"Moving follower replica {collection_name}/{shard_name}/{replica_name}")
-        if move_single_replica(http, solr_url, collection_name, shard_name, replica_name, new_node):
-            moved_replicas.append(f"{collection_name}/{shard_name}/{replica_name}")
-        time.sleep(2)
+    replicas_on_old_node = state.replicas_on_node(old_node)
+    if core_sizes is None and replicas_on_old_node:
+        core_sizes = index_sizes(state.core_status())
+    leader_count = sum(1 for replica in replicas_on_old_node if replica.is_leader)
+    logger.info(f"Old node {old_node} has {leader_count} leaders and {len(replicas_on_old_node) - leader_count} followers")
+    if handoff and leader_count:
+        return _drain_replicas(http, solr_url, old_node, new_node, state, replicas_on_old_node, core_sizes or {},
+                               context, on_progress=on_progress, gate=gate, max_in_flight=max_in_flight,
+                               per_node_limit=per_node_limit, per_collection_limit=per_collection_limit)
     
-    for collection_name, shard_name, replica_name, replica_data in leaders_on_old_node:
-        logger.info(f"Moving LEADER replica {collection_name}/{shard_name}/{replica_name}")
-        if move_single_replica(http, solr_url, collection_name, shard_name, replica_name, new_node):
-            moved_replicas.append(f"{collection_name}/{shard_name}/{replica_name}")
-        time.sleep(5)
+    # Followers move first, then leaders one per shard once that shard is quiet
+    scheduler = ReplicaMoveScheduler(http, solr_url, cluster_state=state, max_in_flight=max_in_flight,
+                                     per_node_limit=per_node_limit, per_collection_limit=per_collection_limit,
+                                     on_progress=on_progress, gate=gate)
+    for replica in replicas_on_old_node:
+        scheduler.add_move(replica, new_node, size_bytes=(core_sizes or {}).get(replica.core, 0))
     
-    return moved_replicas
+    return [task.replica.path for task in scheduler.run() if task.status == 'completed']
+
+def _drain_replicas(http, solr_url, old_node, new_node, state, replicas_on_old_node, core_sizes, context,
+                    **scheduler_args):
+    """move_replicas with a leader hand-off: copy, hand leadership over, then remove what is left.
+
+    Followers move while shards led only by their old_node NRT replica get a
+    second one on new_node. Once leadership has been handed off, the old
+    leaders are followers with an active replacement and are deleted; other
+    leaders that could not be handed off move with MOVEREPLICA as before. A
+    leader whose replacement never became active stays on old_node, so the
+    caller sees it as remaining rather than getting a third copy.
+    """
+    copies = ReplicaMoveScheduler(http, solr_url, cluster_state=state, **scheduler_args)
+    for replica in replicas_on_old_node:
+        if not replica.is_leader:
+            copies.add_move(replica, new_node, size_bytes=core_sizes.get(replica.core, 0))
+    added = set()
+    for replica in leaders_without_candidate(state, old_node, new_node):
+        copies.add_add(replica, new_node, size_bytes=core_sizes.get(replica.core, 0))
+        added.add((replica.collection, replica.shard))
+    completed = [task.replica.path for task in copies.run()
+                 if task.status == 'completed' and task.action != 'ADDREPLICA']
+
+    gate = scheduler_args.pop('gate', None)
+    hand_off_leadership(http, solr_url, old_node, new_node, state, context=context, core_sizes=core_sizes,
+                        added=added, **scheduler_args)
+    scheduler_args['gate'] = gate
+
+    # Everything left on old_node is a follower unless its hand-off failed. A leader with a replacement
+    # is deleted anyway: that election is the one MOVEREPLICA would have forced, without a second copy
+    rest = ReplicaMoveScheduler(http, solr_url, cluster_state=state, **scheduler_args)
+    for replica in state.refresh().replicas_on_node(old_node):
+        replacement = _replacement(state, replica, new_node)
+        if replacement is None:
+            rest.add_move(replica, new_node, size_bytes=core_sizes.get(replica.core, 0))
+        elif replacement.state == 'active':
+            rest.add_delete(replica)
+        else:
+            logger.error(f"Leaving {replica.path} on {old_node}: its replacement {replacement.path} "
+                         f"is {replacement.state}")
+    return completed + [task.replica.path for task in rest.run() if task.status == 'completed']
+
+def _replacement(state, replica, node):
+    """Another replica of replica's shard and type on node (e.g. added for a leader hand-off), active ones first"""
+    replacements = [r for r in state.shard_replicas(replica.collection, replica.shard)
+                    if r.name != replica.name and r.node_name == node and r.type == replica.type]
+    replacements.sort(key=lambda r: r.state != 'active')
+    return replacements[0] if replacements else None
 
 def wait_for_async_request(http, solr_url, request_id, timeout=300):
     """Poll REQUESTSTATUS until operation completes"""
-    start_time = time.time()
-    while time.time() - start_time < timeout:
-        try:
-            status_url = f"{solr_url}/solr/admin/collections?action=REQUESTSTATUS&requestid={request_id}&wt=json"
-            response = http.request('GET', status_url)
-            result = json.loads(response.data.decode('utf-8'))
-            
-            state = result.get('status', {}).get('state')
-            if state == 'completed':
-                logger.info(f"Request {request_id} completed successfully")
-                return True
-            elif state == 'failed':
-                logger.error(f"Request {request_id} failed: {result}")
-                return False
-            
-            logger.info(f"Request {request_id} state: {state}, waiting...")
-            time.sleep(5)
-        except Exception as e:
-            logger.warning(f"Error checking request status: {e}")
-            time.sleep(5)
-    
-    logger.error(f"Request {request_id} timed out after {timeout}s")
-    return False
+    return AsyncRequestTracker(http, solr_url).track(request_id, timeout=timeout).result()
+
+def move_single_replica(http, solr_url, collection_name, shard_name, replica_name, target_node, cluster_state=None,
+                        warmer=None):
+    """Move a single replica and wait for completion.
 
-def move_single_replica(http, solr_url, collection_name, shard_name, replica_name, target_node):
-    """Move a single replica and wait for completion"""
+    With a ``warmer`` (warming.CacheWarmer), the new core's caches are warmed before returning.
+    """
     import uuid
+    client = cluster_state.client if cluster_state is not None else SolrAdminClient(solr_url, http)
+    http = client.http
     request_id = str(uuid.uuid4())
     
     params = {
-        'action': 'MOVEREPLICA',
         'collection': collection_name,
         'shard': shard_name,
         'replica': replica_name,
         'targetNode': target_node,
-        'async': request_id,
-        'wt': 'json'
+        'async': request_id
     }
     
-    move_url = f"{solr_url}/solr/admin/collections?{urlencode(params)}"
-    move_response = http.request('GET', move_url)
-    move_result = json.loads(move_response.data.decode('utf-8'))
+    move_result = client.collections('MOVEREPLICA', params)
+    if cluster_state is not None:
+        cluster_state.invalidate()
     
-    if move_result.get('responseHeader', {}).get('status') == 0:
+    if is_success(move_result):
         logger.info(f"Move request submitted for {collection_name}/{shard_name}/{replica_name}, request_id: {request_id}")
         # Wait for async operation to complete
         if wait_for_async_request(http, solr_url, request_id):
             logger.info(f"Successfully moved {collection_name}/{shard_name}/{replica_name}")
+            if warmer is not None:
+                _warm_shard(warmer, collection_name, shard_name, target_node)
             return True
         else:
             logger.error(f"Failed to complete move for {collection_name}/{shard_name}/{replica_name}")
@@ -115,29 +153,21 @@ def move_single_replica(http, solr_url, collection_name, shard_name, replica_nam
         logger.error(f"Failed to submit move request for {collection_name}/{shard_name}/{replica_name}: {move_result}")
         return False
 
-def check_remaining_replicas(http, solr_url, old_node):
+def check_remaining_replicas(http, solr_url, old_node, cluster_state=None):
     """Check if any replicas remain on old node"""
     try:
-        cluster_url = f"{solr_url}/solr/admin/collections?action=CLUSTERSTATUS&wt=json"
-        response = http.request('GET', cluster_url)
-        cluster_status = json.loads(response.data.decode('utf-8'))
-        
-        remaining = []
-        collections = cluster_status['cluster']['collections']
-        
-        for collection_name, collection_data in collections.items():
-            for shard_name, shard_data in collection_data['shards'].items():
-                for replica_name, replica_data in shard_data['replicas'].items():
-                    if replica_data['node_name'] == old_node:
-                        remaining.append(f"{collection_name}/{shard_name}/{replica_name}")
-        
-        return remaining
+        state = _resolve_state(http, solr_url, cluster_state)
+        view = state.view(replica_filter=lambda r: r.get('node_name') == old_node)
+        return [replica.path for replica in view.replicas_on_node(old_node)]
     except Exception as e:
         logger.error(f"Failed to check remaining replicas: {e}")
         return ["unknown"]
 
 def find_down_nodes_with_replicas(cluster_status):
     """Find nodes that are down but still have replicas assigned"""
+    if isinstance(cluster_status, ClusterState):
+        return cluster_status.down_nodes_with_replicas()
+    
     live_nodes = set(cluster_status['cluster']['live_nodes'])
     down_nodes_with_replicas = set()
     
@@ -150,139 +180,91 @@ def find_down_nodes_with_replicas(cluster_status):
     
     return list(down_nodes_with_replicas)
 
-def move_replicas_from_down_node(http, solr_url, down_node, live_nodes):
+def move_replicas_from_down_node(http, solr_url, down_node, live_nodes, cluster_state=None,
+                                 max_in_flight=MAX_IN_FLIGHT, per_node_limit=PER_NODE_LIMIT,
+                                 per_collection_limit=PER_COLLECTION_LIMIT, core_sizes=None, node_zones=None):
     """Move all replicas from a down node to live nodes"""
-    import uuid
     logger.info(f"Moving replicas from down node: {down_node}")
     
-    # Get current cluster status
-    cluster_url = f"{solr_url}/solr/admin/collections?action=CLUSTERSTATUS&wt=json"
-    response = http.request('GET', cluster_url)
-    cluster_status = json.loads(response.data.decode('utf-8'))
+    state = _resolve_state(http, solr_url, cluster_state)
+    http, solr_url = state.http, state.solr_url
     
-    moved_replicas = []
+    # Each replica is deleted from the down node, then re-added on a live node
+    scheduler = ReplicaMoveScheduler(http, solr_url, cluster_state=state, max_in_flight=max_in_flight,
+                                     per_node_limit=per_node_limit, per_collection_limit=per_collection_limit)
+    if core_sizes is None:
+        core_sizes = index_sizes(state.core_status())
+    # Least loaded live node that does not already host the shard
+    targets = plan_replacements(state, down_node, live_nodes, core_sizes=core_sizes, node_zones=node_zones)
+    for replica in state.replicas_on_node(down_node):
+        # The down node's cores cannot be asked; the new replica copies the leader's index
+        leader = state.leader(replica.collection, replica.shard)
+        size = core_sizes.get(replica.core) or (core_sizes.get(leader.core, 0) if leader is not None else 0)
+        scheduler.add_replace(replica, targets[replica.path], size_bytes=size)
     
-    for collection_name, collection_data in cluster_status['cluster']['collections'].items():
-        for shard_name, shard_data in collection_data['shards'].items():
-            for replica_name, replica_data in shard_data['replicas'].items():
-                if replica_data['node_name'] == down_node:
-                    # Select target node (round-robin)
-                    target_node = live_nodes[len(moved_replicas) % len(live_nodes)]
-                    
-                    try:
-                        # Delete the down replica first (async)
-                        request_id = str(uuid.uuid4())
-                        delete_url = f"{solr_url}/solr/admin/collections?action=DELETEREPLICA&collection={collection_name}&shard={shard_name}&replica={replica_name}&async={request_id}&wt=json"
-                        http.request('GET', delete_url)
-                        wait_for_async_request(http, solr_url, request_id, timeout=60)
-                        logger.info(f"Deleted down replica {replica_name} from {collection_name}")
-                        
-                        # Add new replica on live node (async)
-                        request_id = str(uuid.uuid4())
-                        add_url = f"{solr_url}/solr/admin/collections?action=ADDREPLICA&collection={collection_name}&shard={shard_name}&node={target_node}&type={replica_data['type']}&async={request_id}&wt=json"
-                        http.request('GET', add_url)
-                        wait_for_async_request(http, solr_url, request_id, timeout=300)
-                        logger.info(f"Added replica for {collection_name}/{shard_name} on {target_node}")
-                        
-                        moved_replicas.append({
-                            'collection': collection_name,
-                            'shard': shard_name,
-                            'from_node': down_node,
-                            'to_node': target_node,
-                            'type': replica_data['type']
-                        })
-                        
-                    except Exception as e:
-                        logger.error(f"Failed to move replica {replica_name}: {e}")
+    moved_replicas = []
+    for task in scheduler.run():
+        if task.status == 'completed':
+            moved_replicas.append({
+                'collection': task.replica.collection,
+                'shard': task.replica.shard,
+                'from_node': down_node,
+                'to_node': task.target_node,
+                'type': task.replica.type
+            })
+        else:
+            logger.error(f"Failed to move replica {task.replica.name}: {task.error}")
     
     return moved_replicas
 
-def rebalance_replicas(http, solr_url, target_node):
-    """Rebalance replicas to match pattern: 1 NRT leader + 2 PULL followers (1 per node)"""
-    import uuid
+def rebalance_replicas(http, solr_url, target_node, cluster_state=None, core_sizes=None, node_zones=None,
+                       plan_only=False, reloads=None, gate=None):
+    """Rebalance replicas to match pattern: 1 NRT leader + 2 PULL followers (1 per node).
+
+    Changed collections are marked dirty on ``reloads`` (a ReloadCoordinator) and
+    left for the caller to flush; without one they are reloaded before returning.
+    ``gate`` (a latency_probe.LatencyGate) slows or pauses the moves while query latency is over budget.
+    With plan_only=True nothing is changed; the planned operations are returned with their estimated cost.
+    """
     try:
-        cluster_url = f"{solr_url}/solr/admin/collections?action=CLUSTERSTATUS&wt=json"
-        response = http.request('GET', cluster_url)
-        cluster_status = json.loads(response.data.decode('utf-8'))
+        state = _resolve_state(http, solr_url, cluster_state)
+        http, solr_url = state.http, state.solr_url
+        
+        # Plan the whole layout first, then run it; shards change in parallel, one step at a time each
+        if core_sizes is None:
+            core_sizes = index_sizes(state.core_status())
+        plan = plan_placement(state, core_sizes=core_sizes, node_zones=node_zones)
+        for reason in plan['skipped']:
+            logger.info(f"Rebalance skipped {reason}")
+        if plan_only:
+            reloads = [plan_operation('RELOAD', name, reason='replicas changed')
+                       for name in sorted({op['collection'] for op in plan['operations']})]
+            return {**estimate_plan(plan['operations'] + reloads, state), 'skipped': plan['skipped']}
+        execute_plan(http, solr_url, plan, cluster_state=state, gate=gate)
         
-        live_nodes = list(cluster_status['cluster']['live_nodes'])
-        collections = cluster_status['cluster']['collections']
         rebalanced = []
         deleted = []
-        
-        for collection_name, collection_data in collections.items():
-            for shard_name, shard_data in collection_data['shards'].items():
-                replicas = shard_data['replicas']
-                
-                # Count replicas by type and node
-                nrt_replicas = [(name, data) for name, data in replicas.items() if data['type'] == 'NRT']
-                pull_replicas = [(name, data) for name, data in replicas.items() if data['type'] == 'PULL']
-                
-                # Delete excess PULL replicas (keep only 2), but only if on dead nodes or in failed state
-                if len(pull_replicas) > 2:
-                    logger.warning(f"{collection_name}/{shard_name} has {len(pull_replicas)} PULL replicas, checking for excess to delete")
-                    for replica_name, replica_data in pull_replicas[2:]:
-                        node_name = replica_data.get('node_name')
-                        state = replica_data.get('state')
-                        
-                        # Only delete if on dead node or in recovery_failed state
-                        if node_name not in live_nodes or state == 'recovery_failed':
-                            request_id = str(uuid.uuid4())
-                            delete_url = f"{solr_url}/solr/admin/collections?action=DELETEREPLICA&collection={collection_name}&shard={shard_name}&replica={replica_name}&async={request_id}&wt=json"
-                            delete_response = http.request('GET', delete_url)
-                            delete_result = json.loads(delete_response.data.decode('utf-8'))
-                            if delete_result.get('responseHeader', {}).get('status') == 0:
-                                if wait_for_async_request(http, solr_url, request_id, timeout=60):
-                                    logger.info(f"Deleted excess PULL replica {replica_name} (node: {node_name}, state: {state})")
-                                    deleted.append(f"{collection_name}/{shard_name}/{replica_name}")
-                        else:
-                            logger.info(f"Skipping deletion of {replica_name} - on live node {node_name} with state {state}")
-                
-                # Ensure PULL replicas are distributed (1 per node)
-                pull_by_node = {}
-                for replica_name, replica_data in pull_replicas[:2]:  # Only consider first 2
-                    node = replica_data['node_name']
-                    if node not in pull_by_node:
-                        pull_by_node[node] = []
-                    pull_by_node[node].append((replica_name, replica_data))
-                
-                # Move PULL replicas if multiple on same node
-                for node, node_replicas in pull_by_node.items():
-                    if len(node_replicas) > 1:
-                        # Keep first, move others
-                        for replica_name, replica_data in node_replicas[1:]:
-                            # Find a node without a PULL replica for this shard
-                            target = next((n for n in live_nodes if n not in pull_by_node), live_nodes[0])
-                            request_id = str(uuid.uuid4())
-                            move_url = f"{solr_url}/solr/admin/collections?action=MOVEREPLICA&collection={collection_name}&shard={shard_name}&replica={replica_name}&targetNode={target}&async={request_id}&wt=json"
-                            move_response = http.request('GET', move_url)
-                            move_result = json.loads(move_response.data.decode('utf-8'))
-                            if move_result.get('responseHeader', {}).get('status') == 0:
-                                if wait_for_async_request(http, solr_url, request_id):
-                                    logger.info(f"Moved PULL replica {replica_name} to {target}")
-                                    rebalanced.append(f"{collection_name}/{shard_name}/{replica_name}")
+        for op in plan['operations']:
+            path = f"{op['collection']}/{op['shard']}/{op['replica']}"
+            if op['status'] != 'completed':
+                logger.error(f"Rebalance {op['action']} of {path} failed: {op.get('error')}")
+            elif op['action'] == 'DELETE':
+                logger.info(f"Deleted excess {op['type']} replica {op['replica']} (node: {op['source']})")
+                deleted.append(path)
+            else:
+                logger.info(f"{op['action']} {op['type']} replica {path} to {op['target']}: {op['reason']}")
+                rebalanced.append(path)
         
         if deleted:
             logger.info(f"Deleted {len(deleted)} excess replicas")
         if rebalanced:
             logger.info(f"Rebalanced {len(rebalanced)} replicas")
         
-        # Reload collections that had operations
-        collections_modified = set()
-        for item in deleted + rebalanced:
-            coll_name = item.split('/')[0]
-            collections_modified.add(coll_name)
-        
-        for coll_name in collections_modified:
-            try:
-                reload_url = f"{solr_url}/solr/admin/collections?action=RELOAD&name={coll_name}&wt=json"
-                http.request('GET', reload_url, timeout=30.0)
-                logger.info(f"Reloaded collection {coll_name}")
-                
-                # Wait briefly for collection to stabilize
-                wait_for_collection_healthy(http, solr_url, coll_name, timeout=10)
-            except Exception as e:
-                logger.warning(f"Failed to reload {coll_name}: {e}")
+        # Reload collections that had operations, once each
+        coordinator = reloads or ReloadCoordinator(state)
+        coordinator.mark_dirty(*{item.split('/')[0] for item in deleted + rebalanced})
+        if reloads is None:
+            coordinator.flush()
         
         return rebalanced + deleted
         
@@ -290,52 +272,53 @@ def rebalance_replicas(http, solr_url, target_node):
         logger.error(f"Replica rebalancing failed: {e}")
         return []
 
-def update_nodeset_constraints(http, solr_url, new_node):
-    """Check and update NodeSet constraints for collections"""
+def update_nodeset_constraints(http, solr_url, new_node, cluster_state=None, plan_only=False):
+    """Check and update NodeSet constraints for collections (plan_only=True returns the plan instead)"""
     try:
-        cluster_url = f"{solr_url}/solr/admin/collections?action=CLUSTERSTATUS&wt=json"
-        response = http.request('GET', cluster_url)
-        cluster_status = json.loads(response.data.decode('utf-8'))
+        state = _resolve_state(http, solr_url, cluster_state)
+        http, solr_url = state.http, state.solr_url
         
-        collections = cluster_status['cluster']['collections']
+        collections = state.collections
         updated_collections = []
+        operations = []
         
         for collection_name in collections.keys():
-            props_url = f"{solr_url}/solr/admin/collections?action=COLLECTIONPROP&collection={collection_name}&wt=json"
-            props_response = http.request('GET', props_url)
-            props_result = json.loads(props_response.data.decode('utf-8'))
+            props_result = state.client.collections('COLLECTIONPROP', {'collection': collection_name})
             
             if 'properties' in props_result:
                 props = props_result['properties']
                 has_nodeset = any(key.startswith('createNodeSet') or key.startswith('rule') for key in props.keys())
                 
-                if has_nodeset:
+                if has_nodeset and plan_only:
+                    operations.append(plan_operation('MODIFYCOLLECTION', collection_name, rule='node:*',
+                                                     reason='createNodeSet/rule constraint set'))
+                elif has_nodeset:
                     logger.info(f"Updating NodeSet constraints for collection {collection_name}")
-                    modify_url = f"{solr_url}/solr/admin/collections?action=MODIFYCOLLECTION&collection={collection_name}&rule=node:*&wt=json"
-                    modify_response = http.request('GET', modify_url)
-                    modify_result = json.loads(modify_response.data.decode('utf-8'))
+                    modify_result = state.client.collections('MODIFYCOLLECTION', {
+                        'collection': collection_name, 'rule': 'node:*'})
+                    state.invalidate()
                     
-                    if modify_result.get('responseHeader', {}).get('status') == 0:
+                    if is_success(modify_result):
                         updated_collections.append(collection_name)
                         logger.info(f"Updated NodeSet for {collection_name}")
                     else:
                         logger.warning(f"Failed to update NodeSet for {collection_name}: {modify_result}")
         
+        if plan_only:
+            return estimate_plan(operations, state)
         return updated_collections
         
     except Exception as e:
         logger.warning(f"NodeSet constraint check failed: {e}")
         return []
 
-def check_collection_health(http, solr_url):
+def check_collection_health(http, solr_url, cluster_state=None):
     """Check if all collections are healthy (GREEN status)"""
     try:
-        cluster_url = f"{solr_url}/solr/admin/collections?action=CLUSTERSTATUS&wt=json"
-        response = http.request('GET', cluster_url)
-        cluster_status = json.loads(response.data.decode('utf-8'))
+        state = _resolve_state(http, solr_url, cluster_state)
         
         unhealthy_collections = []
-        collections = cluster_status['cluster']['collections']
+        collections = state.collections
         
         for collection_name, collection_data in collections.items():
             health = collection_data.get('health', 'UNKNOWN')
@@ -348,24 +331,28 @@ def check_collection_health(http, solr_url):
         logger.error(f"Failed to check collection health: {e}")
         return [f"health_check_failed:{str(e)}"]
 
-def tombstone_dead_nodes(http, solr_url):
-    """Remove all replicas from dead (non-live) nodes"""
-    import uuid
+def tombstone_dead_nodes(http, solr_url, cluster_state=None, plan_only=False, reloads=None):
+    """Remove all replicas from dead (non-live) nodes (plan_only=True returns the plan instead).
+
+    Collections that lost replicas are marked dirty on ``reloads``, or reloaded at the end without one.
+    """
     try:
-        cluster_url = f"{solr_url}/solr/admin/collections?action=CLUSTERSTATUS&wt=json"
-        response = http.request('GET', cluster_url)
-        cluster_status = json.loads(response.data.decode('utf-8'))
+        state = _resolve_state(http, solr_url, cluster_state)
+        http, solr_url = state.http, state.solr_url
+        tracker = AsyncRequestTracker(http, solr_url, client=state.client)
+        coordinator = reloads or ReloadCoordinator(state)
         
-        live_nodes = set(cluster_status['cluster']['live_nodes'])
-        collections = cluster_status['cluster']['collections']
+        live_nodes = set(state.live_nodes)
+        collections = state.collections
         deleted = []
+        operations = []
         
         logger.info(f"Live nodes: {live_nodes}")
         
         # Process collections sequentially
         for collection_name, collection_data in collections.items():
             logger.info(f"Tombstoning collection: {collection_name}")
-            collection_had_deletions = False
+            pending_deletes = []
             
             for shard_name, shard_data in collection_data['shards'].items():
                 # Count active replicas on live nodes by type
@@ -389,32 +376,43 @@ def tombstone_dead_nodes(http, solr_url):
                         logger.warning(f"Found replica on dead node: {collection_name}/{shard_name}/{replica_name} on {node_name}")
                         logger.info(f"DataDir preserved on EFS: {data_dir}")
                         
-                        try:
-                            request_id = str(uuid.uuid4())
-                            delete_url = f"{solr_url}/solr/admin/collections?action=DELETEREPLICA&collection={collection_name}&shard={shard_name}&replica={replica_name}&async={request_id}&wt=json"
-                            delete_response = http.request('GET', delete_url)
-                            delete_result = json.loads(delete_response.data.decode('utf-8'))
-                            
-                            if delete_result.get('responseHeader', {}).get('status') == 0:
-                                if wait_for_async_request(http, solr_url, request_id, timeout=60):
-                                    logger.info(f"Deleted replica {replica_name} from dead node {node_name}")
-                                    deleted.append(f"{collection_name}/{shard_name}/{replica_name}@{node_name}")
-                                    collection_had_deletions = True
-                        except Exception as e:
-                            logger.error(f"Failed to delete {replica_name} from {node_name}: {e}")
+                        if plan_only:
+                            operations.append(plan_operation('DELETE', collection_name, shard_name, replica_name,
+                                                             replica_type, source=node_name, reason='replica on dead node'))
+                            continue
+                        
+                        # Submit now, wait for all of the collection's deletions together
+                        request = tracker.submit({
+                            'action': 'DELETEREPLICA',
+                            'collection': collection_name,
+                            'shard': shard_name,
+                            'replica': replica_name
+                        }, timeout=60, label=f"{collection_name}/{shard_name}/{replica_name}@{node_name}")
+                        state.invalidate()
+                        pending_deletes.append(request)
             
-            # Reload collection after deletions
+            if plan_only:
+                if any(op['collection'] == collection_name for op in operations):
+                    operations.append(plan_operation('RELOAD', collection_name, reason='replicas deleted'))
+                continue
+            
+            collection_had_deletions = False
+            for request in tracker.wait(pending_deletes):
+                if request.succeeded:
+                    logger.info(f"Deleted replica {request.label} from dead node")
+                    deleted.append(request.label)
+                    collection_had_deletions = True
+                else:
+                    logger.error(f"Failed to delete {request.label}: {request.state}")
+            
+            # Reload collection after deletions (coalesced with the other changed collections)
             if collection_had_deletions:
-                try:
-                    reload_url = f"{solr_url}/solr/admin/collections?action=RELOAD&name={collection_name}&wt=json"
-                    http.request('GET', reload_url, timeout=30.0)
-                    logger.info(f"Reloaded collection {collection_name}")
-                    
-                    # Wait briefly for collection to stabilize
-                    wait_for_collection_healthy(http, solr_url, collection_name, timeout=10)
-                except Exception as e:
-                    logger.warning(f"Failed to reload {collection_name}: {e}")
+                coordinator.mark_dirty(collection_name)
         
+        if plan_only:
+            return estimate_plan(operations, state)
+        if reloads is None:
+            coordinator.flush()
         logger.info(f"Tombstone complete: deleted {len(deleted)} replicas from dead nodes")
         return deleted
         
@@ -422,55 +420,49 @@ def tombstone_dead_nodes(http, solr_url):
         logger.error(f"Tombstone operation failed: {e}")
         return []
 
-def check_existing_data(http, solr_url, collection, shard):
+def check_existing_data(http, solr_url, collection, shard, cluster_state=None):
     """Check all replicas for collection/shard across cluster to find directory with most documents"""
     try:
-        # Query cluster status to find all replicas (including on dead nodes)
-        cluster_url = f"{solr_url}/solr/admin/collections?action=CLUSTERSTATUS&wt=json"
-        response = http.request('GET', cluster_url)
-        cluster_data = json.loads(response.data.decode('utf-8'))
+        # Cluster state lists all replicas (including on dead nodes)
+        state = _resolve_state(http, solr_url, cluster_state)
+        http, solr_url = state.http, state.solr_url
         
         # Find all replicas for this collection/shard and pick the one with most documents
         best_match = None
         max_docs = 0
         
-        collections = cluster_data['cluster']['collections']
-        if collection in collections:
-            shards = collections[collection].get('shards', {})
-            if shard in shards:
-                replicas = shards[shard].get('replicas', {})
-                
-                for replica_name, replica_data in replicas.items():
-                    # Check if replica has dataDir and get document count from leader
-                    data_dir = replica_data.get('dataDir')
-                    instance_dir = replica_data.get('instanceDir')
+        # One STATUS per live node, sent to that node and shared with other callers of the snapshot
+        core_stats = state.core_status()
+        
+        # Only this shard's replicas are needed, so ask for the narrow view
+        for replica in state.view(collection, shard).shard_replicas(collection, shard):
+            replica_name, replica_data = replica.name, replica.data
+            # Check if replica has dataDir and get document count from its own node
+            data_dir = replica_data.get('dataDir')
+            instance_dir = replica_data.get('instanceDir')
+            
+            core_name = replica_data.get('core')
+            if core_name and data_dir:
+                if core_name in core_stats:
+                    num_docs = core_stats[core_name]['numDocs']
                     
-                    # Try to get index info from replica's core
-                    core_name = replica_data.get('core')
-                    if core_name and data_dir:
-                        try:
-                            core_url = f"{solr_url}/solr/admin/cores?action=STATUS&core={core_name}&wt=json"
-                            core_response = http.request('GET', core_url, timeout=5.0)
-                            core_data = json.loads(core_response.data.decode('utf-8'))
-                            num_docs = core_data.get('status', {}).get(core_name, {}).get('index', {}).get('numDocs', 0)
-                            
-                            if num_docs > max_docs:
-                                max_docs = num_docs
-                                best_match = {
-                                    'dataDir': data_dir,
-                                    'numDocs': num_docs,
-                                    'instanceDir': instance_dir,
-                                    'replica': replica_name
-                                }
-                        except:
-                            # Core may not be accessible, but dataDir still exists on EFS
-                            if data_dir and not best_match:
-                                best_match = {
-                                    'dataDir': data_dir,
-                                    'numDocs': 0,
-                                    'instanceDir': instance_dir,
-                                    'replica': replica_name
-                                }
+                    if num_docs > max_docs:
+                        max_docs = num_docs
+                        best_match = {
+                            'dataDir': data_dir,
+                            'numDocs': num_docs,
+                            'sizeInBytes': core_stats[core_name]['sizeInBytes'],
+                            'instanceDir': instance_dir,
+                            'replica': replica_name
+                        }
+                elif not best_match:
+                    # Core may not be accessible, but dataDir still exists on EFS
+                    best_match = {
+                        'dataDir': data_dir,
+                        'numDocs': 0,
+                        'instanceDir': instance_dir,
+                        'replica': replica_name
+                    }
         
         if best_match and max_docs > 0:
             logger.info(f"Found existing data from {best_match['replica']} with {max_docs} documents at {best_match['dataDir']}")
@@ -484,31 +476,38 @@ def check_existing_data(http, solr_url, collection, shard):
         logger.warning(f"Failed to check existing data: {e}")
         return None
 
-def wait_for_collection_healthy(http, solr_url, collection, timeout=60):
+def wait_for_collection_healthy(http, solr_url, collection, timeout=60, cluster_state=None, context=None):
     """Poll until collection health is GREEN"""
-    cluster_url = f"{solr_url}/solr/admin/collections?action=CLUSTERSTATUS&wt=json"
+    state = _resolve_state(http, solr_url, cluster_state)
     
-    for i in range(timeout // 5):
-        try:
-            response = http.request('GET', cluster_url)
-            data = json.loads(response.data.decode('utf-8'))
-            health = data['cluster']['collections'].get(collection, {}).get('health', 'UNKNOWN')
-            
-            if health == 'GREEN':
-                logger.info(f"Collection {collection} is healthy")
-                return True
-            logger.debug(f"Collection {collection} health: {health}, waiting...")
-            time.sleep(5)
-        except Exception as e:
-            logger.warning(f"Health check failed: {e}")
-            time.sleep(5)
+    def check():
+        health = state.view(collection, refresh=True).collection_health(collection)
+        if health == 'GREEN':
+            logger.info(f"Collection {collection} is healthy")
+            return True
+        logger.debug(f"Collection {collection} health: {health}, waiting...")
+        return False
+    
+    if wait_until(check, timeout=timeout, context=context, description=f"collection {collection} health"):
+        return True
     
     logger.warning(f"Collection {collection} did not reach GREEN health within {timeout}s")
     return False
 
-def handle_recovery_failed_replicas(http, solr_url, max_passes=2):
-    """Delete replicas in recovery_failed state and recreate them only if needed"""
-    import uuid
+def handle_recovery_failed_replicas(http, solr_url, max_passes=2, cluster_state=None,
+                                    concurrent=CONCURRENT_RECOVERY, recovery_timeout=60, context=None,
+                                    plan_only=False, reloads=None):
+    """Delete replicas in recovery_failed state and recreate them only if needed.
+
+    Collections touched by any pass are reloaded once after the last pass, or
+    marked dirty on ``reloads`` for the caller to flush.
+    With plan_only=True the operations of the first pass are returned with their estimated cost instead.
+    """
+    state = _resolve_state(http, solr_url, cluster_state)
+    http, solr_url = state.http, state.solr_url
+    if plan_only:
+        return _plan_recovery(state)
+    coordinator = reloads or ReloadCoordinator(state)
     
     all_deleted = []
     all_recreated = []
@@ -518,126 +517,90 @@ def handle_recovery_failed_replicas(http, solr_url, max_passes=2):
         logger.info(f"Recovery pass {pass_num + 1}/{max_passes}")
         
         try:
-            cluster_url = f"{solr_url}/solr/admin/collections?action=CLUSTERSTATUS&wt=json"
-            response = http.request('GET', cluster_url)
-            cluster_status = json.loads(response.data.decode('utf-8'))
-            
-            collections = cluster_status['cluster']['collections']
-            live_nodes = list(cluster_status['cluster']['live_nodes'])
+            # Full-cluster scan keeps only recovery_failed replicas while parsing
+            scan = state.view(replica_filter=lambda r: r.get('state') == 'recovery_failed')
+            collections = scan.collections
+            live_nodes = list(scan.live_nodes)
             pass_deleted = []
             pass_recreated = []
             pass_recovered = []
             
-            # Process collections sequentially (mimic Solr restart behavior)
-            for collection_name, collection_data in collections.items():
-                logger.info(f"Processing collection: {collection_name}")
-                collection_had_operations = False
+            if concurrent:
+                _recover_concurrently(http, solr_url, collections, live_nodes, recovery_timeout,
+                                      pass_recovered, pass_deleted, pass_recreated,
+                                      cluster_state=state, reloads=coordinator, context=context)
+            else:
+                # Process collections sequentially (mimic Solr restart behavior)
+                for collection_name, collection_data in collections.items():
+                    logger.info(f"Processing collection: {collection_name}")
+                    collection_had_operations = False
                 
-                # Process NRT replicas first (priority), then PULL replicas
-                for replica_priority in ['NRT', 'PULL']:
-                    for shard_name, shard_data in collection_data['shards'].items():
-                        # Count active replicas by type
-                        active_nrt = sum(1 for r in shard_data['replicas'].values() 
-                                        if r.get('type') == 'NRT' and r.get('state') == 'active')
-                        active_pull = sum(1 for r in shard_data['replicas'].values() 
-                                         if r.get('type') == 'PULL' and r.get('state') == 'active')
-                        
-                        for replica_name, replica_data in shard_data['replicas'].items():
-                            if replica_data.get('state') != 'recovery_failed':
+                    # Process NRT replicas first (priority), then PULL replicas
+                    for replica_priority in ['NRT', 'PULL']:
+                        for shard_name, shard_data in collection_data['shards'].items():
+                            # Skip replicas not matching current priority pass
+                            failed_replicas = [(name, data) for name, data in shard_data['replicas'].items()
+                                               if data.get('state') == 'recovery_failed'
+                                               and data.get('type', 'NRT') == replica_priority]
+                            if not failed_replicas:
                                 continue
+                        
+                            # Count active replicas by type from this shard's own view
+                            shard_replicas = state.view(collection_name, shard_name).shard_replicas(collection_name, shard_name)
+                            active_nrt = sum(1 for r in shard_replicas if r.type == 'NRT' and r.state == 'active')
+                            active_pull = sum(1 for r in shard_replicas if r.type == 'PULL' and r.state == 'active')
+                        
+                            for replica_name, replica_data in failed_replicas:
+                                logger.warning(f"Found recovery_failed replica: {collection_name}/{shard_name}/{replica_name}")
+                                collection_had_operations = True
+                                failed_node = replica_data.get('node_name')
+                                core_name = replica_data.get('core')
                             
-                            replica_type = replica_data.get('type', 'NRT')
-                            
-                            # Skip if not matching current priority pass
-                            if replica_type != replica_priority:
-                                continue
-                            
-                            logger.warning(f"Found recovery_failed replica: {collection_name}/{shard_name}/{replica_name}")
-                            collection_had_operations = True
-                            failed_node = replica_data.get('node_name')
-                            core_name = replica_data.get('core')
-                            data_dir = replica_data.get('dataDir')
-                            instance_dir = replica_data.get('instanceDir')
-                            
-                            # First, attempt to recover the replica using Core API
-                            try:
-                                logger.info(f"Attempting REQUESTRECOVERY for {collection_name}/{shard_name}/{replica_name}")
-                                if core_name:
-                                    recovery_url = f"{solr_url}/solr/admin/cores?action=REQUESTRECOVERY&core={core_name}&wt=json"
-                                    recovery_response = http.request('GET', recovery_url, timeout=10.0)
-                                    recovery_result = json.loads(recovery_response.data.decode('utf-8'))
+                                # First, attempt to recover the replica using Core API
+                                try:
+                                    logger.info(f"Attempting REQUESTRECOVERY for {collection_name}/{shard_name}/{replica_name}")
+                                    if core_name:
+                                        recovery_requested = _request_recovery(state.client, replica_data)
+                                        state.invalidate()
                                     
-                                    if recovery_result.get('responseHeader', {}).get('status') == 0:
-                                        logger.info(f"REQUESTRECOVERY initiated for {replica_name}, polling for recovery...")
+                                        if recovery_requested:
+                                            logger.info(f"REQUESTRECOVERY initiated for {replica_name}, polling for recovery...")
                                         
-                                        # Poll for recovery completion (up to 60 seconds)
-                                        recovered = False
-                                        for i in range(12):
-                                            time.sleep(5)
-                                            poll_response = http.request('GET', cluster_url)
-                                            poll_data = json.loads(poll_response.data.decode('utf-8'))
-                                            current_state = poll_data['cluster']['collections'][collection_name]['shards'][shard_name]['replicas'].get(replica_name, {}).get('state')
+                                            # Poll for recovery completion (up to 60 seconds)
+                                            recovered = False
+                                            for i in range(12):
+                                                time.sleep(5)
+                                                poll = state.view(collection_name, shard_name, refresh=True)
+                                                current_state = next((r.state for r in poll.shard_replicas(collection_name, shard_name)
+                                                                      if r.name == replica_name), None)
                                             
-                                            if current_state == 'active':
-                                                logger.info(f"Replica {replica_name} recovered successfully")
-                                                pass_recovered.append(f"{collection_name}/{shard_name}/{replica_name}")
-                                                recovered = True
-                                                break
+                                                if current_state == 'active':
+                                                    logger.info(f"Replica {replica_name} recovered successfully")
+                                                    pass_recovered.append(f"{collection_name}/{shard_name}/{replica_name}")
+                                                    recovered = True
+                                                    break
                                         
-                                        if recovered:
-                                            continue
-                                        else:
-                                            logger.warning(f"Recovery timeout for {replica_name}, state still: {current_state}")
-                            except Exception as e:
-                                logger.warning(f"REQUESTRECOVERY failed for {replica_name}: {e}")
-                            
-                            # Only delete replicas on dead nodes (mimic Solr restart behavior)
-                            if failed_node not in live_nodes:
-                                logger.info(f"Node {failed_node} is dead, proceeding with deletion")
-                            else:
-                                logger.info(f"Skipping deletion - node {failed_node} is live, recovery should complete naturally")
-                                continue
+                                            if recovered:
+                                                continue
+                                            else:
+                                                logger.warning(f"Recovery timeout for {replica_name}, state still: {current_state}")
+                                except Exception as e:
+                                    logger.warning(f"REQUESTRECOVERY failed for {replica_name}: {e}")
                             
-                            # Delete the failed replica
-                            request_id = str(uuid.uuid4())
-                            delete_url = f"{solr_url}/solr/admin/collections?action=DELETEREPLICA&collection={collection_name}&shard={shard_name}&replica={replica_name}&async={request_id}&wt=json"
-                            delete_response = http.request('GET', delete_url)
-                            delete_result = json.loads(delete_response.data.decode('utf-8'))
+                                # Only delete replicas on dead nodes (mimic Solr restart behavior)
+                                if failed_node not in live_nodes:
+                                    logger.info(f"Node {failed_node} is dead, proceeding with deletion")
+                                else:
+                                    logger.info(f"Skipping deletion - node {failed_node} is live, recovery should complete naturally")
+                                    continue
                             
-                            if delete_result.get('responseHeader', {}).get('status') == 0:
-                                if wait_for_async_request(http, solr_url, request_id, timeout=60):
-                                    logger.info(f"Deleted recovery_failed replica {collection_name}/{shard_name}/{replica_name}")
-                                    pass_deleted.append(f"{collection_name}/{shard_name}/{replica_name}")
-                                    
-                                    # Only recreate if we're below expected counts
-                                    should_recreate = False
-                                    target_type = replica_type
-                                    
-                                    if replica_type == 'NRT' and active_nrt < 1:
-                                        should_recreate = True
-                                        logger.info(f"Recreating NRT replica (current active: {active_nrt})")
-                                    elif replica_type == 'PULL' and active_pull < 2:
-                                        should_recreate = True
-                                        logger.info(f"Recreating PULL replica (current active: {active_pull})")
-                                    else:
-                                        logger.info(f"Skipping recreation - sufficient replicas (NRT: {active_nrt}, PULL: {active_pull})")
-                                    
-                                    if should_recreate:
-                                        _recreate_replica(http, solr_url, collection_name, shard_name,
-                                                         replica_type, failed_node, live_nodes,
-                                                         data_dir, instance_dir, pass_recreated)
+                                _delete_failed_replica(http, solr_url, collection_name, shard_name, replica_name,
+                                                       replica_data, live_nodes, active_nrt, active_pull,
+                                                       pass_deleted, pass_recreated, cluster_state=state)
                 
-                # Reload collection immediately after processing it (mimic Solr restart)
-                if collection_had_operations:
-                    try:
-                        reload_url = f"{solr_url}/solr/admin/collections?action=RELOAD&name={collection_name}&wt=json"
-                        http.request('GET', reload_url, timeout=30.0)
-                        logger.info(f"Reloaded collection {collection_name}")
-                        
-                        # Wait briefly for collection to stabilize (multi-pass will catch remaining issues)
-                        wait_for_collection_healthy(http, solr_url, collection_name, timeout=10)
-                    except Exception as e:
-                        logger.warning(f"Failed to reload {collection_name}: {e}")
+                    # Reload collection once all passes are done (mimic Solr restart)
+                    if collection_had_operations:
+                        coordinator.mark_dirty(collection_name, context=context)
             
             all_deleted.extend(pass_deleted)
             all_recreated.extend(pass_recreated)
@@ -654,13 +617,212 @@ def handle_recovery_failed_replicas(http, solr_url, max_passes=2):
             logger.error(f"Recovery pass {pass_num + 1} failed: {e}")
             break
     
+    if reloads is None:
+        coordinator.flush(context=context)
     logger.info(f"Recovery summary: recovered {len(all_recovered)}, deleted {len(all_deleted)}, recreated {len(all_recreated)}")
     return {'recovered': all_recovered, 'deleted': all_deleted, 'recreated': all_recreated}
 
 
+def _recover_concurrently(http, solr_url, collections, live_nodes, recovery_timeout,
+                          pass_recovered, pass_deleted, pass_recreated, cluster_state, reloads, context=None):
+    """Request recovery of every recovery_failed replica at once and poll them in one loop.
+
+    PULL replicas of a shard are only asked to recover once that shard's NRT
+    replicas have recovered or been given up on. Each collection is marked
+    dirty on ``reloads`` as soon as none of its replicas are outstanding.
+    """
+    state = cluster_state
+    pending = {}  # (collection, shard, replica) -> (replica_data, deadline)
+    held_back = {}  # (collection, shard) -> PULL replicas waiting for the shard's NRT
+    given_up = []  # replicas to delete/recreate once the live ones have been asked to recover
+    nrt_outstanding = {}
+    outstanding = {}
+    
+    def start(collection_name, shard_name, replica_name, replica_data):
+        logger.warning(f"Found recovery_failed replica: {collection_name}/{shard_name}/{replica_name}")
+        if replica_data.get('core') and replica_data.get('node_name') in live_nodes:
+            try:
+                if _request_recovery(state.client, replica_data):
+                    pending[(collection_name, shard_name, replica_name)] = (replica_data, time.monotonic() + recovery_timeout)
+                    return
+            except Exception as e:
+                logger.warning(f"REQUESTRECOVERY failed for {replica_name}: {e}")
+        given_up.append((collection_name, shard_name, replica_name, replica_data))
+    
+    def replace_given_up():
+        while given_up:
+            give_up(*given_up.pop(0))
+    
+    def give_up(collection_name, shard_name, replica_name, replica_data):
+        failed_node = replica_data.get('node_name')
+        if failed_node not in live_nodes:
+            logger.info(f"Node {failed_node} is dead, proceeding with deletion")
+            shard_replicas = state.view(collection_name, shard_name).shard_replicas(collection_name, shard_name)
+            active_nrt = sum(1 for r in shard_replicas if r.type == 'NRT' and r.state == 'active')
+            active_pull = sum(1 for r in shard_replicas if r.type == 'PULL' and r.state == 'active')
+            _delete_failed_replica(http, solr_url, collection_name, shard_name, replica_name,
+                                   replica_data, live_nodes, active_nrt, active_pull,
+                                   pass_deleted, pass_recreated, cluster_state=state)
+        else:
+            logger.info(f"Skipping deletion - node {failed_node} is live, recovery should complete naturally")
+        resolve(collection_name, shard_name, replica_data)
+    
+    def resolve(collection_name, shard_name, replica_data):
+        shard_key = (collection_name, shard_name)
+        if replica_data.get('type', 'NRT') == 'NRT':
+            nrt_outstanding[shard_key] -= 1
+            if nrt_outstanding[shard_key] == 0:
+                for replica_name, pull_data in held_back.pop(shard_key, []):
+                    start(collection_name, shard_name, replica_name, pull_data)
+        outstanding[collection_name] -= 1
+        if outstanding[collection_name] == 0:
+            reloads.mark_dirty(collection_name, context=context)
+    
+    # Count everything first so no collection looks finished while its shards are still being issued
+    shards = []
+    for collection_name, collection_data in collections.items():
+        for shard_name, shard_data in collection_data['shards'].items():
+            failed = [(name, data) for name, data in shard_data['replicas'].items()
+                      if data.get('state') == 'recovery_failed']
+            nrt = [(name, data) for name, data in failed if data.get('type', 'NRT') == 'NRT']
+            pull = [(name, data) for name, data in failed if data.get('type') == 'PULL']
+            if not nrt and not pull:
+                continue
+            shards.append((collection_name, shard_name, nrt, pull))
+            nrt_outstanding[(collection_name, shard_name)] = len(nrt)
+            outstanding[collection_name] = outstanding.get(collection_name, 0) + len(nrt) + len(pull)
+    
+    if not shards:
+        return
+    
+    for collection_name, shard_name, nrt, pull in shards:
+        if nrt:
+            held_back[(collection_name, shard_name)] = pull
+            for replica_name, replica_data in nrt:
+                start(collection_name, shard_name, replica_name, replica_data)
+        else:
+            for replica_name, replica_data in pull:
+                start(collection_name, shard_name, replica_name, replica_data)
+    
+    state.invalidate()
+    logger.info(f"REQUESTRECOVERY issued for {len(pending)} replicas across {len(outstanding)} collections")
+    replace_given_up()
+    
+    def sweep():
+        if not pending:
+            return True
+        cores = {replica_data.get('core') for replica_data, _ in pending.values()}
+        view = state.view(replica_filter=lambda r: r.get('core') in cores, refresh=True)
+        for key, (replica_data, deadline) in list(pending.items()):
+            collection_name, shard_name, replica_name = key
+            current_state = next((r.state for r in view.shard_replicas(collection_name, shard_name)
+                                  if r.name == replica_name), None)
+            if current_state == 'active':
+                del pending[key]
+                logger.info(f"Replica {replica_name} recovered successfully")
+                pass_recovered.append(f"{collection_name}/{shard_name}/{replica_name}")
+                resolve(collection_name, shard_name, replica_data)
+            elif time.monotonic() >= deadline:
+                del pending[key]
+                logger.warning(f"Recovery timeout for {replica_name}, state still: {current_state}")
+                given_up.append((collection_name, shard_name, replica_name, replica_data))
+        replace_given_up()
+        return not pending
+    
+    # NRT replicas, then the PULL replicas held back behind them, each get recovery_timeout, plus slack for sweeps
+    if not wait_until(sweep, timeout=2 * recovery_timeout + 30, context=context, description='replica recovery',
+                      initial_delay=2, max_delay=5):
+        logger.warning(f"Stopped polling with {len(pending)} replicas still recovering: {sorted(pending)}")
+
+
+def _plan_recovery(state):
+    """Operations one recovery pass would issue, assuming no REQUESTRECOVERY succeeds on a dead node"""
+    scan = state.view(replica_filter=lambda r: r.get('state') == 'recovery_failed')
+    live_nodes = list(scan.live_nodes)
+    operations = []
+    
+    for collection_name, collection_data in scan.collections.items():
+        for shard_name, shard_data in collection_data['shards'].items():
+            failed = sorted(((name, data) for name, data in shard_data['replicas'].items()
+                             if data.get('state') == 'recovery_failed'),
+                            key=lambda item: item[1].get('type', 'NRT') != 'NRT')
+            if not failed:
+                continue
+            shard_replicas = state.view(collection_name, shard_name).shard_replicas(collection_name, shard_name)
+            active_nrt = sum(1 for r in shard_replicas if r.type == 'NRT' and r.state == 'active')
+            active_pull = sum(1 for r in shard_replicas if r.type == 'PULL' and r.state == 'active')
+            
+            for replica_name, replica_data in failed:
+                replica_type = replica_data.get('type', 'NRT')
+                failed_node = replica_data.get('node_name')
+                if failed_node in live_nodes:
+                    if replica_data.get('core'):
+                        operations.append(plan_operation('REQUESTRECOVERY', collection_name, shard_name, replica_name,
+                                                         replica_type, target=failed_node, reason='recovery_failed'))
+                    continue
+                
+                operations.append(plan_operation('DELETE', collection_name, shard_name, replica_name, replica_type,
+                                                 source=failed_node, reason='recovery_failed on dead node'))
+                if (replica_type == 'NRT' and active_nrt < 1) or (replica_type == 'PULL' and active_pull < 2):
+                    add = plan_operation('ADD', collection_name, shard_name, replica_type=replica_type,
+                                         target=live_nodes[0] if live_nodes else None, reason='recreate deleted replica',
+                                         dataDir=replica_data.get('dataDir'))
+                    if replica_data.get('dataDir'):
+                        # The recreated replica reopens its index on EFS instead of copying it
+                        add['bytes'] = 0
+                    operations.append(add)
+        
+        if any(op['collection'] == collection_name for op in operations):
+            operations.append(plan_operation('RELOAD', collection_name, reason='replicas recovered or replaced'))
+    
+    return estimate_plan(operations, state)
+
+
+def _request_recovery(client, replica_data):
+    """Send REQUESTRECOVERY to the node hosting the core (the Cores API is node-local)"""
+    recovery_result = client.cores('REQUESTRECOVERY', {'core': replica_data.get('core')},
+                                   base_url=replica_data.get('base_url'))
+    return is_success(recovery_result)
+
+
+def _delete_failed_replica(http, solr_url, collection_name, shard_name, replica_name,
+                           replica_data, live_nodes, active_nrt, active_pull,
+                           pass_deleted, pass_recreated, cluster_state):
+    """Delete a recovery_failed replica on a dead node and recreate it if the shard is short"""
+    import uuid
+    replica_type = replica_data.get('type', 'NRT')
+    request_id = str(uuid.uuid4())
+    delete_result = cluster_state.client.collections('DELETEREPLICA', {
+        'collection': collection_name, 'shard': shard_name, 'replica': replica_name, 'async': request_id})
+    cluster_state.invalidate()
+    
+    if is_success(delete_result):
+        if wait_for_async_request(http, solr_url, request_id, timeout=60):
+            logger.info(f"Deleted recovery_failed replica {collection_name}/{shard_name}/{replica_name}")
+            pass_deleted.append(f"{collection_name}/{shard_name}/{replica_name}")
+            
+            # Only recreate if we're below expected counts
+            should_recreate = False
+            
+            if replica_type == 'NRT' and active_nrt < 1:
+                should_recreate = True
+                logger.info(f"Recreating NRT replica (current active: {active_nrt})")
+            elif replica_type == 'PULL' and active_pull < 2:
+                should_recreate = True
+                logger.info(f"Recreating PULL replica (current active: {active_pull})")
+            else:
+                logger.info(f"Skipping recreation - sufficient replicas (NRT: {active_nrt}, PULL: {active_pull})")
+            
+            if should_recreate:
+                _recreate_replica(http, solr_url, collection_name, shard_name,
+                                 replica_type, replica_data.get('node_name'), live_nodes,
+                                 replica_data.get('dataDir'), replica_data.get('instanceDir'),
+                                 pass_recreated, cluster_state=cluster_state)
+
+
 def _recreate_replica(http, solr_url, collection_name, shard_name,
                       replica_type, failed_node, live_nodes,
-                      data_dir, instance_dir, pass_recreated):
+                      data_dir, instance_dir, pass_recreated, cluster_state=None):
     """Helper to recreate a replica on a healthy node"""
     import uuid
     try:
@@ -669,28 +831,39 @@ def _recreate_replica(http, solr_url, collection_name, shard_name,
         
         # For NRT replicas, check for existing data on shared EFS (PULL replicas sync from NRT)
         if replica_type == 'NRT':
-            existing_data = check_existing_data(http, solr_url, collection_name, shard_name)
+            existing_data = check_existing_data(http, solr_url, collection_name, shard_name,
+                                                cluster_state=cluster_state)
             if existing_data and existing_data['numDocs'] > 0:
                 data_dir = existing_data.get('dataDir')
                 instance_dir = existing_data.get('instanceDir')
                 logger.info(f"Using existing NRT data with {existing_data['numDocs']} documents from {data_dir}")
         
-        # Build ADDREPLICA URL with dataDir and instanceDir if available
-        add_url = f"{solr_url}/solr/admin/collections?action=ADDREPLICA&collection={collection_name}&shard={shard_name}&node={target_node}&type={replica_type}&async={request_id}"
+        # Build ADDREPLICA params with dataDir and instanceDir if available
+        params = {'collection': collection_name, 'shard': shard_name, 'node': target_node,
+                  'type': replica_type, 'async': request_id}
         if data_dir:
-            add_url += f"&dataDir={data_dir}"
+            params['dataDir'] = data_dir
             logger.info(f"Recreating replica with existing dataDir: {data_dir}")
         if instance_dir:
-            add_url += f"&instanceDir={instance_dir}"
+            params['instanceDir'] = instance_dir
             logger.info(f"Recreating replica with existing instanceDir: {instance_dir}")
-        add_url += "&wt=json"
         
-        add_response = http.request('GET', add_url)
-        add_result = json.loads(add_response.data.decode('utf-8'))
+        client = cluster_state.client if cluster_state is not None else SolrAdminClient(solr_url, http)
+        add_result = client.collections('ADDREPLICA', params)
+        if cluster_state is not None:
+            cluster_state.invalidate()
         
-        if add_result.get('responseHeader', {}).get('status') == 0:
+        if is_success(add_result):
             if wait_for_async_request(http, solr_url, request_id, timeout=300):
                 logger.info(f"Recreated replica for {collection_name}/{shard_name} on {target_node}")
                 pass_recreated.append(f"{collection_name}/{shard_name}")
     except Exception as e:
         logger.error(f"Failed to recreate replica for {collection_name}/{shard_name}: {e}")
+
+
+def _warm_shard(warmer, collection_name, shard_name, node):
+    """Warm the new replica of a shard on ``node``; warming problems are logged, never raised"""
+    try:
+        warmer.warm_shard(collection_name, shard_name, node)
+    except Exception as e:
+        logger.warning(f"Failed to warm {collection_name}/{shard_name} on {node}: {e}")
@@ -0,0 +1,85 @@
+import logging
+import random
+import time
+
+logger = logging.getLogger()
+
+INITIAL_DELAY = 1  # seconds before the second check
+MAX_DELAY = 15
+BACKOFF = 2
+DEADLINE_MARGIN = 10  # seconds of Lambda time kept back for cleanup and the response
+DESCRIBE_TASKS_BATCH_SIZE = 100  # ECS DescribeTasks limit
+
+
+class Deadline:
+    """The earlier of an explicit timeout and the Lambda invocation's remaining time"""
+
+    def __init__(self, timeout=None, context=None, margin=DEADLINE_MARGIN):
+        now = time.monotonic()
+        candidates = []
+        if timeout is not None:
+            candidates.append(now + timeout)
+        if context is not None:
+            candidates.append(now + context.get_remaining_time_in_millis() / 1000.0 - margin)
+        self.expires_at = min(candidates) if candidates else None
+
+    def remaining(self):
+        if self.expires_at is None:
+            return None
+        return self.expires_at - time.monotonic()
+
+    def expired(self):
+        remaining = self.remaining()
+        return remaining is not None and remaining <= 0
+
+
+def wait_until(check, timeout=None, context=None, description='condition',
+               initial_delay=INITIAL_DELAY, max_delay=MAX_DELAY, backoff=BACKOFF):
+    """Call check() with jittered exponential backoff until it returns a truthy value.
+
+    Returns that value, or None once the deadline (timeout and/or Lambda context)
+    has passed. Exceptions raised by check() are logged and treated as not ready.
+    Raises ValueError if there is neither, rather than waiting forever.
+    """
+    if timeout is None and context is None:
+        raise ValueError(f"Waiting for {description} needs a timeout or a Lambda context")
+    deadline = Deadline(timeout, context)
+    delay = initial_delay
+    attempt = 0
+
+    while True:
+        attempt += 1
+        try:
+            result = check()
+        except Exception as e:
+            logger.warning(f"Check for {description} failed: {e}")
+            result = None
+        if result:
+            return result
+
+        remaining = deadline.remaining()
+        if remaining is not None and remaining <= 0:
+            logger.warning(f"Timed out waiting for {description} after {attempt} checks")
+            return None
+
+        # Equal jitter: keep at least half the delay, randomise the rest
+        sleep = delay / 2 + random.uniform(0, delay / 2)
+        if remaining is not None:
+            sleep = min(sleep, remaining)
+        logger.info(f"Waiting for {description}... check {attempt}, next in {sleep:.1f}s")
+        time.sleep(sleep)
+        delay = min(delay * backoff, max_delay)
+
+
+def describe_tasks_batched(ecs, cluster, task_arns):
+    """Describe any number of ECS tasks with one DescribeTasks call per 100 ARNs.
+
+    Returns a dict mapping each found task ARN to its description.
+    """
+    tasks = {}
+    task_arns = list(task_arns)
+    for i in range(0, len(task_arns), DESCRIBE_TASKS_BATCH_SIZE):
+        response = ecs.describe_tasks(cluster=cluster, tasks=task_arns[i:i + DESCRIBE_TASKS_BATCH_SIZE])
+        for task in response.get('tasks', []):
+            tasks[task['taskArn']] = task
+    return tasks
@@ -0,0 +1,135 @@
+import json
+import logging
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from latency_probe import DEFAULT_QUERIES, query_core
+from waiters import Deadline, wait_until
+
+logger = logging.getLogger()
+
+# Discovery searches, facets and sorts DSpace sends most, plus the usage report facet;
+# SOLR_WARM_QUERIES replaces them with a JSON list captured from the Solr request log
+DEFAULT_WARM_QUERIES = DEFAULT_QUERIES + [
+    {'collection': 'search', 'params': {'q': '*:*', 'rows': 0, 'facet': 'true', 'facet.mincount': 1,
+                                        'facet.field': ['author_filter', 'subject_filter', 'dateIssued.year']}},
+    {'collection': 'search', 'params': {'q': '*:*', 'rows': 20, 'sort': 'dc.date.accessioned_dt desc'}},
+    {'collection': 'search', 'params': {'q': '*:*', 'rows': 20, 'sort': 'dc.title_sort asc'}},
+    {'collection': 'statistics', 'params': {'q': 'type:2', 'rows': 0, 'facet': 'true', 'facet.field': 'owningItem',
+                                            'facet.limit': 10}}
+]
+WARM_CACHES = os.environ.get('SOLR_WARM_CACHES', 'true').lower() == 'true'
+WARM_QUERIES = json.loads(os.environ['SOLR_WARM_QUERIES']) if os.environ.get('SOLR_WARM_QUERIES') else DEFAULT_WARM_QUERIES
+WARM_ROUNDS = int(os.environ.get('SOLR_WARM_ROUNDS', '2'))  # times the query set is sent to each core
+WARM_WORKERS = int(os.environ.get('SOLR_WARM_WORKERS', '4'))  # cores warmed at once
+WARM_TIMEOUT = float(os.environ.get('SOLR_WARM_TIMEOUT', '300'))  # seconds warming may take
+WARM_ACTIVE_TIMEOUT = float(os.environ.get('SOLR_WARM_ACTIVE_TIMEOUT', '120'))  # seconds to wait for cores to be active
+QUERY_TIMEOUT = 30
+
+
+class CacheWarmer:
+    """Fills the caches of newly placed cores before the replicas they replace go away.
+
+    Sends every query of a core's collection ``rounds`` times straight to the
+    core with distrib=false. Each core gets one query at a time, in order, and
+    ``max_workers`` cores are warmed at once. Cores that are not active within
+    ``active_timeout`` seconds are skipped. Warming stops at ``timeout`` or the
+    Lambda deadline; failed queries are counted but never fail the caller.
+    """
+
+    def __init__(self, cluster_state, queries=None, rounds=WARM_ROUNDS, max_workers=WARM_WORKERS,
+                 timeout=WARM_TIMEOUT, active_timeout=WARM_ACTIVE_TIMEOUT):
+        self.state = cluster_state
+        self.queries = queries if queries is not None else WARM_QUERIES
+        self.rounds = max(1, rounds)
+        self.max_workers = max(1, max_workers)
+        self.timeout = timeout
+        self.active_timeout = active_timeout
+
+    def replicas(self, node, collection=None, shard=None):
+        """Replicas on ``node`` (optionally of one shard) whose collection has warming queries"""
+        collections = {query['collection'] for query in self.queries}
+        return [r for r in self.state.ensure_fresh().replicas_on_node(node)
+                if r.collection in collections and (collection is None or r.collection == collection)
+                and (shard is None or r.shard == shard)]
+
+    def warm_node(self, node, context=None, skip=(), deadline=None):
+        """Warm every core on ``node`` except the replica paths in ``skip``"""
+        return self.warm([r for r in self.replicas(node) if r.path not in set(skip)], context=context,
+                         deadline=deadline)
+
+    def warm_shard(self, collection, shard, node, context=None):
+        """Warm the replicas of one shard on ``node``, e.g. after a move or ADDREPLICA"""
+        return self.warm(self.replicas(node, collection, shard), context=context)
+
+    def warm(self, replicas, context=None, deadline=None):
+        """Warm ``replicas`` until ``deadline`` (a waiters.Deadline, default ``timeout`` capped by the Lambda time).
+
+        Returns {'warmed', 'skipped', 'queries', 'errors', 'seconds', 'complete'}.
+        """
+        started = time.monotonic()
+        deadline = deadline or Deadline(self.timeout, context)
+        result = {'warmed': [], 'skipped': [], 'queries': 0, 'errors': 0, 'seconds': 0.0, 'complete': True}
+        if not replicas:
+            return result
+
+        active = self._wait_active(replicas, deadline)
+        result['skipped'] = [r.path for r in replicas if r.path not in active]
+        if result['skipped']:
+            logger.warning(f"Not warming {len(result['skipped'])} cores that are not active: {result['skipped'][:10]}")
+        by_path = {r.path: r for r in replicas}
+        todo = [by_path[path] for path in by_path if path in active]
+
+        if todo:
+            with ThreadPoolExecutor(max_workers=min(self.max_workers, len(todo))) as pool:
+                for path, sent, errors, complete in pool.map(lambda r: self._warm_core(r, deadline), todo):
+                    result['queries'] += sent
+                    result['errors'] += errors
+                    if complete:
+                        result['warmed'].append(path)
+                    else:
+                        result['complete'] = False
+
+        result['seconds'] = round(time.monotonic() - started, 1)
+        logger.info(f"Warmed {len(result['warmed'])}/{len(replicas)} cores with {result['queries']} queries "
+                    f"({result['errors']} failed) in {result['seconds']}s")
+        if not result['complete']:
+            logger.warning(f"Cache warming stopped at its deadline; {len(todo) - len(result['warmed'])} cores not finished")
+        return result
+
+    def _wait_active(self, replicas, deadline):
+        """Paths of ``replicas`` that are active, waiting up to active_timeout for the rest"""
+        paths = {r.path for r in replicas}
+        active = set()
+
+        def check():
+            active.clear()
+            active.update(r.path for r in self.state.refresh().replicas if r.path in paths and r.state == 'active')
+            return active == paths
+
+        timeout = self.active_timeout
+        if deadline.remaining() is not None:
+            timeout = max(0, min(timeout, deadline.remaining()))
+        wait_until(check, timeout=timeout, description=f"{len(paths)} cores to be active before warming",
+                   initial_delay=2, max_delay=10)
+        return active
+
+    def _warm_core(self, replica, deadline):
+        queries = [query for query in self.queries if query['collection'] == replica.collection]
+        sent = errors = 0
+        for _ in range(self.rounds):
+            for query in queries:
+                if deadline.expired():
+                    return replica.path, sent, errors, False
+                sent += 1
+                if query_core(self.state.http, replica, query, timeout=QUERY_TIMEOUT) is None:
+                    errors += 1
+        return replica.path, sent, errors, True
+
+
+def cache_warmer(cluster_state):
+    """A CacheWarmer with the SOLR_WARM_* settings, or None if SOLR_WARM_CACHES is false"""
+    if not WARM_CACHES:
+        return None
+    return CacheWarmer(cluster_state)